@@ -1,16 +1,71 @@
 from typing import List
 
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+# Допустимые значения DOWNLOAD_OFFLOAD
+DOWNLOAD_OFFLOAD_MODES = ("", "x-accel-redirect", "x-sendfile")
+
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./classroom.db"
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Access-токен живет недолго и обновляется по refresh-токену (POST /auth/refresh)
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # Окно, в котором повторный обмен refresh-токена (вкладки обновились разом) не считается кражей
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 10
+    # Как часто воркер перечитывает список отозванных access-токенов
+    TOKEN_REVOCATION_REFRESH_SECONDS: int = 5
+    # Кэш пользователей для авторизованных запросов (в памяти воркера), 0 - выключен
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 10000
+    # bcrypt: стоимость хеша и отдельный пул потоков (0 - по числу ядер);
+    # запросы сверх PASSWORD_HASH_QUEUE_LIMIT ожидающих получают 503
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 0
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+    # Сколько проверенных JWT помнить до их exp, 0 - проверять каждый раз
+    TOKEN_CACHE_MAX_SIZE: int = 4096
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE_MB: int = 50
+    # Квоты хранилища на пользователя и на курс, 0 - без ограничений
+    USER_STORAGE_QUOTA_MB: int = 0
+    COURSE_STORAGE_QUOTA_MB: int = 0
+    # Возобновляемые загрузки: незавершенные сессии старше TTL удаляются сборщиком
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_SESSION_GC_INTERVAL_MINUTES: int = 30
+    # Сборщик осиротевших файлов: файл без ссылок в БД уходит в карантин
+    # и удаляется, если за UPLOAD_GC_GRACE_HOURS на него так и не сослались
+    UPLOAD_GC_INTERVAL_MINUTES: int = 360
+    UPLOAD_GC_GRACE_HOURS: int = 24
+    UPLOAD_GC_MIN_AGE_MINUTES: int = 60
+    UPLOAD_GC_BATCH_SIZE: int = 500
+    # Сжатие текстовых файлов при хранении: "" - выключено, "gzip" или "zstd" (нужен zstandard)
+    UPLOAD_COMPRESSION: str = ""
+    UPLOAD_COMPRESSION_MIN_BYTES: int = 1024
+    # Хранилище файлов: "local" (UPLOAD_DIR) или "s3" (любой S3-совместимый сервис)
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: str = ""
+    S3_REGION: str = ""
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    # Время жизни временных ссылок на скачивание
+    S3_PRESIGN_EXPIRES_SECONDS: int = 300
+    # Отдача файлов через reverse proxy после проверки прав:
+    # "" - отдает приложение, "x-accel-redirect" - nginx, "x-sendfile" - Apache/lighttpd
+    DOWNLOAD_OFFLOAD: str = ""
+    # internal-location nginx, который указывает на UPLOAD_DIR
+    DOWNLOAD_OFFLOAD_PREFIX: str = "/protected-uploads"
     LIBREOFFICE_BIN: str = "soffice"
+    # Перепроверка истории чата после изменения списка слов фильтра
+    CHAT_RESANITIZE_INTERVAL_MINUTES: int = 10
+    CHAT_RESANITIZE_BATCH_SIZE: int = 500
+    # Общий для воркеров кэш лемм и вердиктов фильтра чата (файл SQLite), пусто - выключен
+    MESSAGE_FILTER_CACHE_PATH: str = ""
     # Контроль доступа к API и документации
     DOCS_ENABLED: bool = True
     ENFORCE_ORIGIN: bool = False
@@ -18,6 +73,19 @@ class Settings(BaseSettings):
         "http://localhost:5173",
         "https://localhost",
     ]
+    # Лимиты входа и отправки/проверки кодов (token bucket): "N/S" - N запросов подряд,
+    # ведро восполняется за S секунд. Отдельно на IP и на email.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_LOGIN_PER_IP: str = "60/60"
+    RATE_LIMIT_LOGIN_PER_EMAIL: str = "10/300"
+    RATE_LIMIT_SEND_CODE_PER_IP: str = "20/600"
+    RATE_LIMIT_SEND_CODE_PER_EMAIL: str = "5/600"
+    RATE_LIMIT_CONFIRM_CODE_PER_IP: str = "60/600"
+    RATE_LIMIT_CONFIRM_CODE_PER_EMAIL: str = "10/600"
+    # Общие для воркеров ведра в файле SQLite, пусто - в памяти каждого воркера
+    RATE_LIMIT_SHARED_PATH: str = ""
+    # Брать адрес клиента из X-Real-IP (только за своим reverse proxy)
+    RATE_LIMIT_TRUST_PROXY: bool = False
     EMAIL_VERIFICATION_EXPIRE_MINUTES: int = 30
     EMAIL_VERIFICATION_RESEND_SECONDS: int = 60
     SMTP_HOST: str = ""
@@ -28,6 +96,31 @@ class Settings(BaseSettings):
     SMTP_FROM_NAME: str = "Classroom"
     SMTP_USE_TLS: bool = True
     SMTP_USE_SSL: bool = False
+    # Таймаут SMTP и сколько держать открытым простаивающее соединение
+    SMTP_TIMEOUT_SECONDS: int = 20
+    SMTP_IDLE_SECONDS: int = 30
+    # Очередь писем (email_outbox): как часто разбирать, размер пачки, число попыток
+    # и задержка перед первым повтором (дальше удваивается)
+    EMAIL_OUTBOX_INTERVAL_SECONDS: int = 2
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 6
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = 30
+    # Письмо, взятое воркером, не отправляется другими столько секунд
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300
+    # Отправленные и неотправленные письма хранятся столько дней
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 7
+    # Очистка истекших кодов, незавершенных регистраций и токенов (выполняет один воркер)
+    EXPIRED_SWEEP_INTERVAL_MINUTES: int = 15
+    EXPIRED_SWEEP_BATCH_SIZE: int = 500
+
+    @field_validator("DOWNLOAD_OFFLOAD")
+    @classmethod
+    def _check_download_offload(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value not in DOWNLOAD_OFFLOAD_MODES:
+            # Опечатка не должна молча включать другой режим отдачи
+            raise ValueError(f"DOWNLOAD_OFFLOAD должен быть одним из: {', '.join(repr(mode) for mode in DOWNLOAD_OFFLOAD_MODES)}")
+        return value
 
     class Config:
         env_file = ".env"
@@ -32,6 +32,81 @@ def get_db():
         db.close()
 
 
+# Колонки, добавленные к существующим таблицам после первого релиза
+ADDED_TABLE_COLUMNS: dict[str, list[tuple[str, str]]] = {
+    "users": [
+        ("storage_used_bytes", "INTEGER NOT NULL DEFAULT 0"),
+        ("membership_version", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+    "courses": [
+        ("storage_used_bytes", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+    "assignment_files": [
+        ("file_size", "INTEGER"),
+        ("content_hash", "VARCHAR(64)"),
+    ],
+    "submission_files": [
+        ("file_size", "INTEGER"),
+        ("content_hash", "VARCHAR(64)"),
+    ],
+    "submission_feedback_files": [
+        ("file_size", "INTEGER"),
+        ("content_hash", "VARCHAR(64)"),
+    ],
+    "submission_review_assets": [
+        ("file_size", "INTEGER"),
+        ("content_hash", "VARCHAR(64)"),
+    ],
+    "upload_sessions": [
+        ("writer_expires_at", "DATETIME"),
+    ],
+    "chat_messages": [
+        ("filter_version", "VARCHAR(16)"),
+        ("search_lemmas", "TEXT"),
+    ],
+}
+
+# Индексы, добавленные к существующим таблицам: (имя, таблица, колонки через запятую)
+ADDED_TABLE_INDEXES: list[tuple[str, str, str]] = [
+    ("ix_assignment_files_file_path", "assignment_files", "file_path"),
+    ("ix_submission_files_file_path", "submission_files", "file_path"),
+    ("ix_submission_files_content_hash", "submission_files", "content_hash"),
+    ("ix_submission_feedback_files_file_path", "submission_feedback_files", "file_path"),
+    ("ix_submission_review_assets_review_file_path", "submission_review_assets", "review_file_path"),
+    ("ix_chat_messages_assignment_id_id", "chat_messages", "assignment_id, id"),
+    ("ix_chat_messages_filter_version", "chat_messages", "filter_version"),
+    ("ix_pending_registrations_expires_at", "pending_registrations", "expires_at"),
+    ("ix_refresh_tokens_expires_at", "refresh_tokens", "expires_at"),
+]
+
+
+def _added_columns_statements(inspector) -> list[str]:
+    statements = []
+    table_names = set(inspector.get_table_names())
+    for table_name, columns in ADDED_TABLE_COLUMNS.items():
+        if table_name not in table_names:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+        for column_name, column_type in columns:
+            if column_name not in existing_columns:
+                statements.append(
+                    f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"
+                )
+    return statements
+
+
+def _added_indexes_statements(inspector) -> list[str]:
+    statements = []
+    table_names = set(inspector.get_table_names())
+    for index_name, table_name, column_names in ADDED_TABLE_INDEXES:
+        if table_name not in table_names:
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+        if index_name not in existing_indexes:
+            statements.append(f"CREATE INDEX {index_name} ON {table_name} ({column_names})")
+    return statements
+
+
 def run_startup_migrations():
     inspector = inspect(engine)
     if "users" not in inspector.get_table_names():
@@ -97,6 +172,9 @@ def run_startup_migrations():
             "ALTER TABLE users ADD COLUMN password_reset_sent_at DATETIME"
         )
 
+    statements.extend(_added_columns_statements(inspector))
+    statements.extend(_added_indexes_statements(inspector))
+
     if not statements:
         return
 
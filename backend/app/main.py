@@ -1,20 +1,71 @@
-from fastapi import FastAPI, Request
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 import os
 from pathlib import Path
 from .database import engine, Base, run_startup_migrations
-from .routers import auth, courses, assignments, chat, admin, submissions, websocket
+from .routers import auth, courses, assignments, chat, admin, submissions, uploads, websocket
 from .config import settings
+from .utils.background import start_periodic_job
+from .utils.chat_sanitize import run_chat_resanitize
+from .utils.chat_search import setup_chat_search_index
+from .utils.email_outbox import run_email_outbox, smtp_connection
+from .utils.expired_sweep import run_expired_sweep
+from .utils.file_download import UploadStaticFiles, build_file_response
+from .utils.file_upload import get_max_upload_size
+from .utils.resumable_upload import run_upload_session_gc
+from .utils.storage import is_local_storage
+from .utils.upload_gc import run_upload_gc
 
 # Создание таблиц
 Base.metadata.create_all(bind=engine)
 run_startup_migrations()
+setup_chat_search_index()
 
 # Создание директории для загрузок
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background_tasks = [
+        start_periodic_job(
+            "upload-session-gc",
+            settings.UPLOAD_SESSION_GC_INTERVAL_MINUTES * 60,
+            run_upload_session_gc,
+        ),
+        start_periodic_job(
+            "upload-gc",
+            settings.UPLOAD_GC_INTERVAL_MINUTES * 60,
+            run_upload_gc,
+        ),
+        start_periodic_job(
+            "chat-resanitize",
+            settings.CHAT_RESANITIZE_INTERVAL_MINUTES * 60,
+            run_chat_resanitize,
+        ),
+        start_periodic_job(
+            "email-outbox",
+            settings.EMAIL_OUTBOX_INTERVAL_SECONDS,
+            run_email_outbox,
+        ),
+        start_periodic_job(
+            "expired-sweep",
+            settings.EXPIRED_SWEEP_INTERVAL_MINUTES * 60,
+            run_expired_sweep,
+        ),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    smtp_connection.close()
+
+
 app = FastAPI(
     title="Classroom API",
     description="API для образовательной платформы",
@@ -22,6 +73,7 @@ app = FastAPI(
     docs_url="/docs" if settings.DOCS_ENABLED else None,
     redoc_url=None if not settings.DOCS_ENABLED else "/redoc",
     openapi_url="/openapi.json" if settings.DOCS_ENABLED else None,
+    lifespan=lifespan,
 )
 
 # Настройка CORS
@@ -49,11 +101,33 @@ async def enforce_origin(request: Request, call_next):
             )
     return await call_next(request)
 
+
+# Запас на заголовки частей multipart сверх самого файла
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Отклоняет multipart-запросы с Content-Length больше лимита ещё до разбора тела,
+    чтобы парсер не сохранял заведомо слишком большой файл во временный файл.
+    """
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+    if content_type.startswith("multipart/form-data") and content_length and content_length.isdigit():
+        if int(content_length) > get_max_upload_size() + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Файл слишком большой. Максимальный размер {settings.MAX_FILE_SIZE_MB} МБ"},
+            )
+    return await call_next(request)
+
 # Подключение роутеров с префиксом /api
 app.include_router(auth.router, prefix="/api")
 app.include_router(courses.router, prefix="/api")
 app.include_router(assignments.router, prefix="/api")
 app.include_router(submissions.router, prefix="/api")
+app.include_router(uploads.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
 
@@ -61,8 +135,19 @@ app.include_router(admin.router, prefix="/api")
 app.include_router(websocket.router)
 
 # Статические файлы для загруженных файлов
-if os.path.exists(settings.UPLOAD_DIR):
-    app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+if is_local_storage():
+    if os.path.exists(settings.UPLOAD_DIR):
+        app.mount("/uploads", UploadStaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+else:
+    @app.get("/uploads/{file_key:path}")
+    def redirect_upload(file_key: str):
+        """Старые ссылки /uploads/... при удаленном хранилище ведут на временную ссылку"""
+        if ".." in file_key.split("/"):
+            raise HTTPException(status_code=404, detail="Not found")
+        return build_file_response(
+            f"{settings.UPLOAD_DIR}/{file_key}",
+            os.path.basename(file_key),
+        )
 
 # Путь к статическим файлам фронтенда
 STATIC_DIR = Path(__file__).parent.parent / "static"
@@ -1,22 +1,32 @@
 from .user import User
 from .pending_registration import PendingRegistration
+from .auth_token import RefreshToken, TokenRevocation
 from .course import Course, CourseMember
 from .assignment import Assignment, AssignmentFile
 from .assignment_view import AssignmentView
-from .message import ChatMessage
+from .message import ChatMessage, ChatReadMarker
 from .submission import Submission, SubmissionFile, SubmissionReviewAsset, SubmissionFeedbackFile
+from .upload_session import UploadSession
+from .email_outbox import EmailOutbox
+from .job_lease import JobLease
 
 __all__ = [
     "User",
     "PendingRegistration",
+    "RefreshToken",
+    "TokenRevocation",
     "Course",
     "CourseMember",
     "Assignment",
     "AssignmentFile",
     "AssignmentView",
     "ChatMessage",
+    "ChatReadMarker",
     "Submission",
     "SubmissionFile",
     "SubmissionReviewAsset",
     "SubmissionFeedbackFile",
+    "UploadSession",
+    "EmailOutbox",
+    "JobLease",
 ]
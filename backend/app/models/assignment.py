@@ -35,8 +35,10 @@ class AssignmentFile(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)
     file_name = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=True)  # Размер в байтах
+    content_hash = Column(String(64), nullable=True)  # sha256 содержимого
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from ..database import Base
+
+
+class RefreshToken(Base):
+    """Refresh-токен: хранится только sha256, при каждом обновлении заменяется новым"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # Цепочка токенов одного входа: повторное использование старого токена отзывает всю цепочку
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    used_at = Column(DateTime, nullable=True)  # Когда обменян на новый
+    revoked_at = Column(DateTime, nullable=True)
+
+
+class TokenRevocation(Base):
+    """Access-токены пользователя, выданные раньше revoked_before, недействительны"""
+    __tablename__ = "token_revocations"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    revoked_before = Column(DateTime, nullable=False, index=True)
@@ -14,6 +14,7 @@ class Course(Base):
     creator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_archived = Column(Integer, default=0)  # 0 = активный, 1 = архивный
+    storage_used_bytes = Column(Integer, default=0, nullable=False)  # Объем файлов курса
 
     # Relationships
     creator = relationship("User", back_populates="created_courses")
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from ..database import Base
+
+
+class EmailOutbox(Base):
+    """Письмо в очереди на отправку: обработчики только добавляют запись, отправляет фоновая задача"""
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # Выборка готовых к отправке писем
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(16), default="pending", nullable=False)  # "pending", "sent" или "failed"
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Какой проход отправки взял письмо; до next_attempt_at его не трогают другие воркеры
+    claimed_by = Column(String(32), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
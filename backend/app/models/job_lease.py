@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, String
+
+from ..database import Base
+
+
+class JobLease(Base):
+    """Аренда фоновой задачи: пока expires_at не наступил, задачу выполняет только holder"""
+    __tablename__ = "job_leases"
+
+    name = Column(String(64), primary_key=True)
+    holder = Column(String, nullable=False)  # hostname:pid воркера
+    expires_at = Column(DateTime, nullable=False)
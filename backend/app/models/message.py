@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -6,6 +6,10 @@ from ..database import Base
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Постраничная выдача истории чата по курсору before_id
+        Index("ix_chat_messages_assignment_id_id", "assignment_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
@@ -13,7 +17,24 @@ class ChatMessage(Base):
     message = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     is_deleted = Column(Boolean, default=False)
+    filter_version = Column(String(16), nullable=True, index=True)  # Версия списка слов фильтра, NULL - не проверялось
+    search_lemmas = Column(Text, nullable=True)  # Слова и их леммы для FTS5 в SQLite (utils/chat_search.py)
 
     # Relationships
     assignment = relationship("Assignment", back_populates="messages")
     user = relationship("User", back_populates="messages")
+
+
+class ChatReadMarker(Base):
+    """Докуда пользователь прочитал чат задания и сколько там непрочитанных"""
+    __tablename__ = "chat_read_markers"
+    __table_args__ = (
+        UniqueConstraint("user_id", "assignment_id", name="uq_chat_read_markers_user_assignment"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id", ondelete="CASCADE"), nullable=False, index=True)
+    last_read_message_id = Column(Integer, default=0, nullable=False)
+    unread_count = Column(Integer, default=0, nullable=False)  # Поддерживается инкрементально при отправке
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -13,6 +13,6 @@ class PendingRegistration(Base):
     username = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
     code = Column(String(6), nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     sent_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
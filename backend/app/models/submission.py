@@ -30,8 +30,10 @@ class SubmissionFile(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=False)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)
     file_name = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=True)  # Размер в байтах
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 содержимого
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -49,9 +51,11 @@ class SubmissionReviewAsset(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     submission_file_id = Column(Integer, ForeignKey("submission_files.id"), nullable=False, unique=True)
-    review_file_path = Column(String, nullable=False)
+    review_file_path = Column(String, nullable=False, index=True)
     review_file_name = Column(String, nullable=False)
     mime_type = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=True)  # Размер в байтах
+    content_hash = Column(String(64), nullable=True)  # sha256 содержимого
     created_at = Column(DateTime, default=datetime.utcnow)
 
     submission_file = relationship("SubmissionFile", back_populates="review_asset")
@@ -64,9 +68,11 @@ class SubmissionFeedbackFile(Base):
     submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=False)
     teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     source_submission_file_id = Column(Integer, ForeignKey("submission_files.id"), nullable=True)
-    file_path = Column(String, nullable=False)
+    file_path = Column(String, nullable=False, index=True)
     file_name = Column(String, nullable=False)
     mime_type = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=True)  # Размер в байтах
+    content_hash = Column(String(64), nullable=True)  # sha256 содержимого
     created_at = Column(DateTime, default=datetime.utcnow)
 
     submission = relationship("Submission", back_populates="feedback_files")
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+
+from ..database import Base
+
+
+class UploadSession(Base):
+    """Сессия возобновляемой загрузки файла по частям"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex, используется и как имя staging-файла
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    target_type = Column(String, nullable=False)  # "submission" или "assignment"
+    target_id = Column(Integer, nullable=False)
+    file_name = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)  # Ожидаемый итоговый размер в байтах
+    received_bytes = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+    writer_expires_at = Column(DateTime, nullable=True)  # Пока в будущем - часть файла пишет другой запрос
@@ -26,6 +26,8 @@ class User(Base):
     password_reset_code = Column(String(6), nullable=True)
     password_reset_expires_at = Column(DateTime, nullable=True)
     password_reset_sent_at = Column(DateTime, nullable=True)
+    storage_used_bytes = Column(Integer, default=0, nullable=False)  # Объем загруженных файлов
+    membership_version = Column(Integer, default=0, nullable=False)  # Растет при любом изменении членства в курсах
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -1,8 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
-import os
 from ..database import get_db
 from ..models.user import User
 from ..models.course import Course, CourseMember
@@ -12,7 +10,13 @@ from ..schemas.user import UserResponse
 from ..schemas.course import CourseResponse, CourseMemberResponse
 from ..schemas.assignment import AssignmentResponse
 from ..schemas.submission import SubmissionResponse
+from ..schemas.upload import StorageUsageResponse
 from ..utils.auth import get_current_admin
+from ..utils.display_names import display_name, rows_with_display_names
+from ..utils.file_download import build_file_response
+from ..utils.message_filter import get_filter_cache_stats
+from ..utils.storage_quota import recalculate_storage_usage
+from ..utils.user_cache import invalidate_cached_user
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -46,8 +50,21 @@ def delete_user(
             detail="Невозможно удалить себя"
         )
 
+    # Курсы, в которых у пользователя могли быть файлы, и курсы, которые удалятся вместе с ним
+    affected_course_ids = {
+        course_id for (course_id,) in db.query(CourseMember.course_id).filter(CourseMember.user_id == user.id)
+    } | {course.id for course in user.created_courses}
+    affected_user_ids = {
+        member_id for (member_id,) in db.query(CourseMember.user_id).filter(
+            CourseMember.course_id.in_(affected_course_ids)
+        )
+    } - {user.id}
+
     db.delete(user)
     db.commit()
+    invalidate_cached_user(user_id)
+
+    recalculate_storage_usage(db, user_ids=affected_user_ids, course_ids=affected_course_ids)
 
     return None
 
@@ -57,7 +74,7 @@ def get_all_courses(
     current_admin: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    courses = db.query(Course).all()
+    courses = db.query(Course).options(selectinload(Course.members)).all()
     course_responses = []
 
     for course in courses:
@@ -82,12 +99,59 @@ def delete_course(
             detail="Курс не найден"
         )
 
+    member_ids = [
+        member_id for (member_id,) in db.query(CourseMember.user_id).filter(CourseMember.course_id == course.id)
+    ]
+
     db.delete(course)
     db.commit()
 
+    # Файлы курса удалились каскадом - пересчитываем счетчики участников
+    recalculate_storage_usage(db, user_ids=member_ids, course_ids=[])
+
     return None
 
 
+@router.get("/storage/top", response_model=List[StorageUsageResponse])
+def get_top_storage_consumers(
+    kind: str = Query("user", pattern="^(user|course)$"),
+    limit: int = Query(20, ge=1, le=100),
+    current_admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Крупнейшие потребители хранилища по счетчикам (без обхода диска)"""
+    if kind == "course":
+        courses = db.query(Course).order_by(Course.storage_used_bytes.desc()).limit(limit).all()
+        return [
+            StorageUsageResponse(kind="course", id=course.id, name=course.title, storage_used_bytes=course.storage_used_bytes)
+            for course in courses
+        ]
+
+    users = db.query(User).order_by(User.storage_used_bytes.desc()).limit(limit).all()
+    return [
+        StorageUsageResponse(kind="user", id=user.id, name=user.username, storage_used_bytes=user.storage_used_bytes)
+        for user in users
+    ]
+
+
+@router.post("/storage/recalculate", status_code=status.HTTP_204_NO_CONTENT)
+def recalculate_storage(
+    current_admin: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Пересчитать все счетчики по записям о файлах (первичное заполнение, исправление расхождений)"""
+    recalculate_storage_usage(db)
+    return None
+
+
+@router.get("/message-filter/stats")
+def get_message_filter_stats(
+    current_admin: User = Depends(get_current_admin),
+):
+    """Попадания в кэши фильтра чата (счетчики процесса, который обработал запрос)"""
+    return get_filter_cache_stats()
+
+
 @router.get("/courses/{course_id}/members", response_model=List[CourseMemberResponse])
 def get_course_members_admin(
     course_id: int,
@@ -102,7 +166,9 @@ def get_course_members_admin(
             detail="Курс не найден"
         )
 
-    members = db.query(CourseMember).filter(CourseMember.course_id == course_id).all()
+    members = db.query(CourseMember).options(joinedload(CourseMember.user)).filter(
+        CourseMember.course_id == course_id
+    ).all()
 
     member_responses = []
     for member in members:
@@ -184,18 +250,10 @@ async def download_assignment_file_admin(
             detail="Файл не найден"
         )
 
-    file_path = os.path.join(os.getcwd(), file_record.file_path)
-
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на сервере"
-        )
-
-    return FileResponse(
-        path=file_path,
-        media_type='application/octet-stream',
-        filename=file_record.file_name
+    return build_file_response(
+        file_record.file_path,
+        file_record.file_name,
+        content_hash=file_record.content_hash,
     )
 
 
@@ -213,15 +271,16 @@ def get_assignment_submissions_admin(
             detail="Задание не найдено"
         )
 
-    submissions = db.query(Submission).filter(
-        Submission.assignment_id == assignment_id,
-        Submission.is_deleted == 0
-    ).order_by(Submission.submitted_at.desc()).all()
+    submissions = rows_with_display_names(
+        db.query(Submission).filter(
+            Submission.assignment_id == assignment_id,
+            Submission.is_deleted == 0
+        ).order_by(Submission.submitted_at.desc()),
+        Submission.student,
+    )
 
     result = []
-    for submission in submissions:
-        student = db.query(User).filter(User.id == submission.student_id).first()
-        
+    for submission, student_name in submissions:
         # Создаем простой словарь вместо сложной схемы
         submission_data = {
             "id": submission.id,
@@ -233,7 +292,7 @@ def get_assignment_submissions_admin(
             "submitted_at": submission.submitted_at.isoformat(),
             "graded_at": submission.graded_at.isoformat() if submission.graded_at else None,
             "viewed_by_teacher": submission.viewed_by_teacher,
-            "student_name": student.username if student else None,
+            "student_name": student_name,
             "files": []
         }
         result.append(submission_data)
@@ -247,14 +306,17 @@ def get_all_submissions_admin(
     db: Session = Depends(get_db)
 ):
     """Получить все сдачи всех заданий (только для админов)"""
-    submissions = db.query(Submission).filter(
+    submissions = db.query(Submission).options(
+        joinedload(Submission.student),
+        joinedload(Submission.assignment),
+        selectinload(Submission.files),
+    ).filter(
         Submission.is_deleted == 0
     ).order_by(Submission.submitted_at.desc()).all()
 
     result = []
     for submission in submissions:
-        student = db.query(User).filter(User.id == submission.student_id).first()
-        assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
+        assignment = submission.assignment
         
         # Получаем файлы сдачи
         files = []
@@ -272,7 +334,7 @@ def get_all_submissions_admin(
             "assignment_title": assignment.title if assignment else None,
             "course_id": assignment.course_id if assignment else None,
             "student_id": submission.student_id,
-            "student_name": student.username if student else None,
+            "student_name": display_name(submission.student),
             "content": submission.content,
             "score": submission.score,
             "teacher_comment": submission.teacher_comment,
@@ -312,16 +374,8 @@ async def download_submission_file_admin(
             detail="Файл не найден"
         )
 
-    file_path = os.path.join(os.getcwd(), file_record.file_path)
-
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на сервере"
-        )
-
-    return FileResponse(
-        path=file_path,
-        media_type='application/octet-stream',
-        filename=file_record.file_name
+    return build_file_response(
+        file_record.file_path,
+        file_record.file_name,
+        content_hash=file_record.content_hash,
     )
@@ -1,19 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 import json
-import os
 from ..database import get_db
 from ..models.user import User
 from ..models.course import Course, CourseMember
 from ..models.assignment import Assignment, AssignmentFile
 from ..models.assignment_view import AssignmentView
-from ..models.submission import Submission, SubmissionFile
+from ..models.submission import Submission, SubmissionFile, SubmissionReviewAsset
 from ..schemas.assignment import AssignmentCreate, AssignmentUpdate, AssignmentResponse
+from ..schemas.upload import UploadSessionCreate, UploadSessionResponse
 from ..utils.auth import get_current_user
-from ..utils.file_upload import save_upload_file, delete_file
+from ..utils.display_names import SUBMISSION_RESPONSE_OPTIONS, build_submission_response
+from ..utils.file_download import build_content_disposition, build_file_response
+from ..utils.file_upload import SavedUpload, save_upload_file, delete_file, sanitize_filename
+from ..utils.membership import is_course_member
+from ..utils.resumable_upload import (
+    build_session_response,
+    create_upload_session,
+    finalize_upload_session,
+    get_user_upload_session,
+)
+from ..utils.storage_quota import (
+    add_storage_usage,
+    ensure_storage_quota,
+    get_remaining_quota,
+    recalculate_storage_usage,
+)
 from ..utils.websocket import manager
+from ..utils.zip_stream import ZipEntry, stream_zip
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
 
@@ -81,10 +97,7 @@ def get_course_assignments(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, course_id)
 
     if not is_member:
         raise HTTPException(
@@ -183,10 +196,7 @@ def get_assignment(
             detail="Задание не найдено"
         )
 
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -212,10 +222,7 @@ def mark_assignment_as_read(
         )
 
     # Проверяем, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -303,13 +310,7 @@ async def update_assignment(
     return assignment_response
 
 
-@router.post("/{assignment_id}/files", status_code=status.HTTP_201_CREATED)
-async def upload_assignment_file(
-    assignment_id: int,
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def _get_teacher_assignment(assignment_id: int, current_user: User, db: Session) -> Assignment:
     assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
     if not assignment:
         raise HTTPException(
@@ -325,20 +326,93 @@ async def upload_assignment_file(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Только создатель курса может загружать файлы к заданию"
         )
+    return assignment
 
-    # Сохранение файла
-    file_path, file_name = save_upload_file(file)
 
-    # Создание записи в БД
+def _attach_assignment_file(assignment: Assignment, saved: SavedUpload, user_id: int, db: Session) -> AssignmentFile:
     assignment_file = AssignmentFile(
-        assignment_id=assignment_id,
-        file_path=file_path,
-        file_name=file_name
+        assignment_id=assignment.id,
+        file_path=saved.file_path,
+        file_name=saved.file_name,
+        file_size=saved.file_size,
+        content_hash=saved.content_hash,
     )
 
     db.add(assignment_file)
+    add_storage_usage(db, user_id, assignment.course_id, saved.file_size)
     db.commit()
     db.refresh(assignment_file)
+    return assignment_file
+
+
+@router.post("/{assignment_id}/files", status_code=status.HTTP_201_CREATED)
+async def upload_assignment_file(
+    assignment_id: int,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    assignment = _get_teacher_assignment(assignment_id, current_user, db)
+
+    # Сохранение файла
+    saved = await save_upload_file(
+        file,
+        max_bytes=get_remaining_quota(db, current_user.id, assignment.course_id),
+    )
+
+    # Создание записи в БД
+    assignment_file = _attach_assignment_file(assignment, saved, current_user.id, db)
+
+    return {
+        "id": assignment_file.id,
+        "file_name": assignment_file.file_name,
+        "message": "File uploaded successfully"
+    }
+
+
+@router.post("/{assignment_id}/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_assignment_upload_session(
+    assignment_id: int,
+    session_data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Начать возобновляемую загрузку файла задания (части отправляются в PUT /uploads/{id})"""
+    assignment = _get_teacher_assignment(assignment_id, current_user, db)
+    ensure_storage_quota(db, current_user.id, assignment.course_id, session_data.file_size)
+
+    upload_session = create_upload_session(
+        db,
+        user_id=current_user.id,
+        target_type="assignment",
+        target_id=assignment_id,
+        file_name=session_data.file_name,
+        file_size=session_data.file_size,
+    )
+    return build_session_response(upload_session)
+
+
+@router.post("/{assignment_id}/uploads/{session_id}/finalize", status_code=status.HTTP_201_CREATED)
+async def finalize_assignment_upload_session(
+    assignment_id: int,
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Завершить возобновляемую загрузку и прикрепить файл к заданию"""
+    assignment = _get_teacher_assignment(assignment_id, current_user, db)
+
+    upload_session = get_user_upload_session(db, session_id, current_user.id)
+    if upload_session.target_type != "assignment" or upload_session.target_id != assignment_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Сессия загрузки не найдена"
+        )
+
+    # Квота могла закончиться, пока шла загрузка
+    ensure_storage_quota(db, current_user.id, assignment.course_id, upload_session.file_size)
+    saved = await finalize_upload_session(db, upload_session)
+    assignment_file = _attach_assignment_file(assignment, saved, current_user.id, db)
 
     return {
         "id": assignment_file.id,
@@ -375,13 +449,16 @@ def delete_assignment_file(
             detail="Только создатель курса может удалять файлы"
         )
 
-    # Удаление файла из файловой системы
-    delete_file(file_record.file_path)
+    file_path = file_record.file_path
 
     # Удаление записи из БД
     db.delete(file_record)
+    add_storage_usage(db, current_user.id, course.id, -(file_record.file_size or 0))
     db.commit()
 
+    # Удаление файла из файловой системы (если на него больше нет ссылок)
+    delete_file(file_path, db)
+
     return None
 
 
@@ -408,21 +485,29 @@ async def delete_assignment(
             detail="Только создатель курса может удалять задания"
         )
 
-    # Удаляем все файлы задания из файловой системы
+    # Запоминаем файлы задания, чтобы удалить их после удаления записей
     assignment_files = db.query(AssignmentFile).filter(
         AssignmentFile.assignment_id == assignment_id
     ).all()
-
-    for file_record in assignment_files:
-        delete_file(file_record.file_path)
+    file_paths = [file_record.file_path for file_record in assignment_files]
 
     # Сохраняем course_id для WebSocket уведомления
     course_id = assignment.course_id
+    member_ids = [
+        user_id for (user_id,) in db.query(CourseMember.user_id).filter(CourseMember.course_id == course_id)
+    ]
 
     # Удаляем задание из БД (каскадно удалятся все связанные записи)
     db.delete(assignment)
     db.commit()
 
+    # Каскадом удалились сдачи и файлы участников - пересчитываем их счетчики
+    recalculate_storage_usage(db, user_ids=member_ids + [course.creator_id], course_ids=[course_id])
+
+    # Удаляем файлы задания из файловой системы
+    for file_path in file_paths:
+        delete_file(file_path, db)
+
     # Отправляем WebSocket уведомление всем участникам курса
     await manager.broadcast_to_course(
         course_id,
@@ -442,8 +527,6 @@ def get_assignment_ungraded_submissions(
     db: Session = Depends(get_db)
 ):
     """Получить все непроверенные работы по заданию (только для создателя курса)"""
-    from ..schemas.submission import SubmissionResponse
-
     assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
     if not assignment:
         raise HTTPException(
@@ -461,20 +544,135 @@ def get_assignment_ungraded_submissions(
         )
 
     # Получаем все непроверенные сдачи по этому заданию
-    ungraded_submissions = db.query(Submission).filter(
+    ungraded_submissions = db.query(Submission).options(*SUBMISSION_RESPONSE_OPTIONS).filter(
         Submission.assignment_id == assignment_id,
         Submission.score == None,
         Submission.is_deleted == 0  # Фильтруем удалённые сдачи
     ).order_by(Submission.submitted_at.desc()).all()
 
-    result = []
-    for submission in ungraded_submissions:
-        student = db.query(User).filter(User.id == submission.student_id).first()
-        response = SubmissionResponse.model_validate(submission)
-        response.student_name = student.username if student else None
-        result.append(response)
+    return [build_submission_response(submission) for submission in ungraded_submissions]
+
+
+def _unique_arcname(arcname: str, used_names: set) -> str:
+    """Добавляет суффикс (2), (3)... если такое имя в архиве уже есть"""
+    stem, dot, extension = arcname.rpartition(".")
+    if not dot or "/" in extension:
+        stem, dot, extension = arcname, "", ""
+    candidate = arcname
+    counter = 2
+    while candidate in used_names:
+        candidate = f"{stem} ({counter}){dot}{extension}"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
 
-    return result
+
+def _build_submissions_archive_entries(
+    assignment_id: int,
+    latest_only: bool,
+    include_review: bool,
+    db: Session,
+) -> List[ZipEntry]:
+    submissions = db.query(Submission).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.is_deleted == 0
+    ).order_by(Submission.student_id, Submission.submitted_at).all()
+    if not submissions:
+        return []
+
+    student_ids = {submission.student_id for submission in submissions}
+    students = {user.id: user for user in db.query(User).filter(User.id.in_(student_ids)).all()}
+
+    # Номер попытки считается по всем сдачам студента, даже если в архив идет только последняя
+    attempts = {}
+    attempt_numbers = {}
+    for submission in submissions:
+        attempts.setdefault(submission.student_id, []).append(submission)
+        attempt_numbers[submission.id] = len(attempts[submission.student_id])
+    if latest_only:
+        attempts = {student_id: items[-1:] for student_id, items in attempts.items()}
+
+    selected = {submission.id: submission for items in attempts.values() for submission in items}
+    files_by_submission = {}
+    for submission_file in db.query(SubmissionFile).filter(
+        SubmissionFile.submission_id.in_(selected.keys())
+    ).order_by(SubmissionFile.id).all():
+        files_by_submission.setdefault(submission_file.submission_id, []).append(submission_file)
+
+    review_assets = {}
+    if include_review:
+        for review_asset in db.query(SubmissionReviewAsset).join(SubmissionFile).filter(
+            SubmissionFile.submission_id.in_(selected.keys())
+        ).all():
+            review_assets[review_asset.submission_file_id] = review_asset
+
+    entries = []
+    used_names = set()
+    for student_id, items in attempts.items():
+        student = students.get(student_id)
+        student_name = student.username if student else "student"
+        student_dir = sanitize_filename(f"{student_name}_{student_id}")
+
+        for submission in items:
+            folder = student_dir
+            if not latest_only:
+                folder = f"{student_dir}/attempt_{attempt_numbers[submission.id]}"
+
+            for submission_file in files_by_submission.get(submission.id, []):
+                entries.append(ZipEntry(
+                    arcname=_unique_arcname(f"{folder}/{submission_file.file_name}", used_names),
+                    file_path=submission_file.file_path,
+                    modified_at=submission_file.uploaded_at,
+                ))
+                review_asset = review_assets.get(submission_file.id)
+                if review_asset:
+                    entries.append(ZipEntry(
+                        arcname=_unique_arcname(f"{folder}/review/{review_asset.review_file_name}", used_names),
+                        file_path=review_asset.review_file_path,
+                        modified_at=review_asset.created_at,
+                    ))
+
+    return entries
+
+
+@router.get("/{assignment_id}/submissions/archive")
+def download_submissions_archive(
+    assignment_id: int,
+    latest_only: bool = Query(False),
+    include_review: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    ZIP со всеми файлами сдач по заданию (только для создателя курса).
+    Каждому студенту - своя папка; latest_only - только последняя попытка,
+    include_review - добавить PDF, сконвертированные из Word для проверки.
+    Архив собирается потоково, без временных файлов.
+    """
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задание не найдено"
+        )
+
+    course = db.query(Course).filter(Course.id == assignment.course_id).first()
+
+    if course.creator_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только создатель курса может скачивать все сдачи"
+        )
+
+    # Список файлов собирается до ответа: сессия БД закрывается раньше, чем архив будет отдан
+    entries = _build_submissions_archive_entries(assignment_id, latest_only, include_review, db)
+    archive_name = sanitize_filename(f"{assignment.title}_submissions.zip")
+
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": build_content_disposition(archive_name)},
+    )
 
 
 # Защищенные эндпоинты для скачивания файлов заданий
@@ -494,10 +692,7 @@ async def download_assignment_file(
         )
 
     # Проверяем, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -516,17 +711,8 @@ async def download_assignment_file(
             detail="Файл не найден"
         )
 
-    file_name = os.path.basename(file_record.file_path)
-    file_path = os.path.join(os.getcwd(), file_record.file_path)
-
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на сервере"
-        )
-
-    return FileResponse(
-        path=file_path,
-        media_type='application/octet-stream',
-        filename=file_record.file_name
+    return build_file_response(
+        file_record.file_path,
+        file_record.file_name,
+        content_hash=file_record.content_hash,
     )
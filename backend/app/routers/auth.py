@@ -2,7 +2,7 @@ import secrets
 import string
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
 from ..config import settings
@@ -16,6 +16,7 @@ from ..schemas.user import (
     PasswordUpdate,
     PasswordResetConfirm,
     PasswordResetRequest,
+    RefreshTokenRequest,
     RegistrationConfirm,
     Token,
     UserCreate,
@@ -23,7 +24,22 @@ from ..schemas.user import (
     UserResponse,
     UserUpdate,
 )
-from ..utils.auth import verify_password, get_password_hash, create_access_token, get_current_user
+from ..utils.auth import (
+    verify_password,
+    verify_and_update_password,
+    get_password_hash,
+    get_current_user,
+    rate_limit_by_token,
+)
+from ..utils.rate_limit import enforce_rate_limit
+from ..utils.refresh_tokens import (
+    issue_tokens,
+    revoke_refresh_token,
+    revoke_user_refresh_tokens,
+    rotate_refresh_token,
+)
+from ..utils.token_revocation import revoke_access_tokens
+from ..utils.user_cache import invalidate_cached_user
 from ..utils.email_verification import (
     send_email_change_new_code_email,
     send_email_change_old_code_email,
@@ -50,68 +66,29 @@ def _set_user_email_verification(user: User) -> str:
     return code
 
 
-def _dispatch_verification_email(user: User, code: str):
-    try:
-        send_verification_code_email(
-            to_email=user.email,
-            username=user.username,
-            code=code,
-        )
-    except Exception as exc:
-        print(f"[Email Verification] Failed to send code to {user.email}: {exc}")
+def _dispatch_verification_email(db: Session, user: User, code: str):
+    send_verification_code_email(db, to_email=user.email, username=user.username, code=code)
 
 
-def _dispatch_email_change_old_code_email(user: User, code: str):
-    try:
-        send_email_change_old_code_email(
-            to_email=user.email,
-            username=user.username,
-            code=code,
-        )
-    except Exception as exc:
-        print(f"[Email Change] Failed to send old-email code to {user.email}: {exc}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось отправить код на текущую почту. Попробуйте позже."
-        )
+def _dispatch_email_change_old_code_email(db: Session, user: User, code: str):
+    send_email_change_old_code_email(db, to_email=user.email, username=user.username, code=code)
 
 
-def _dispatch_email_change_new_code_email(user: User, to_email: str, code: str):
-    try:
-        send_email_change_new_code_email(
-            to_email=to_email,
-            username=user.username,
-            code=code,
-        )
-    except Exception as exc:
-        print(f"[Email Change] Failed to send new-email code to {to_email}: {exc}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось отправить код на новую почту. Проверьте адрес и попробуйте позже."
-        )
+def _dispatch_email_change_new_code_email(db: Session, user: User, to_email: str, code: str):
+    send_email_change_new_code_email(db, to_email=to_email, username=user.username, code=code)
 
 
-def _dispatch_password_reset_code_email(user: User, code: str):
-    try:
-        send_password_reset_code_email(
-            to_email=user.email,
-            username=user.username,
-            code=code,
-        )
-    except Exception as exc:
-        print(f"[Password Reset] Failed to send reset code to {user.email}: {exc}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось отправить код на почту. Попробуйте позже."
-        )
+def _dispatch_password_reset_code_email(db: Session, user: User, code: str):
+    send_password_reset_code_email(db, to_email=user.email, username=user.username, code=code)
 
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-def confirm_register(payload: RegistrationConfirm, db: Session = Depends(get_db)):
+def confirm_register(request: Request, payload: RegistrationConfirm, db: Session = Depends(get_db)):
     """
     Завершение регистрации по коду.
     Пользователь создается только после корректного кода.
     """
+    enforce_rate_limit(request, "confirm_code", payload.email)
     email = payload.email.strip().lower()
 
     existing_user = db.query(User).filter(User.email == email).first()
@@ -155,17 +132,13 @@ def confirm_register(payload: RegistrationConfirm, db: Session = Depends(get_db)
     db.commit()
     db.refresh(new_user)
 
-    access_token = create_access_token(data={"sub": str(new_user.id)})
-
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        user=UserResponse.model_validate(new_user)
-    )
+    return issue_tokens(db, new_user)
 
 
 @router.post("/register/request-code", status_code=status.HTTP_200_OK)
-def request_register_code(user_data: UserCreate, db: Session = Depends(get_db)):
+def request_register_code(request: Request, user_data: UserCreate, db: Session = Depends(get_db)):
+    # До запроса к БД и bcrypt
+    enforce_rate_limit(request, "send_code", user_data.email)
     email = user_data.email.strip().lower()
 
     existing_user = db.query(User).filter(User.email == email).first()
@@ -208,22 +181,8 @@ def request_register_code(user_data: UserCreate, db: Session = Depends(get_db)):
         pending.expires_at = expires_at
         pending.sent_at = None
 
-    db.commit()
-    db.refresh(pending)
-
-    try:
-        send_verification_code_email(
-            to_email=email,
-            username=user_data.username,
-            code=code,
-        )
-    except Exception as exc:
-        print(f"[Register] Failed to send registration code to {email}: {exc}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось отправить код на почту. Попробуйте позже."
-        )
-
+    # Письмо уходит в очередь в той же транзакции, что и код
+    send_verification_code_email(db, to_email=email, username=user_data.username, code=code)
     pending.sent_at = now
     db.commit()
 
@@ -231,23 +190,46 @@ def request_register_code(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
+def login(request: Request, user_data: UserLogin, db: Session = Depends(get_db)):
+    # До запроса к БД и bcrypt
+    enforce_rate_limit(request, "login", user_data.email)
+
     # Поиск пользователя
     user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный email или пароль"
+        )
+
+    is_valid, new_hash = verify_and_update_password(user_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль"
         )
 
-    # Создание токена (sub должен быть строкой)
-    access_token = create_access_token(data={"sub": str(user.id)})
+    # Стоимость bcrypt поменялась - пересчитываем хеш, пока известен пароль
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+
+    # Короткоживущий access-токен с claims и refresh-токен для его обновления
+    return issue_tokens(db, user)
 
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        user=UserResponse.model_validate(user)
-    )
+
+@router.post("/refresh", response_model=Token)
+def refresh_tokens(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Обмен refresh-токена на новую пару; старый refresh-токен больше не действует"""
+    return rotate_refresh_token(db, payload.refresh_token)
+
+
+@router.post("/logout")
+def logout(payload: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Отзыв refresh-токена; access-токен доживает свои минуты"""
+    revoke_refresh_token(db, payload.refresh_token)
+    db.commit()
+    return {"message": "Выход выполнен"}
 
 
 @router.get("/me", response_model=UserResponse)
@@ -274,19 +256,19 @@ def update_profile(
         current_user.username = user_data.username
 
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
 
     return UserResponse.model_validate(current_user)
 
 
-@router.put("/password")
+@router.put("/password", dependencies=[Depends(rate_limit_by_token("login"))])
 def update_password(
     password_data: PasswordUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Обновление пароля пользователя"""
-
     # Проверка старого пароля
     if not verify_password(password_data.old_password, current_user.hashed_password):
         raise HTTPException(
@@ -297,16 +279,27 @@ def update_password(
     # Обновление пароля
     current_user.hashed_password = get_password_hash(password_data.new_password)
 
+    # Выход на остальных устройствах; этот клиент получает новую пару токенов
+    revoke_user_refresh_tokens(db, current_user.id)
+    revoke_access_tokens(db, current_user.id)
     db.commit()
+    invalidate_cached_user(current_user.id)
+    tokens = issue_tokens(db, current_user)
 
-    return {"message": "Пароль успешно обновлен"}
+    return {
+        "message": "Пароль успешно обновлен",
+        "access_token": tokens.access_token,
+        "refresh_token": tokens.refresh_token,
+    }
 
 
 @router.post("/password-reset/request-code")
 def request_password_reset_code(
+    request: Request,
     payload: PasswordResetRequest,
     db: Session = Depends(get_db)
 ):
+    enforce_rate_limit(request, "send_code", payload.email)
     email = payload.email.strip().lower()
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -330,11 +323,7 @@ def request_password_reset_code(
     user.password_reset_expires_at = now + timedelta(minutes=settings.EMAIL_VERIFICATION_EXPIRE_MINUTES)
     user.password_reset_sent_at = None
 
-    db.commit()
-    db.refresh(user)
-
-    _dispatch_password_reset_code_email(user, code)
-
+    _dispatch_password_reset_code_email(db, user, code)
     user.password_reset_sent_at = now
     db.commit()
 
@@ -343,9 +332,11 @@ def request_password_reset_code(
 
 @router.post("/password-reset/confirm")
 def confirm_password_reset(
+    request: Request,
     payload: PasswordResetConfirm,
     db: Session = Depends(get_db)
 ):
+    enforce_rate_limit(request, "confirm_code", payload.email)
     email = payload.email.strip().lower()
     user = db.query(User).filter(User.email == email).first()
     if not user:
@@ -376,12 +367,15 @@ def confirm_password_reset(
     user.password_reset_code = None
     user.password_reset_expires_at = None
     user.password_reset_sent_at = None
+    revoke_user_refresh_tokens(db, user.id)
+    revoke_access_tokens(db, user.id)
     db.commit()
+    invalidate_cached_user(user.id)
 
     return {"message": "Пароль успешно сброшен"}
 
 
-@router.post("/verify-email", response_model=UserResponse)
+@router.post("/verify-email", response_model=UserResponse, dependencies=[Depends(rate_limit_by_token("confirm_code"))])
 def verify_email(
     verification_data: EmailVerificationConfirm,
     current_user: User = Depends(get_current_user),
@@ -414,12 +408,13 @@ def verify_email(
     current_user.email_verification_sent_at = None
 
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
 
     return UserResponse.model_validate(current_user)
 
 
-@router.post("/resend-verification")
+@router.post("/resend-verification", dependencies=[Depends(rate_limit_by_token("send_code"))])
 def resend_verification_code(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -438,14 +433,13 @@ def resend_verification_code(
             )
 
     verification_code = _set_user_email_verification(current_user)
+    _dispatch_verification_email(db, current_user, verification_code)
     db.commit()
-    db.refresh(current_user)
-    _dispatch_verification_email(current_user, verification_code)
 
     return {"message": "Код подтверждения отправлен"}
 
 
-@router.post("/email-change/request-old-code")
+@router.post("/email-change/request-old-code", dependencies=[Depends(rate_limit_by_token("send_code"))])
 def request_email_change_old_code(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -477,16 +471,14 @@ def request_email_change_old_code(
     current_user.pending_email_sent_at = None
     current_user.pending_email_expires_at = None
 
-    db.commit()
-    db.refresh(current_user)
-    _dispatch_email_change_old_code_email(current_user, code)
+    _dispatch_email_change_old_code_email(db, current_user, code)
     current_user.email_change_old_sent_at = now
     db.commit()
 
     return {"message": "Код отправлен на текущую почту"}
 
 
-@router.post("/email-change/verify-old-code")
+@router.post("/email-change/verify-old-code", dependencies=[Depends(rate_limit_by_token("confirm_code"))])
 def verify_email_change_old_code(
     verification_data: EmailVerificationConfirm,
     current_user: User = Depends(get_current_user),
@@ -519,7 +511,7 @@ def verify_email_change_old_code(
     return {"message": "Код подтвержден"}
 
 
-@router.post("/email-change/request-new-code")
+@router.post("/email-change/request-new-code", dependencies=[Depends(rate_limit_by_token("send_code"))])
 def request_email_change_new_code(
     payload: EmailChangeRequestNewCode,
     current_user: User = Depends(get_current_user),
@@ -580,16 +572,14 @@ def request_email_change_new_code(
         minutes=settings.EMAIL_VERIFICATION_EXPIRE_MINUTES
     )
 
-    db.commit()
-    db.refresh(current_user)
-    _dispatch_email_change_new_code_email(current_user, new_email, new_code)
+    _dispatch_email_change_new_code_email(db, current_user, new_email, new_code)
     current_user.pending_email_sent_at = now
     db.commit()
 
     return {"message": "Код отправлен на новую почту"}
 
 
-@router.post("/email-change/confirm-new", response_model=UserResponse)
+@router.post("/email-change/confirm-new", response_model=UserResponse, dependencies=[Depends(rate_limit_by_token("confirm_code"))])
 def confirm_email_change_new_email(
     payload: EmailChangeConfirmNewEmail,
     current_user: User = Depends(get_current_user),
@@ -632,6 +622,7 @@ def confirm_email_change_new_email(
     current_user.pending_email_expires_at = None
 
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
 
     return UserResponse.model_validate(current_user)
@@ -1,24 +1,82 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..database import get_db
 from ..models.user import User
-from ..models.course import CourseMember
 from ..models.assignment import Assignment
 from ..models.message import ChatMessage
-from ..schemas.message import MessageCreate, MessageResponse
+from ..schemas.message import (
+    MessageCreate,
+    MessageResponse,
+    MessageSearchResponse,
+    UnreadCountResponse,
+    MarkChatReadRequest,
+)
 from ..utils.auth import get_current_user
-from ..utils.message_filter import sanitize_message
+from ..utils.chat_search import build_snippet, get_search_terms, search_chat_messages
+from ..utils.chat_unread import (
+    get_unread_counts,
+    mark_chat_read,
+    push_unread_counts,
+    record_deleted_message,
+    record_new_message,
+)
+from ..utils.display_names import rows_with_display_names
+from ..utils.membership import is_course_member
+from ..utils.message_filter import FILTER_VERSION, sanitize_message
 from ..utils.websocket import manager
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
+@router.get("/unread", response_model=List[UnreadCountResponse])
+def get_unread_chat_counts(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Непрочитанные сообщения по всем заданиям курсов пользователя, одним запросом
+    return [UnreadCountResponse(**count._asdict()) for count in get_unread_counts(db, current_user.id)]
+
+
+@router.post("/assignments/{assignment_id}/read", response_model=UnreadCountResponse)
+async def mark_assignment_chat_read(
+    assignment_id: int,
+    read_data: Optional[MarkChatReadRequest] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Проверка существования задания
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задание не найдено"
+        )
+
+    # Проверка, что пользователь является участником курса
+    is_member = is_course_member(db, current_user, assignment.course_id)
+
+    if not is_member:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Вы не являетесь участником этого курса"
+        )
+
+    last_message_id = read_data.last_message_id if read_data else None
+    count = mark_chat_read(db, current_user.id, assignment_id, last_message_id)
+
+    # Другие вкладки пользователя тоже обновят счетчик
+    await push_unread_counts(db, assignment_id, [current_user.id])
+
+    return UnreadCountResponse(**count._asdict())
+
+
 @router.get("/assignments/{assignment_id}/messages", response_model=List[MessageResponse])
 def get_assignment_messages(
     assignment_id: int,
     offset: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=50),
+    before_id: Optional[int] = Query(None, ge=1),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -31,10 +89,7 @@ def get_assignment_messages(
         )
 
     # Проверка, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -42,21 +97,29 @@ def get_assignment_messages(
             detail="Вы не являетесь участником этого курса"
         )
 
-    # Получение сообщений с пагинацией (от самых новых к старым)
-    messages = db.query(ChatMessage).filter(
+    # Получение сообщений с пагинацией (от самых новых к старым).
+    # before_id - курсор: сообщения старше указанного, по индексу (assignment_id, id).
+    # offset оставлен для старых клиентов и игнорируется, если передан before_id.
+    query = db.query(ChatMessage).filter(
         ChatMessage.assignment_id == assignment_id,
         ChatMessage.is_deleted == False
-    ).order_by(ChatMessage.created_at.desc()).offset(offset).limit(limit).all()
+    )
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+    query = query.order_by(ChatMessage.id.desc())
+    if before_id is None:
+        query = query.offset(offset)
+    messages = rows_with_display_names(query.limit(limit), ChatMessage.user)
 
     # Преобразование в response модель
     message_responses = []
-    for msg in messages:
+    for msg, username in messages:
         message_responses.append(MessageResponse(
             id=msg.id,
             assignment_id=msg.assignment_id,
             user_id=msg.user_id,
-            username=msg.user.username,
-            message=sanitize_message(msg.message),
+            username=username,
+            message=msg.message,  # Хранится уже отфильтрованным
             created_at=msg.created_at,
             is_deleted=msg.is_deleted
         ))
@@ -64,6 +127,63 @@ def get_assignment_messages(
     return message_responses
 
 
+@router.get("/assignments/{assignment_id}/messages/search", response_model=List[MessageSearchResponse])
+def search_assignment_messages(
+    assignment_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Проверка существования задания
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Задание не найдено"
+        )
+
+    # Проверка, что пользователь является участником курса
+    is_member = is_course_member(db, current_user, assignment.course_id)
+
+    if not is_member:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Вы не являетесь участником этого курса"
+        )
+
+    # id в порядке релевантности (FTS5 в SQLite, tsvector в PostgreSQL)
+    message_ids = search_chat_messages(db, assignment_id, q, offset, limit)
+    if not message_ids:
+        return []
+
+    rows = rows_with_display_names(
+        db.query(ChatMessage).filter(ChatMessage.id.in_(message_ids)),
+        ChatMessage.user,
+    )
+    rows_by_id = {msg.id: (msg, username) for msg, username in rows}
+    terms = get_search_terms(q)
+
+    results = []
+    for message_id in message_ids:
+        if message_id not in rows_by_id:
+            continue
+        msg, username = rows_by_id[message_id]
+        results.append(MessageSearchResponse(
+            id=msg.id,
+            assignment_id=msg.assignment_id,
+            user_id=msg.user_id,
+            username=username,
+            message=msg.message,
+            created_at=msg.created_at,
+            is_deleted=msg.is_deleted,
+            snippet=build_snippet(msg.message, terms)
+        ))
+
+    return results
+
+
 @router.post("/assignments/{assignment_id}/messages", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def send_message(
     assignment_id: int,
@@ -80,10 +200,7 @@ async def send_message(
         )
 
     # Проверка, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -97,10 +214,14 @@ async def send_message(
     new_message = ChatMessage(
         assignment_id=assignment_id,
         user_id=current_user.id,
-        message=sanitized_message
+        message=sanitized_message,
+        filter_version=FILTER_VERSION
     )
 
     db.add(new_message)
+    db.flush()
+    # Счетчики непрочитанных обновляются в той же транзакции, что и вставка
+    recipient_ids = record_new_message(db, assignment, new_message)
     db.commit()
     db.refresh(new_message)
 
@@ -125,6 +246,8 @@ async def send_message(
     )
     print(f"[Chat] WebSocket broadcast completed")
 
+    await push_unread_counts(db, assignment_id, recipient_ids)
+
     return message_response
 
 
@@ -153,6 +276,7 @@ async def delete_message(
         )
 
     # Помечаем сообщение как удаленное (мягкое удаление)
+    affected_user_ids = [] if message.is_deleted else record_deleted_message(db, message)
     message.is_deleted = True
     message.message = "[Deleted]"
     db.commit()
@@ -165,5 +289,6 @@ async def delete_message(
             "data": {"message_id": message_id}
         }
     )
+    await push_unread_counts(db, message.assignment_id, affected_user_ids)
 
     return None
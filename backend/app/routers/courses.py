@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Dict, Optional
 import random
 import string
@@ -10,6 +10,7 @@ from ..models.assignment import Assignment
 from ..models.submission import Submission
 from ..schemas.course import CourseCreate, CourseUpdate, CourseResponse, CourseJoin, CourseMemberResponse
 from ..utils.auth import get_current_user
+from ..utils.membership import is_course_member
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
@@ -150,10 +151,7 @@ def get_course(
         )
 
     # Проверка, что пользователь является участником
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, course_id)
 
     if not is_member:
         raise HTTPException(
@@ -229,7 +227,9 @@ def get_course_members(
             detail="Только создатель курса может просматривать участников"
         )
 
-    members = db.query(CourseMember).filter(CourseMember.course_id == course_id).all()
+    members = db.query(CourseMember).options(joinedload(CourseMember.user)).filter(
+        CourseMember.course_id == course_id
+    ).all()
 
     member_responses = []
     for member in members:
@@ -437,15 +437,18 @@ def get_course_ungraded_submissions(
     assignment_ids = [a.id for a in assignments]
 
     # Получаем все непроверенные сдачи по этим заданиям
-    ungraded_submissions = db.query(Submission).filter(
+    ungraded_submissions = db.query(Submission).options(
+        joinedload(Submission.student),
+        joinedload(Submission.assignment),
+    ).filter(
         Submission.assignment_id.in_(assignment_ids),
         Submission.score == None
     ).order_by(Submission.submitted_at.desc()).all()
 
     result = []
     for submission in ungraded_submissions:
-        student = db.query(User).filter(User.id == submission.student_id).first()
-        assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
+        student = submission.student
+        assignment = submission.assignment
 
         result.append({
             "submission_id": submission.id,
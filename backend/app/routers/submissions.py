@@ -1,15 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, case
 from typing import List, Optional
 from datetime import datetime
 import json
-import os
 import mimetypes
 from ..database import get_db
 from ..models.user import User
-from ..models.course import Course, CourseMember
+from ..models.course import Course
 from ..models.assignment import Assignment
 from ..models.submission import (
     Submission,
@@ -25,8 +23,18 @@ from ..schemas.submission import (
     ReviewAssetResponse,
     SubmissionFeedbackFileResponse,
 )
+from ..schemas.upload import UploadSessionCreate, UploadSessionResponse
 from ..utils.auth import get_current_user
-from ..utils.file_upload import save_upload_file, delete_file
+from ..utils.display_names import SUBMISSION_RESPONSE_OPTIONS, build_submission_response
+from ..utils.file_download import build_file_response
+from ..utils.file_upload import SavedUpload, save_upload_file, delete_file, upload_exists
+from ..utils.membership import is_course_member
+from ..utils.resumable_upload import (
+    build_session_response,
+    create_upload_session,
+    finalize_upload_session,
+    get_user_upload_session,
+)
 from ..utils.document_conversion import (
     is_word_file,
     is_pdf_file,
@@ -35,6 +43,7 @@ from ..utils.document_conversion import (
     convert_word_to_pdf,
     ConversionError,
 )
+from ..utils.storage_quota import add_storage_usage, ensure_storage_quota, get_remaining_quota
 from ..utils.websocket import manager
 
 router = APIRouter(prefix="/submissions", tags=["submissions"])
@@ -45,10 +54,6 @@ def _guess_mime_type(file_name: str, fallback: str = "application/octet-stream")
     return guessed or fallback
 
 
-def _to_abs_path(file_path: str) -> str:
-    return file_path if os.path.isabs(file_path) else os.path.join(os.getcwd(), file_path)
-
-
 def _is_submission_teacher(submission: Submission, user_id: int, db: Session) -> bool:
     assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
     if not assignment:
@@ -76,27 +81,57 @@ def _assert_submission_teacher(submission: Submission, user_id: int, db: Session
         )
 
 
+def _build_word_review_asset(submission_file: SubmissionFile, db: Session) -> SubmissionReviewAsset:
+    """
+    Готовит PDF для Word-файла. Если такой же документ уже конвертировался,
+    переиспользуем готовый PDF вместо повторного запуска LibreOffice.
+    """
+    existing_asset = None
+    if submission_file.content_hash:
+        existing_asset = db.query(SubmissionReviewAsset).join(
+            SubmissionFile,
+            SubmissionReviewAsset.submission_file_id == SubmissionFile.id,
+        ).filter(
+            SubmissionFile.content_hash == submission_file.content_hash,
+            SubmissionFile.id != submission_file.id,
+        ).first()
+
+    if existing_asset and upload_exists(existing_asset.review_file_path):
+        return SubmissionReviewAsset(
+            submission_file_id=submission_file.id,
+            review_file_path=existing_asset.review_file_path,
+            review_file_name=existing_asset.review_file_name,
+            mime_type=existing_asset.mime_type,
+            file_size=existing_asset.file_size,
+            content_hash=existing_asset.content_hash,
+        )
+
+    converted = convert_word_to_pdf(
+        source_file_path=submission_file.file_path,
+        source_file_name=submission_file.file_name,
+    )
+    return SubmissionReviewAsset(
+        submission_file_id=submission_file.id,
+        review_file_path=converted.file_path,
+        review_file_name=converted.file_name,
+        mime_type="application/pdf",
+        file_size=converted.file_size,
+        content_hash=converted.content_hash,
+    )
+
+
 def _ensure_word_review_asset(submission_file: SubmissionFile, db: Session) -> SubmissionReviewAsset:
     if submission_file.review_asset:
         return submission_file.review_asset
 
     try:
-        review_path, review_name = convert_word_to_pdf(
-            source_file_path=submission_file.file_path,
-            source_file_name=submission_file.file_name,
-        )
+        review_asset = _build_word_review_asset(submission_file, db)
     except ConversionError as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(exc),
         )
 
-    review_asset = SubmissionReviewAsset(
-        submission_file_id=submission_file.id,
-        review_file_path=review_path,
-        review_file_name=review_name,
-        mime_type="application/pdf",
-    )
     db.add(review_asset)
     db.commit()
     db.refresh(review_asset)
@@ -119,10 +154,7 @@ async def submit_assignment(
         )
 
     # Проверка, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -194,7 +226,7 @@ def get_assignment_submissions(
         )
 
     # Сортировка: сначала непроверенные, затем проверенные; внутри каждой группы - по дате сдачи (новые сверху)
-    submissions = db.query(Submission).filter(
+    submissions = db.query(Submission).options(*SUBMISSION_RESPONSE_OPTIONS).filter(
         Submission.assignment_id == assignment_id,
         Submission.is_deleted == 0  # Фильтруем удалённые сдачи
     ).order_by(
@@ -222,15 +254,7 @@ def get_assignment_submissions(
     if len(valid_submissions) < len(submissions):
         db.commit()
 
-    responses = []
-    for submission in valid_submissions:
-        response = SubmissionResponse.model_validate(submission)
-        # Добавляем имя студента
-        student = db.query(User).filter(User.id == submission.student_id).first()
-        response.student_name = student.username if student else None
-        responses.append(response)
-
-    return responses
+    return [build_submission_response(submission) for submission in valid_submissions]
 
 
 @router.get("/{submission_id}", response_model=SubmissionResponse)
@@ -256,9 +280,7 @@ def get_submission(
             detail="Доступ запрещен"
         )
 
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     return response
 
@@ -270,7 +292,7 @@ async def mark_submission_viewed(
     db: Session = Depends(get_db)
 ):
     """Пометить сдачу как просмотренную учителем"""
-    submission = db.query(Submission).filter(
+    submission = db.query(Submission).options(*SUBMISSION_RESPONSE_OPTIONS).filter(
         Submission.id == submission_id,
         Submission.is_deleted == 0
     ).first()
@@ -294,11 +316,12 @@ async def mark_submission_viewed(
     if submission.viewed_by_teacher == 0:
         submission.viewed_by_teacher = 1
         db.commit()
-        db.refresh(submission)
+        # Перечитываем сдачу вместе со студентом и файлами одним набором запросов
+        submission = db.query(Submission).options(*SUBMISSION_RESPONSE_OPTIONS).populate_existing().filter(
+            Submission.id == submission_id
+        ).first()
 
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     # Отправляем WebSocket уведомление студенту
     await manager.broadcast_to_assignment(
@@ -327,10 +350,7 @@ def get_my_attempts_info(
         )
 
     # Проверка, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -364,10 +384,7 @@ def get_my_submission(
         )
 
     # Проверка, что пользователь является участником курса
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not is_member:
         raise HTTPException(
@@ -499,9 +516,7 @@ async def grade_submission(
     db.commit()
     db.refresh(submission)
 
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     # Отправляем WebSocket уведомление
     await manager.broadcast_to_assignment(
@@ -524,54 +539,25 @@ async def grade_submission(
     return response
 
 
-@router.post("/{submission_id}/files", status_code=status.HTTP_201_CREATED)
-async def upload_submission_file(
-    submission_id: int,
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
-    if not submission:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Сдача не найдена"
-        )
-
-    # Только студент, который сдал работу, может загружать файлы
-    if submission.student_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только автор сдачи может загружать файлы"
-        )
-
-    # Сохранение файла
-    file_path, file_name = save_upload_file(file)
-
-    # Создание записи в БД
+async def _attach_submission_file(submission: Submission, saved: SavedUpload, db: Session) -> SubmissionFile:
+    """Создает запись о файле сдачи, готовит PDF для Word и рассылает обновление"""
     submission_file = SubmissionFile(
-        submission_id=submission_id,
-        file_path=file_path,
-        file_name=file_name
+        submission_id=submission.id,
+        file_path=saved.file_path,
+        file_name=saved.file_name,
+        file_size=saved.file_size,
+        content_hash=saved.content_hash,
     )
 
     db.add(submission_file)
+    add_storage_usage(db, submission.student_id, submission.assignment.course_id, saved.file_size)
     db.commit()
     db.refresh(submission_file)
 
     # Для Word файлов создаем PDF
     if is_word_file(submission_file.file_name):
         try:
-            review_path, review_name = convert_word_to_pdf(
-                source_file_path=submission_file.file_path,
-                source_file_name=submission_file.file_name,
-            )
-            review_asset = SubmissionReviewAsset(
-                submission_file_id=submission_file.id,
-                review_file_path=review_path,
-                review_file_name=review_name,
-                mime_type="application/pdf",
-            )
+            review_asset = _build_word_review_asset(submission_file, db)
             db.add(review_asset)
             db.commit()
         except ConversionError as exc:
@@ -582,9 +568,7 @@ async def upload_submission_file(
     db.refresh(submission)
     assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
 
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     # Отправляем WebSocket уведомление об обновлении посылке
     await manager.broadcast_to_assignment(
@@ -595,6 +579,93 @@ async def upload_submission_file(
         }
     )
 
+    return submission_file
+
+
+def _get_own_submission(submission_id: int, current_user: User, db: Session) -> Submission:
+    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+    if not submission:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Сдача не найдена"
+        )
+
+    # Только студент, который сдал работу, может загружать файлы
+    if submission.student_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Только автор сдачи может загружать файлы"
+        )
+    return submission
+
+
+@router.post("/{submission_id}/files", status_code=status.HTTP_201_CREATED)
+async def upload_submission_file(
+    submission_id: int,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    submission = _get_own_submission(submission_id, current_user, db)
+
+    # Сохранение файла
+    saved = await save_upload_file(
+        file,
+        max_bytes=get_remaining_quota(db, current_user.id, submission.assignment.course_id),
+    )
+    submission_file = await _attach_submission_file(submission, saved, db)
+
+    return {
+        "id": submission_file.id,
+        "file_name": submission_file.file_name,
+        "message": "File uploaded successfully"
+    }
+
+
+@router.post("/{submission_id}/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_submission_upload_session(
+    submission_id: int,
+    session_data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Начать возобновляемую загрузку файла сдачи (части отправляются в PUT /uploads/{id})"""
+    submission = _get_own_submission(submission_id, current_user, db)
+    ensure_storage_quota(db, current_user.id, submission.assignment.course_id, session_data.file_size)
+
+    upload_session = create_upload_session(
+        db,
+        user_id=current_user.id,
+        target_type="submission",
+        target_id=submission_id,
+        file_name=session_data.file_name,
+        file_size=session_data.file_size,
+    )
+    return build_session_response(upload_session)
+
+
+@router.post("/{submission_id}/uploads/{session_id}/finalize", status_code=status.HTTP_201_CREATED)
+async def finalize_submission_upload_session(
+    submission_id: int,
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Завершить возобновляемую загрузку и прикрепить файл к сдаче"""
+    submission = _get_own_submission(submission_id, current_user, db)
+
+    upload_session = get_user_upload_session(db, session_id, current_user.id)
+    if upload_session.target_type != "submission" or upload_session.target_id != submission_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Сессия загрузки не найдена"
+        )
+
+    # Квота могла закончиться, пока шла загрузка
+    ensure_storage_quota(db, current_user.id, submission.assignment.course_id, upload_session.file_size)
+    saved = await finalize_upload_session(db, upload_session)
+    submission_file = await _attach_submission_file(submission, saved, db)
+
     return {
         "id": submission_file.id,
         "file_name": submission_file.file_name,
@@ -692,16 +763,20 @@ async def upload_submission_feedback_file(
                 detail="Исходный файл для обратной связи не найден"
             )
 
-    feedback_path, feedback_name = save_upload_file(file)
+    course_id = submission.assignment.course_id
+    saved = await save_upload_file(file, max_bytes=get_remaining_quota(db, current_user.id, course_id))
     feedback_record = SubmissionFeedbackFile(
         submission_id=submission_id,
         teacher_id=current_user.id,
         source_submission_file_id=source_submission_file_id,
-        file_path=feedback_path,
-        file_name=feedback_name,
-        mime_type=_guess_mime_type(feedback_name),
+        file_path=saved.file_path,
+        file_name=saved.file_name,
+        mime_type=_guess_mime_type(saved.file_name),
+        file_size=saved.file_size,
+        content_hash=saved.content_hash,
     )
     db.add(feedback_record)
+    add_storage_usage(db, current_user.id, course_id, saved.file_size)
     db.commit()
     db.refresh(feedback_record)
 
@@ -712,9 +787,7 @@ async def upload_submission_feedback_file(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Задание не найдено"
         )
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     await manager.broadcast_to_assignment(
         assignment.id,
@@ -781,17 +854,10 @@ async def download_submission_feedback_file(
             detail="Файл обратной связи не найден"
         )
 
-    abs_file_path = _to_abs_path(feedback_file.file_path)
-    if not os.path.exists(abs_file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на сервере"
-        )
-
-    return FileResponse(
-        path=abs_file_path,
-        media_type="application/octet-stream",
-        filename=feedback_file.file_name,
+    return build_file_response(
+        feedback_file.file_path,
+        feedback_file.file_name,
+        content_hash=feedback_file.content_hash,
     )
 
 
@@ -839,14 +905,24 @@ async def replace_submission_feedback_file(
         feedback_file.source_submission_file_id = source_submission_file_id
 
     old_file_path = feedback_file.file_path
-    new_file_path, new_file_name = save_upload_file(file)
-    feedback_file.file_path = new_file_path
-    feedback_file.file_name = new_file_name
-    feedback_file.mime_type = _guess_mime_type(new_file_name)
+    old_file_size = feedback_file.file_size or 0
+    course_id = submission.assignment.course_id
+    remaining_quota = get_remaining_quota(db, feedback_file.teacher_id, course_id)
+    saved = await save_upload_file(
+        file,
+        # Старый файл заменяется, его объем освобождается
+        max_bytes=None if remaining_quota is None else remaining_quota + old_file_size,
+    )
+    add_storage_usage(db, feedback_file.teacher_id, course_id, saved.file_size - old_file_size)
+    feedback_file.file_path = saved.file_path
+    feedback_file.file_name = saved.file_name
+    feedback_file.mime_type = _guess_mime_type(saved.file_name)
+    feedback_file.file_size = saved.file_size
+    feedback_file.content_hash = saved.content_hash
 
     db.commit()
     db.refresh(feedback_file)
-    delete_file(old_file_path)
+    delete_file(old_file_path, db)
 
     db.refresh(submission)
     assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
@@ -855,9 +931,7 @@ async def replace_submission_feedback_file(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Задание не найдено"
         )
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     await manager.broadcast_to_assignment(
         assignment.id,
@@ -901,8 +975,14 @@ async def delete_submission_feedback_file(
 
     feedback_path = feedback_file.file_path
     db.delete(feedback_file)
+    add_storage_usage(
+        db,
+        feedback_file.teacher_id,
+        submission.assignment.course_id,
+        -(feedback_file.file_size or 0),
+    )
     db.commit()
-    delete_file(feedback_path)
+    delete_file(feedback_path, db)
 
     db.refresh(submission)
     assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
@@ -911,9 +991,7 @@ async def delete_submission_feedback_file(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Задание не найдено"
         )
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     await manager.broadcast_to_assignment(
         assignment.id,
@@ -953,10 +1031,11 @@ async def delete_submission_file(
             detail="Только автор сдачи может удалять файлы"
         )
 
-    # Удаление файла из файловой системы
-    delete_file(file_record.file_path)
+    # Пути запоминаем до удаления записи: файлы удаляются после коммита,
+    # когда на них не останется ссылок
+    paths_to_delete = [file_record.file_path]
     if file_record.review_asset:
-        delete_file(file_record.review_asset.review_file_path)
+        paths_to_delete.append(file_record.review_asset.review_file_path)
 
     linked_feedback = db.query(SubmissionFeedbackFile).filter(
         SubmissionFeedbackFile.source_submission_file_id == file_record.id
@@ -966,14 +1045,17 @@ async def delete_submission_file(
 
     # Удаление записи из БД
     db.delete(file_record)
+    add_storage_usage(db, submission.student_id, submission.assignment.course_id, -(file_record.file_size or 0))
     db.commit()
 
+    # Удаление файлов из файловой системы
+    for path in paths_to_delete:
+        delete_file(path, db)
+
     db.refresh(submission)
     assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
 
-    response = SubmissionResponse.model_validate(submission)
-    student = db.query(User).filter(User.id == submission.student_id).first()
-    response.student_name = student.username if student else None
+    response = build_submission_response(submission)
 
     # Отправляем WebSocket уведомление об обновлении посылки
     await manager.broadcast_to_assignment(
@@ -1089,10 +1171,7 @@ async def download_submission_file(
 
     # Проверяем права доступа
     is_author = submission.student_id == current_user.id
-    is_member = db.query(CourseMember).filter(
-        CourseMember.course_id == assignment.course_id,
-        CourseMember.user_id == current_user.id
-    ).first()
+    is_member = is_course_member(db, current_user, assignment.course_id)
 
     if not (is_author or is_member):
         raise HTTPException(
@@ -1111,16 +1190,8 @@ async def download_submission_file(
             detail="Файл не найден"
         )
 
-    file_path = os.path.join(os.getcwd(), file_record.file_path)
-
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Файл не найден на сервере"
-        )
-
-    return FileResponse(
-        path=file_path,
-        media_type='application/octet-stream',
-        filename=file_record.file_name
+    return build_file_response(
+        file_record.file_path,
+        file_record.file_name,
+        content_hash=file_record.content_hash,
     )
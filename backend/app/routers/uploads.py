@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Query, Request, status
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..models.user import User
+from ..schemas.upload import UploadSessionResponse
+from ..utils.auth import get_current_user
+from ..utils.resumable_upload import (
+    append_chunk,
+    build_session_response,
+    discard_upload_session,
+    get_user_upload_session,
+    sync_received_bytes,
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+@router.get("/{session_id}", response_model=UploadSessionResponse)
+def get_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Текущее смещение сессии: с него клиент продолжает загрузку после обрыва"""
+    upload_session = get_user_upload_session(db, session_id, current_user.id)
+    upload_session = sync_received_bytes(db, upload_session)
+    return build_session_response(upload_session)
+
+
+@router.put("/{session_id}", response_model=UploadSessionResponse)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Дописать часть файла. Тело запроса - сырые байты части, offset - её начало"""
+    upload_session = get_user_upload_session(db, session_id, current_user.id)
+    upload_session = await append_chunk(db, upload_session, offset, request)
+    return build_session_response(upload_session)
+
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def cancel_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    upload_session = get_user_upload_session(db, session_id, current_user.id)
+    discard_upload_session(db, upload_session)
+    return None
@@ -1,7 +1,13 @@
-from .user import UserCreate, UserLogin, UserResponse, Token
+from .user import UserCreate, UserLogin, UserResponse, Token, RefreshTokenRequest
 from .course import CourseCreate, CourseUpdate, CourseResponse, CourseJoin, CourseMemberResponse
 from .assignment import AssignmentCreate, AssignmentUpdate, AssignmentResponse, AssignmentFileResponse
-from .message import MessageCreate, MessageResponse
+from .message import (
+    MessageCreate,
+    MessageResponse,
+    MessageSearchResponse,
+    UnreadCountResponse,
+    MarkChatReadRequest,
+)
 from .submission import (
     SubmissionCreate,
     SubmissionGrade,
@@ -11,12 +17,14 @@ from .submission import (
     SubmissionReviewAssetResponse,
     ReviewAssetResponse,
 )
+from .upload import UploadSessionCreate, UploadSessionResponse, StorageUsageResponse
 
 __all__ = [
     "UserCreate",
     "UserLogin",
     "UserResponse",
     "Token",
+    "RefreshTokenRequest",
     "CourseCreate",
     "CourseUpdate",
     "CourseResponse",
@@ -28,6 +36,9 @@ __all__ = [
     "AssignmentFileResponse",
     "MessageCreate",
     "MessageResponse",
+    "MessageSearchResponse",
+    "UnreadCountResponse",
+    "MarkChatReadRequest",
     "SubmissionCreate",
     "SubmissionGrade",
     "SubmissionResponse",
@@ -35,4 +46,7 @@ __all__ = [
     "SubmissionFeedbackFileResponse",
     "SubmissionReviewAssetResponse",
     "ReviewAssetResponse",
+    "UploadSessionCreate",
+    "UploadSessionResponse",
+    "StorageUsageResponse",
 ]
@@ -29,6 +29,7 @@ class AssignmentFileResponse(BaseModel):
     id: int
     file_name: str
     file_path: str
+    file_size: Optional[int] = None
     uploaded_at: datetime
 
     class Config:
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import Optional
 from datetime import datetime
 
 
@@ -17,3 +18,17 @@ class MessageResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class MessageSearchResponse(MessageResponse):
+    snippet: str  # HTML: текст экранирован, совпадения в <mark>
+
+
+class UnreadCountResponse(BaseModel):
+    assignment_id: int
+    unread_count: int
+    last_read_message_id: int
+
+
+class MarkChatReadRequest(BaseModel):
+    last_message_id: Optional[int] = Field(None, ge=1)  # По умолчанию - последнее сообщение
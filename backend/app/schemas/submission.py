@@ -9,6 +9,7 @@ class SubmissionReviewAssetResponse(BaseModel):
     review_file_path: str
     review_file_name: str
     mime_type: str
+    file_size: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -19,6 +20,7 @@ class SubmissionFileResponse(BaseModel):
     id: int
     file_name: str
     file_path: str
+    file_size: Optional[int] = None
     uploaded_at: datetime
     review_asset: Optional[SubmissionReviewAssetResponse] = None
 
@@ -34,6 +36,7 @@ class SubmissionFeedbackFileResponse(BaseModel):
     file_path: str
     file_name: str
     mime_type: str
+    file_size: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Literal
+
+
+class UploadSessionCreate(BaseModel):
+    file_name: str = Field(..., min_length=1, max_length=255)
+    file_size: int = Field(..., ge=0)
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    target_type: str
+    target_id: int
+    file_name: str
+    file_size: int
+    offset: int
+    created_at: datetime
+    updated_at: datetime
+
+
+class StorageUsageResponse(BaseModel):
+    kind: Literal["user", "course"]
+    id: int
+    name: str
+    storage_used_bytes: int
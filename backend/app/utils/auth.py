@@ -1,24 +1,62 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Optional, Tuple
+
+import anyio.from_thread
+import jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from ..config import settings
 from ..database import get_db
 from ..models.user import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .password_pool import password_pool
+from .rate_limit import enforce_rate_limit
+from .token_revocation import is_token_revoked
+from .user_cache import get_user_cached
+
+# Стоимость bcrypt задается PASSWORD_HASH_ROUNDS; хеши с другой стоимостью
+# пересчитываются при следующем входе (verify_and_update_password)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Проверенные payload по sha256 токена: SPA шлет десятки запросов с одним токеном,
+# повторно подпись не проверяется до истечения exp
+_payload_cache: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+_payload_cache_lock = threading.Lock()
+
+
+def _run_in_password_pool(func, *args):
+    """
+    Обработчики с bcrypt - обычные def: запросы к БД выполняются в потоке
+    пула Starlette, а не в цикле событий. Сам хеш считается в password_pool,
+    задача ставится в него через цикл событий (anyio.from_thread.run).
+    """
+    return anyio.from_thread.run(password_pool.run, func, *args)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _run_in_password_pool(pwd_context.verify, plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля; вторым значением - новый хеш, если стоимость хеша устарела"""
+    return _run_in_password_pool(pwd_context.verify_and_update, plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _run_in_password_pool(pwd_context.hash, password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -27,16 +65,49 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # iat с долями секунды: по нему сравнивается время отзыва токенов пользователя
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
+def create_user_access_token(user: User) -> str:
+    """
+    Короткоживущий access-токен с claims для авторизации без БД:
+    adm - флаг администратора, mv - версия членства в курсах на момент выдачи.
+    """
+    return create_access_token(data={
+        "sub": str(user.id),
+        "adm": bool(user.is_admin),
+        "mv": user.membership_version or 0,
+    })
+
+
+def _decode_payload(token: str) -> dict:
+    """Проверяет подпись и exp токена; бросает jwt.PyJWTError"""
+    digest = hashlib.sha256(token.encode()).digest()
+    with _payload_cache_lock:
+        item = _payload_cache.get(digest)
+        if item is not None:
+            if item[0] > time.time():
+                _payload_cache.move_to_end(digest)
+                return dict(item[1])
+            del _payload_cache[digest]
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    expires_at = payload.get("exp")
+    if settings.TOKEN_CACHE_MAX_SIZE > 0 and isinstance(expires_at, (int, float)):
+        with _payload_cache_lock:
+            _payload_cache[digest] = (expires_at, dict(payload))
+            while len(_payload_cache) > settings.TOKEN_CACHE_MAX_SIZE:
+                _payload_cache.popitem(last=False)
+    return payload
+
+
 def decode_token(token: str) -> dict:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError as e:
+        return _decode_payload(token)
+    except jwt.PyJWTError as e:
         print(f"JWT decode error: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,12 +116,42 @@ def decode_token(token: str) -> dict:
         )
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    token = credentials.credentials
-    payload = decode_token(token)
+def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Проверенный и не отозванный payload access-токена"""
+    payload = decode_token(credentials.credentials)
+    if is_token_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Токен отозван, обновите его",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+def rate_limit_by_token(scope: str):
+    """
+    Зависимость для эндпоинтов с авторизацией: ограничение по IP и по sub
+    access-токена. Подключается через dependencies маршрута, поэтому
+    выполняется раньше get_current_user и до обращения к БД. Подпись
+    проверяется без запросов; с неверным токеном считается только ведро IP,
+    а 401 вернет get_current_user.
+    """
+    def dependency(
+        request: Request,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    ):
+        user_id = None
+        if credentials is not None:
+            try:
+                user_id = _decode_payload(credentials.credentials).get("sub")
+            except jwt.PyJWTError:
+                pass
+        enforce_rate_limit(request, scope, user_id=user_id)
+
+    return dependency
+
+
+def _get_user_from_payload(payload: dict, db: Session) -> User:
     user_id_str = payload.get("sub")
 
     if user_id_str is None:
@@ -68,7 +169,8 @@ def get_current_user(
             detail="Неверный формат ID пользователя",
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Снимок пользователя из кэша процесса, без запроса к БД (см. utils/user_cache.py)
+    user = get_user_cached(db, user_id)
     if user is None:
         print(f"Error: User with ID {user_id} not found in database")
         raise HTTPException(
@@ -76,10 +178,30 @@ def get_current_user(
             detail="Пользователь не найден",
         )
 
+    # Версия членства из токена: по ней кэшируются проверки участия в курсах
+    user.token_membership_version = payload.get("mv")
     return user
 
 
-def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+) -> User:
+    return _get_user_from_payload(payload, db)
+
+
+def get_current_admin(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+) -> User:
+    # Не администратор по claim - отказ без обращения к пользователю;
+    # у старых токенов без claim решает флаг в БД
+    if payload.get("adm") is False:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав доступа",
+        )
+    current_user = _get_user_from_payload(payload, db)
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -91,12 +213,12 @@ def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
 def verify_token(token: str) -> Optional[int]:
     # Проверить токен и вернуть user_id (для WebSocket)
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = _decode_payload(token)
         user_id_str = payload.get("sub")
-        if user_id_str is None:
+        if user_id_str is None or is_token_revoked(payload):
             return None
         return int(user_id_str)
-    except (JWTError, ValueError, TypeError):
+    except (jwt.PyJWTError, ValueError, TypeError):
         return None
 
 
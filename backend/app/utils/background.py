@@ -0,0 +1,17 @@
+import asyncio
+from typing import Callable
+
+
+async def _run_periodically(name: str, interval_seconds: float, job: Callable[[], None]):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            # Задачи синхронные (работа с БД и диском), поэтому выполняем их в потоке
+            await asyncio.to_thread(job)
+        except Exception as exc:
+            print(f"[Background] Job '{name}' failed: {exc}")
+
+
+def start_periodic_job(name: str, interval_seconds: float, job: Callable[[], None]) -> asyncio.Task:
+    """Запускает job каждые interval_seconds в текущем event loop"""
+    return asyncio.create_task(_run_periodically(name, interval_seconds, job), name=name)
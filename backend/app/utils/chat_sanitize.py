@@ -0,0 +1,60 @@
+from typing import NamedTuple
+
+from sqlalchemy import or_
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.message import ChatMessage
+from .message_filter import FILTER_VERSION, sanitize_many
+
+# Версия фильтра, для которой проход уже завершился в этом процессе
+_clean_version = None
+
+
+class ResanitizeReport(NamedTuple):
+    checked: int
+    changed: int
+
+
+def resanitize_chat_messages(batch_size: int = 500) -> ResanitizeReport:
+    """
+    Прогоняет через фильтр сообщения, проверенные старой версией списка слов
+    (или до появления версий). Сообщения обходятся пачками по id, на каждую
+    пачку - своя короткая сессия. Текст хранится уже отфильтрованным, поэтому
+    проход только дополнительно скрывает слова, добавленные в список.
+    """
+    checked = 0
+    changed = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.id > last_id,
+                or_(ChatMessage.filter_version.is_(None), ChatMessage.filter_version != FILTER_VERSION),
+            ).order_by(ChatMessage.id).limit(batch_size).all()
+            if not messages:
+                break
+
+            for message, sanitized in zip(messages, sanitize_many(message.message for message in messages)):
+                if sanitized != message.message:
+                    message.message = sanitized
+                    changed += 1
+                message.filter_version = FILTER_VERSION
+            checked += len(messages)
+            last_id = messages[-1].id
+            db.commit()
+        finally:
+            db.close()
+
+    return ResanitizeReport(checked=checked, changed=changed)
+
+
+def run_chat_resanitize():
+    global _clean_version
+    if _clean_version == FILTER_VERSION:
+        return
+    report = resanitize_chat_messages(settings.CHAT_RESANITIZE_BATCH_SIZE)
+    _clean_version = FILTER_VERSION
+    if report.checked:
+        print(f"[Chat] Resanitized {report.checked} message(s), changed {report.changed}")
@@ -0,0 +1,276 @@
+import html
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from ..database import engine
+from ..models.message import ChatMessage
+from .message_filter import get_morph
+
+# Не больше стольких слов из запроса участвуют в поиске
+MAX_SEARCH_TERMS = 8
+# Сколько слов вокруг первого совпадения оставлять в сниппете
+SNIPPET_CONTEXT_WORDS = 6
+# Сколько сообщений лемматизируется за один запрос при построении индекса
+LEMMA_BACKFILL_BATCH_SIZE = 1000
+
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+_SNIPPET_TOKEN_PATTERN = re.compile(r"\S+")
+
+FTS_TABLE_NAME = "chat_messages_lemma_fts"
+# Индекс по исходным словам без лемм: удаляется и строится заново
+LEGACY_FTS_TABLE_NAMES = ("chat_messages_fts",)
+
+# Способ поиска определяется один раз на процесс: "fts5", "tsvector" или "like"
+_search_mode: Optional[str] = None
+
+
+def _normalized_sql(column: str) -> str:
+    """ё -> е в SQL: токенизаторы SQLite и PostgreSQL их не отождествляют"""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _normalize_term(term: str) -> str:
+    return term.lower().replace("ё", "е")
+
+
+@lru_cache(maxsize=50000)
+def _lemma(word: str) -> str:
+    parsed = get_morph().parse(word)
+    if not parsed:
+        return word
+    return _normalize_term(parsed[0].normal_form)
+
+
+def _word_variants(word: str) -> List[str]:
+    """Нормализованное слово и его лемма (если отличается)"""
+    normalized = _normalize_term(word)
+    lemma = _lemma(normalized)
+    return [normalized] if lemma == normalized else [normalized, lemma]
+
+
+def build_search_lemmas(message: str) -> str:
+    """
+    Текст для FTS5: каждое слово и его лемма. unicode61 не знает русской
+    морфологии, поэтому «книги» индексируется еще и как «книга»; исходные
+    слова остаются для префиксного поиска по недописанному слову.
+    """
+    return " ".join(variant for word in SEARCH_TERM_PATTERN.findall(message) for variant in _word_variants(word))
+
+
+@event.listens_for(ChatMessage, "before_insert")
+def _on_message_insert(mapper, connection, target):
+    # PostgreSQL лемматизирует сам (to_tsvector('russian')), колонка нужна только SQLite
+    if connection.dialect.name == "sqlite":
+        target.search_lemmas = build_search_lemmas(target.message or "")
+
+
+@event.listens_for(ChatMessage, "before_update")
+def _on_message_update(mapper, connection, target):
+    if connection.dialect.name == "sqlite" and inspect(target).attrs.message.history.has_changes():
+        target.search_lemmas = build_search_lemmas(target.message or "")
+
+
+def _indexed_sql(row: str) -> str:
+    # Строки, записанные в обход ORM (без лемм), индексируются хотя бы по исходным словам
+    return f"COALESCE({row}.search_lemmas, {_normalized_sql(f'{row}.message')})"
+
+
+# Индекс хранит только токены (content=''), сниппет строится по исходному сообщению.
+# Удаленные сообщения в индекс не попадают.
+SQLITE_FTS_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE_NAME} USING fts5("
+    f"message, content='', tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_insert AFTER INSERT ON chat_messages "
+    f"WHEN COALESCE(new.is_deleted, 0) = 0 BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}(rowid, message) VALUES (new.id, {_indexed_sql('new')}); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_update "
+    f"AFTER UPDATE OF message, search_lemmas, is_deleted ON chat_messages BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, message) "
+    f"SELECT 'delete', old.id, {_indexed_sql('old')} WHERE COALESCE(old.is_deleted, 0) = 0; "
+    f"INSERT INTO {FTS_TABLE_NAME}(rowid, message) "
+    f"SELECT new.id, {_indexed_sql('new')} WHERE COALESCE(new.is_deleted, 0) = 0; "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE_NAME}_delete AFTER DELETE ON chat_messages "
+    f"WHEN COALESCE(old.is_deleted, 0) = 0 BEGIN "
+    f"INSERT INTO {FTS_TABLE_NAME}({FTS_TABLE_NAME}, rowid, message) "
+    f"VALUES ('delete', old.id, {_indexed_sql('old')}); "
+    f"END",
+    # Первичное заполнение по уже существующим сообщениям
+    f"INSERT INTO {FTS_TABLE_NAME}(rowid, message) "
+    f"SELECT id, {_indexed_sql('chat_messages')} FROM chat_messages WHERE COALESCE(is_deleted, 0) = 0",
+]
+
+# Сгенерированная колонка пересчитывается самой БД при вставке и изменении сообщения;
+# словарь russian приводит слова к основе (snowball), лемматизация в Python не нужна
+_POSTGRES_SEARCH_DOCUMENT = _normalized_sql("coalesce(message, '')")
+POSTGRES_FTS_STATEMENTS = [
+    "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('russian', {_POSTGRES_SEARCH_DOCUMENT})) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_search_vector ON chat_messages USING GIN (search_vector)",
+]
+
+
+def _sqlite_has_fts5(connection) -> bool:
+    try:
+        options = connection.execute(text("PRAGMA compile_options")).scalars().all()
+    except Exception:
+        return False
+    return "ENABLE_FTS5" in options
+
+
+def _drop_legacy_fts(connection, table_names):
+    for table_name in LEGACY_FTS_TABLE_NAMES:
+        if table_name not in table_names:
+            continue
+        for suffix in ("insert", "update", "delete"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table_name}_{suffix}"))
+        connection.execute(text(f"DROP TABLE {table_name}"))
+        print(f"[Chat search] Dropped legacy index {table_name}")
+
+
+def _fill_search_lemmas(connection) -> int:
+    """Лемматизирует сообщения, записанные до появления колонки search_lemmas"""
+    filled = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, message FROM chat_messages "
+                "WHERE id > :last_id AND search_lemmas IS NULL AND COALESCE(is_deleted, 0) = 0 "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": LEMMA_BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            return filled
+        connection.execute(
+            text("UPDATE chat_messages SET search_lemmas = :lemmas WHERE id = :id"),
+            [{"id": row.id, "lemmas": build_search_lemmas(row.message or "")} for row in rows],
+        )
+        filled += len(rows)
+        last_id = rows[-1].id
+
+
+def setup_chat_search_index():
+    """Создает полнотекстовый индекс чата, если его ещё нет (вызывается при старте)"""
+    dialect = engine.dialect.name
+    with engine.begin() as connection:
+        table_names = set(inspect(connection).get_table_names())
+        if "chat_messages" not in table_names:
+            return
+        if dialect == "sqlite":
+            if FTS_TABLE_NAME in table_names or not _sqlite_has_fts5(connection):
+                return
+            _drop_legacy_fts(connection, table_names)
+            filled = _fill_search_lemmas(connection)
+            for statement in SQLITE_FTS_STATEMENTS:
+                connection.execute(text(statement))
+            print(f"[Chat search] Built FTS5 index, lemmatized {filled} message(s)")
+        elif dialect == "postgresql":
+            for statement in POSTGRES_FTS_STATEMENTS:
+                connection.execute(text(statement))
+
+
+def get_search_terms(query: str) -> List[str]:
+    terms = []
+    for term in SEARCH_TERM_PATTERN.findall(query):
+        normalized = _normalize_term(term)
+        if normalized not in terms:
+            terms.append(normalized)
+    return terms[:MAX_SEARCH_TERMS]
+
+
+def _get_search_mode(db: Session) -> str:
+    global _search_mode
+    if _search_mode is None:
+        bind = db.get_bind()
+        if bind.dialect.name == "sqlite" and FTS_TABLE_NAME in inspect(bind).get_table_names():
+            _search_mode = "fts5"
+        elif bind.dialect.name == "postgresql":
+            _search_mode = "tsvector"
+        else:
+            _search_mode = "like"
+    return _search_mode
+
+
+def _search_ids(db: Session, assignment_id: int, terms: List[str], offset: int, limit: int) -> List[int]:
+    params = {"assignment_id": assignment_id, "offset": offset, "limit": limit}
+    mode = _get_search_mode(db)
+
+    if mode == "fts5":
+        # Каждое слово - префиксный запрос по нему самому или его лемме, слова объединяются через AND
+        params["query"] = " AND ".join(
+            "(" + " OR ".join(f'"{variant}"*' for variant in _word_variants(term)) + ")" for term in terms
+        )
+        statement = text(
+            f"SELECT m.id FROM {FTS_TABLE_NAME} "
+            f"JOIN chat_messages m ON m.id = {FTS_TABLE_NAME}.rowid "
+            f"WHERE {FTS_TABLE_NAME} MATCH :query AND m.assignment_id = :assignment_id "
+            f"ORDER BY bm25({FTS_TABLE_NAME}), m.id DESC LIMIT :limit OFFSET :offset"
+        )
+    elif mode == "tsvector":
+        params["query"] = " & ".join(f"{term}:*" for term in terms)
+        statement = text(
+            "SELECT m.id FROM chat_messages m, to_tsquery('russian', :query) query "
+            "WHERE m.search_vector @@ query AND m.assignment_id = :assignment_id AND m.is_deleted = false "
+            "ORDER BY ts_rank(m.search_vector, query) DESC, m.id DESC LIMIT :limit OFFSET :offset"
+        )
+    else:
+        # Без полнотекстового индекса: подстроки, новые сверху
+        conditions = []
+        for index, term in enumerate(terms):
+            params[f"term_{index}"] = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append(f"lower({_normalized_sql('m.message')}) LIKE :term_{index} ESCAPE '\\'")
+        statement = text(
+            "SELECT m.id FROM chat_messages m "
+            f"WHERE m.assignment_id = :assignment_id AND m.is_deleted = :deleted AND {' AND '.join(conditions)} "
+            "ORDER BY m.id DESC LIMIT :limit OFFSET :offset"
+        )
+        params["deleted"] = False
+
+    return [row[0] for row in db.execute(statement, params)]
+
+
+def build_snippet(message: str, terms: List[str]) -> str:
+    """
+    Фрагмент сообщения вокруг первого совпадения. Текст экранируется как HTML,
+    слова, которые сами или леммой начинаются с искомого слова или его леммы
+    (как в запросе к FTS5), оборачиваются в <mark>.
+    """
+    prefixes = tuple({variant for term in terms for variant in _word_variants(term)})
+    tokens = _SNIPPET_TOKEN_PATTERN.findall(message)
+    matched = [
+        any(
+            variant.startswith(prefixes)
+            for word in SEARCH_TERM_PATTERN.findall(token)
+            for variant in _word_variants(word)
+        )
+        for token in tokens
+    ]
+    first_match = matched.index(True) if True in matched else 0
+    start = max(first_match - SNIPPET_CONTEXT_WORDS, 0)
+    end = min(first_match + SNIPPET_CONTEXT_WORDS + 1, len(tokens))
+
+    parts = []
+    for token, is_match in zip(tokens[start:end], matched[start:end]):
+        escaped = html.escape(token)
+        parts.append(f"<mark>{escaped}</mark>" if is_match else escaped)
+    snippet = " ".join(parts)
+    if start > 0:
+        snippet = "… " + snippet
+    if end < len(tokens):
+        snippet += " …"
+    return snippet
+
+
+def search_chat_messages(db: Session, assignment_id: int, query: str, offset: int, limit: int) -> List[int]:
+    """id подходящих сообщений задания в порядке релевантности"""
+    terms = get_search_terms(query)
+    if not terms:
+        return []
+    return _search_ids(db, assignment_id, terms, offset, limit)
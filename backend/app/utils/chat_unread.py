@@ -0,0 +1,149 @@
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models.assignment import Assignment
+from ..models.course import CourseMember
+from ..models.message import ChatMessage, ChatReadMarker
+from .websocket import manager
+
+
+class UnreadCount(NamedTuple):
+    assignment_id: int
+    unread_count: int
+    last_read_message_id: int
+
+
+def _course_member_ids(db: Session, course_id: int) -> List[int]:
+    return [row[0] for row in db.query(CourseMember.user_id).filter(CourseMember.course_id == course_id)]
+
+
+def _save_marker(db: Session, user_id: int, assignment_id: int, last_read_message_id: int, unread_count: int):
+    """Создает или перезаписывает маркер; параллельная вставка того же маркера не роняет запрос"""
+    values = {"last_read_message_id": last_read_message_id, "unread_count": unread_count}
+    updated = db.query(ChatReadMarker).filter(
+        ChatReadMarker.user_id == user_id,
+        ChatReadMarker.assignment_id == assignment_id
+    ).update(values, synchronize_session=False)
+    if updated:
+        return
+    try:
+        with db.begin_nested():
+            db.add(ChatReadMarker(user_id=user_id, assignment_id=assignment_id, **values))
+    except IntegrityError:
+        db.query(ChatReadMarker).filter(
+            ChatReadMarker.user_id == user_id,
+            ChatReadMarker.assignment_id == assignment_id
+        ).update(values, synchronize_session=False)
+
+
+def record_new_message(db: Session, assignment: Assignment, message: ChatMessage) -> List[int]:
+    """
+    Учитывает новое сообщение в счетчиках (в той же транзакции, после flush).
+    Существующим маркерам получателей - +1 одним UPDATE, недостающие создаются
+    со счетчиком 1: история до появления маркера считается прочитанной.
+    Автор прочитал чат до своего сообщения включительно.
+    Возвращает id получателей.
+    """
+    recipient_ids = [user_id for user_id in _course_member_ids(db, assignment.course_id) if user_id != message.user_id]
+
+    if recipient_ids:
+        db.query(ChatReadMarker).filter(
+            ChatReadMarker.assignment_id == assignment.id,
+            ChatReadMarker.user_id.in_(recipient_ids)
+        ).update({ChatReadMarker.unread_count: ChatReadMarker.unread_count + 1}, synchronize_session=False)
+
+        with_marker = {
+            row[0] for row in db.query(ChatReadMarker.user_id).filter(
+                ChatReadMarker.assignment_id == assignment.id,
+                ChatReadMarker.user_id.in_(recipient_ids)
+            )
+        }
+        for user_id in recipient_ids:
+            if user_id not in with_marker:
+                _save_marker(db, user_id, assignment.id, message.id - 1, 1)
+
+    _save_marker(db, message.user_id, assignment.id, message.id, 0)
+    return recipient_ids
+
+
+def record_deleted_message(db: Session, message: ChatMessage) -> List[int]:
+    """Убирает удаленное сообщение из счетчиков тех, кто его ещё не прочитал; возвращает их id"""
+    query = db.query(ChatReadMarker).filter(
+        ChatReadMarker.assignment_id == message.assignment_id,
+        ChatReadMarker.user_id != message.user_id,
+        ChatReadMarker.last_read_message_id < message.id,
+        ChatReadMarker.unread_count > 0
+    )
+    user_ids = [marker.user_id for marker in query.with_entities(ChatReadMarker.user_id)]
+    if user_ids:
+        query.update({ChatReadMarker.unread_count: ChatReadMarker.unread_count - 1}, synchronize_session=False)
+    return user_ids
+
+
+def mark_chat_read(db: Session, user_id: int, assignment_id: int, last_message_id: Optional[int] = None) -> UnreadCount:
+    """
+    Сдвигает маркер прочтения (по умолчанию - до последнего сообщения) и точно
+    пересчитывает непрочитанные после него. Маркер назад не сдвигается.
+    """
+    marker = db.query(ChatReadMarker).filter(
+        ChatReadMarker.user_id == user_id,
+        ChatReadMarker.assignment_id == assignment_id
+    ).first()
+
+    if last_message_id is None:
+        last_message_id = db.query(func.max(ChatMessage.id)).filter(
+            ChatMessage.assignment_id == assignment_id
+        ).scalar() or 0
+    if marker:
+        last_message_id = max(last_message_id, marker.last_read_message_id)
+
+    unread_count = db.query(func.count(ChatMessage.id)).filter(
+        ChatMessage.assignment_id == assignment_id,
+        ChatMessage.id > last_message_id,
+        ChatMessage.user_id != user_id,
+        ChatMessage.is_deleted == False
+    ).scalar()
+
+    _save_marker(db, user_id, assignment_id, last_message_id, unread_count)
+    db.commit()
+    return UnreadCount(assignment_id, unread_count, last_message_id)
+
+
+def get_unread_counts(db: Session, user_id: int) -> List[UnreadCount]:
+    """Счетчики по всем заданиям курсов пользователя одним запросом"""
+    rows = db.query(
+        Assignment.id,
+        func.coalesce(ChatReadMarker.unread_count, 0),
+        func.coalesce(ChatReadMarker.last_read_message_id, 0)
+    ).join(
+        CourseMember,
+        and_(CourseMember.course_id == Assignment.course_id, CourseMember.user_id == user_id)
+    ).outerjoin(
+        ChatReadMarker,
+        and_(ChatReadMarker.assignment_id == Assignment.id, ChatReadMarker.user_id == user_id)
+    ).order_by(Assignment.id).all()
+    return [UnreadCount(*row) for row in rows]
+
+
+async def push_unread_counts(db: Session, assignment_id: int, user_ids: List[int]):
+    """Отправляет новые счетчики подключенным пользователям через send_to_user"""
+    online_ids = [user_id for user_id in user_ids if user_id in manager.user_connections]
+    if not online_ids:
+        return
+
+    markers = db.query(
+        ChatReadMarker.user_id,
+        ChatReadMarker.unread_count,
+        ChatReadMarker.last_read_message_id
+    ).filter(
+        ChatReadMarker.assignment_id == assignment_id,
+        ChatReadMarker.user_id.in_(online_ids)
+    ).all()
+    for user_id, unread_count, last_read_message_id in markers:
+        await manager.send_to_user(user_id, {
+            "type": "chat_unread",
+            "data": UnreadCount(assignment_id, unread_count, last_read_message_id)._asdict()
+        })
@@ -0,0 +1,120 @@
+import gzip
+import os
+import re
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from ..config import settings
+
+# Размер блока при сжатии и распаковке
+COMPRESSION_CHUNK_SIZE = 1024 * 1024
+
+# Значение Content-Encoding -> суффикс блоба, сжатого при хранении. Суффиксы
+# зарезервированы: расширение из имени пользователя (например, data.tar.gz)
+# не может их дать, см. get_blob_path.
+COMPRESSION_SUFFIXES = {
+    "gzip": ".stored-gz",
+    "zstd": ".stored-zst",
+}
+STORED_SUFFIX_PREFIX = ".stored-"
+
+# Блоб <sha256>[<расширение>]<суффикс сжатия>; файлы старой раскладки так не называются
+_STORED_BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}(\.[^.]+)?(\.stored-[a-z]+)$")
+
+# Текстовые форматы, которые хорошо сжимаются. PDF, офисные документы (docx/xlsx/pptx),
+# архивы и изображения уже сжаты внутри и сюда не входят.
+COMPRESSIBLE_EXTENSIONS = {
+    ".txt", ".md", ".csv", ".tsv", ".json", ".xml", ".yaml", ".yml", ".log", ".ini", ".cfg",
+    ".html", ".htm", ".css", ".js", ".ts", ".tsx", ".jsx", ".svg", ".tex", ".ipynb", ".sql",
+    ".py", ".java", ".c", ".h", ".cpp", ".hpp", ".cs", ".go", ".rs", ".rb", ".php", ".kt",
+    ".swift", ".pas", ".sh", ".bat", ".tar", ".rtf", ".doc",
+}
+
+
+def get_compression_encoding() -> Optional[str]:
+    """Выбранный алгоритм сжатия при хранении или None"""
+    encoding = settings.UPLOAD_COMPRESSION
+    if not encoding:
+        return None
+    if encoding not in COMPRESSION_SUFFIXES:
+        raise RuntimeError(f"Неизвестный UPLOAD_COMPRESSION: {encoding}")
+    return encoding
+
+
+def get_file_encoding(file_path: str) -> Optional[str]:
+    """
+    Каким алгоритмом сервер сжал файл при хранении или None. Определяется
+    только по зарезервированному суффиксу блоба и не зависит от текущего
+    UPLOAD_COMPRESSION: файлы пользователя вроде .gz отдаются как есть.
+    """
+    match = _STORED_BLOB_NAME_RE.match(os.path.basename(file_path))
+    if match is None:
+        return None
+    for encoding, suffix in COMPRESSION_SUFFIXES.items():
+        if match.group(2) == suffix:
+            return encoding
+    return None
+
+
+def should_compress(file_name: str, file_size: int) -> bool:
+    extension = os.path.splitext(file_name)[1].lower()
+    return extension in COMPRESSIBLE_EXTENSIONS and file_size >= settings.UPLOAD_COMPRESSION_MIN_BYTES
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("Для UPLOAD_COMPRESSION=zstd нужно установить zstandard") from exc
+    return zstandard
+
+
+def compress_file(source_path: str, dest_path: str, encoding: str):
+    """Потоково сжимает source_path в dest_path"""
+    with open(source_path, "rb") as source:
+        if encoding == "gzip":
+            # mtime=0: одинаковое содержимое дает одинаковый результат
+            with gzip.GzipFile(dest_path, "wb", compresslevel=6, mtime=0) as target:
+                while chunk := source.read(COMPRESSION_CHUNK_SIZE):
+                    target.write(chunk)
+        else:
+            zstandard = _import_zstandard()
+            with open(dest_path, "wb") as target:
+                zstandard.ZstdCompressor(level=6).copy_stream(source, target)
+
+
+def iter_decompressed(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Распаковывает поток сжатых блоков, не держа файл в памяти целиком"""
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        decompressor = _import_zstandard().ZstdDecompressor().decompressobj()
+
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if encoding == "gzip":
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def iter_decompressed_file(file_path: str, encoding: str) -> Iterator[bytes]:
+    def read_chunks():
+        with open(file_path, "rb") as source:
+            while chunk := source.read(COMPRESSION_CHUNK_SIZE):
+                yield chunk
+
+    return iter_decompressed(read_chunks(), encoding)
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Есть ли encoding в Accept-Encoding клиента (q=0 означает отказ)"""
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() != encoding:
+            continue
+        params = params.replace(" ", "")
+        return params not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
@@ -0,0 +1,36 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Query, joinedload, selectinload
+
+from ..models.submission import Submission, SubmissionFile
+from ..models.user import User
+from ..schemas.submission import SubmissionResponse
+
+# Все, что читает SubmissionResponse: студент одним JOIN, файлы с PDF для проверки
+# и файлы проверки - по одному IN-запросу на весь список
+SUBMISSION_RESPONSE_OPTIONS = (
+    joinedload(Submission.student),
+    selectinload(Submission.files).joinedload(SubmissionFile.review_asset),
+    selectinload(Submission.feedback_files),
+)
+
+
+def display_name(user: Optional[User]) -> Optional[str]:
+    return user.username if user else None
+
+
+def rows_with_display_names(query: Query, author) -> List[Tuple[object, Optional[str]]]:
+    """
+    Строки запроса вместе с именами авторов. author - relationship на User
+    (например, ChatMessage.user): подгружается тем же запросом через JOIN,
+    поэтому число запросов не зависит от размера списка.
+    """
+    rows = query.options(joinedload(author)).all()
+    return [(row, display_name(getattr(row, author.key))) for row in rows]
+
+
+def build_submission_response(submission: Submission) -> SubmissionResponse:
+    """SubmissionResponse с именем студента из уже загруженной связи"""
+    response = SubmissionResponse.model_validate(submission)
+    response.student_name = display_name(submission.student)
+    return response
@@ -2,11 +2,17 @@ import os
 import shutil
 import subprocess
 import tempfile
-from datetime import datetime
 from pathlib import Path
 
 from ..config import settings
-from .file_upload import ensure_upload_dir, sanitize_filename
+from .file_upload import (
+    SavedUpload,
+    ensure_upload_dir,
+    get_staging_dir,
+    get_local_copy,
+    sanitize_filename,
+    store_file,
+)
 
 WORD_EXTENSIONS = {".doc", ".docx"}
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
@@ -38,25 +44,20 @@ def get_review_kind(file_name: str) -> str:
     return "unsupported"
 
 
-def _to_abs_path(file_path: str) -> str:
-    return file_path if os.path.isabs(file_path) else os.path.join(os.getcwd(), file_path)
-
-
-def convert_word_to_pdf(source_file_path: str, source_file_name: str) -> tuple[str, str]:
+def convert_word_to_pdf(source_file_path: str, source_file_name: str) -> SavedUpload:
     """
-    Конвертирует DOC/DOCX в PDF.
-    Возвращает (relative_pdf_path, display_pdf_name).
+    Конвертирует DOC/DOCX в PDF и кладет результат в хранилище.
+    Возвращает SavedUpload с путем PDF и отображаемым именем.
     """
-    abs_source_path = _to_abs_path(source_file_path)
-    if not os.path.exists(abs_source_path):
-        raise ConversionError("Исходный Word-файл не найден")
-
     ensure_upload_dir()
-    upload_dir_abs = _to_abs_path(settings.UPLOAD_DIR)
-    Path(upload_dir_abs).mkdir(parents=True, exist_ok=True)
 
-    tmp_dir = tempfile.mkdtemp(prefix="word-to-pdf-")
+    # Временный каталог внутри UPLOAD_DIR, чтобы результат переносился в хранилище через rename
+    tmp_dir = tempfile.mkdtemp(prefix="word-to-pdf-", dir=get_staging_dir())
     try:
+        abs_source_path = get_local_copy(source_file_path, tmp_dir)
+        if abs_source_path is None:
+            raise ConversionError("Исходный Word-файл не найден")
+
         cmd = [
             settings.LIBREOFFICE_BIN,
             "--headless",
@@ -80,15 +81,8 @@ def convert_word_to_pdf(source_file_path: str, source_file_name: str) -> tuple[s
                 raise ConversionError("LibreOffice не вернул PDF-файл после конвертации")
             generated_pdf_path = str(pdf_candidates[0])
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        safe_stem = sanitize_filename(stem) or "document"
-        output_filename = sanitize_filename(f"{timestamp}_{safe_stem}_review.pdf")
-        output_abs_path = os.path.join(upload_dir_abs, output_filename)
-        shutil.move(generated_pdf_path, output_abs_path)
-
-        relative_pdf_path = os.path.join(settings.UPLOAD_DIR, output_filename)
         display_pdf_name = sanitize_filename(f"{stem}.pdf")
-        return relative_pdf_path, display_pdf_name
+        return store_file(generated_pdf_path, display_pdf_name)
     except subprocess.TimeoutExpired:
         raise ConversionError("Конвертация Word в PDF превысила лимит времени")
     except FileNotFoundError:
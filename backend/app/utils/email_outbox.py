@@ -0,0 +1,216 @@
+import secrets
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.email_outbox import EmailOutbox
+
+
+def _build_from_header() -> str:
+    from_email = settings.SMTP_FROM_EMAIL.strip() or settings.SMTP_USERNAME.strip() or "no-reply@classroom.local"
+    from_name = settings.SMTP_FROM_NAME.strip()
+    if from_name:
+        return f"{from_name} <{from_email}>"
+    return from_email
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str) -> EmailOutbox:
+    """Ставит письмо в очередь (в транзакции вызывающего кода); отправит фоновая задача"""
+    email = EmailOutbox(to_email=to_email, subject=subject, body=body, next_attempt_at=datetime.utcnow())
+    db.add(email)
+    return email
+
+
+class SMTPConnection:
+    """
+    Одно авторизованное SMTP-соединение на процесс, общее для всех проходов
+    отправки: подключение, STARTTLS и login выполняются один раз, а не на каждое
+    письмо. Закрывается после SMTP_IDLE_SECONDS без писем; если сервер сам
+    закрыл соединение, оно переоткрывается при следующей отправке.
+    """
+
+    def __init__(self):
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        host = settings.SMTP_HOST.strip()
+        if settings.SMTP_USE_SSL:
+            smtp = smtplib.SMTP_SSL(host, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
+        else:
+            smtp = smtplib.SMTP(host, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
+            if settings.SMTP_USE_TLS:
+                smtp.starttls()
+        if settings.SMTP_USERNAME:
+            smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        return smtp
+
+    def _drop(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+    def send(self, message: EmailMessage):
+        with self._lock:
+            if self._smtp is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+                self._drop()
+            reused = self._smtp is not None
+            try:
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                try:
+                    self._smtp.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    if not reused:
+                        raise
+                    # Сервер закрыл простаивающее соединение - одна попытка на новом
+                    self._drop()
+                    self._smtp = self._connect()
+                    self._smtp.send_message(message)
+            except OSError:
+                # Сюда же попадают отказы сервера (SMTPException): после них
+                # сессия может остаться в неизвестном состоянии
+                self._drop()
+                raise
+            self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        with self._lock:
+            if self._smtp is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+                self._drop()
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+
+smtp_connection = SMTPConnection()
+
+
+def _build_message(email: EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = email.subject
+    message["From"] = _build_from_header()
+    message["To"] = email.to_email
+    message.set_content(email.body)
+    return message
+
+
+def _deliver(email: EmailOutbox):
+    if not settings.SMTP_HOST.strip():
+        print(f"[EMAIL][MOCK] To: {email.to_email} | Subject: {email.subject}\n{email.body}")
+        return
+    smtp_connection.send(_build_message(email))
+
+
+def _is_permanent_error(exc: Exception) -> bool:
+    # 5xx - адрес или письмо отклонены, повтор не поможет
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500 and not isinstance(
+        exc, smtplib.SMTPAuthenticationError
+    )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+class OutboxReport(NamedTuple):
+    sent: int
+    retried: int
+    failed: int
+
+
+def _claim_batch(db: Session, batch_size: int) -> list:
+    """
+    Забирает пачку писем, которым пора уходить. Условный UPDATE по claimed_by
+    не дает двум воркерам отправить одно письмо: next_attempt_at сдвигается на
+    время аренды, и если воркер упадет посреди отправки, письмо вернется в
+    очередь после ее окончания.
+    """
+    now = datetime.utcnow()
+    due_ids = [row.id for row in db.query(EmailOutbox.id).filter(
+        EmailOutbox.status == "pending",
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(batch_size).all()]
+    if not due_ids:
+        return []
+
+    claim = secrets.token_hex(16)
+    db.query(EmailOutbox).filter(
+        EmailOutbox.id.in_(due_ids),
+        EmailOutbox.status == "pending",
+        EmailOutbox.next_attempt_at <= now
+    ).update({
+        EmailOutbox.claimed_by: claim,
+        EmailOutbox.attempts: EmailOutbox.attempts + 1,
+        EmailOutbox.next_attempt_at: now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+    }, synchronize_session=False)
+    db.commit()
+    return db.query(EmailOutbox).filter(EmailOutbox.claimed_by == claim).order_by(EmailOutbox.id).all()
+
+
+def send_outbox_batch(batch_size: int = 50) -> OutboxReport:
+    """Отправляет одну пачку по общему SMTP-соединению и записывает результат каждого письма"""
+    sent = retried = failed = 0
+    db = SessionLocal()
+    try:
+        emails = _claim_batch(db, batch_size)
+        for index, email in enumerate(emails):
+            try:
+                _deliver(email)
+            except Exception as exc:
+                email.last_error = f"{type(exc).__name__}: {exc}"[:1000]
+                if _is_permanent_error(exc) or email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    email.status = "failed"
+                    failed += 1
+                    print(f"[Email Outbox] Giving up on email {email.id} to {email.to_email}: {exc}")
+                else:
+                    email.next_attempt_at = datetime.utcnow() + _retry_delay(email.attempts)
+                    retried += 1
+                email.claimed_by = None
+                if not isinstance(exc, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # Сервер недоступен (а не отказал в этом письме): остальные письма
+                    # пачки не ждут таймаут каждое, а возвращаются в очередь без траты попытки
+                    for rest in emails[index + 1:]:
+                        rest.attempts -= 1
+                        rest.next_attempt_at = datetime.utcnow() + _retry_delay(max(rest.attempts, 1))
+                        rest.claimed_by = None
+                    retried += len(emails) - index - 1
+                    db.commit()
+                    break
+            else:
+                email.status = "sent"
+                email.sent_at = datetime.utcnow()
+                email.last_error = None
+                email.claimed_by = None
+                sent += 1
+            db.commit()
+    finally:
+        db.close()
+    return OutboxReport(sent=sent, retried=retried, failed=failed)
+
+
+def run_email_outbox():
+    total = OutboxReport(0, 0, 0)
+    while True:
+        report = send_outbox_batch(settings.EMAIL_OUTBOX_BATCH_SIZE)
+        total = OutboxReport(*(a + b for a, b in zip(total, report)))
+        # Неполная пачка - очередь разобрана; при ошибках не долбим сервер до следующего прохода
+        if sum(report) < settings.EMAIL_OUTBOX_BATCH_SIZE or report.retried or report.failed:
+            break
+    smtp_connection.close_if_idle()
+    if any(total):
+        print(f"[Email Outbox] Sent {total.sent}, retry later {total.retried}, failed {total.failed}")
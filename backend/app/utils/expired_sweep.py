@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.auth_token import RefreshToken, TokenRevocation
+from ..models.email_outbox import EmailOutbox
+from ..models.pending_registration import PendingRegistration
+from ..models.user import User
+from .job_lease import acquire_job_lease
+
+EXPIRED_SWEEP_JOB_NAME = "expired-sweep"
+
+# Группы колонок кода у пользователя: срок действия и все колонки, которые сбрасываются вместе с ним
+USER_CODE_COLUMNS = (
+    (
+        User.email_verification_expires_at,
+        (User.email_verification_code, User.email_verification_expires_at, User.email_verification_sent_at),
+    ),
+    (
+        User.email_change_old_expires_at,
+        (User.email_change_old_code, User.email_change_old_expires_at, User.email_change_old_sent_at),
+    ),
+    (
+        User.pending_email_expires_at,
+        (User.pending_email, User.pending_email_code, User.pending_email_expires_at, User.pending_email_sent_at),
+    ),
+    (
+        User.password_reset_expires_at,
+        (User.password_reset_code, User.password_reset_expires_at, User.password_reset_sent_at),
+    ),
+)
+
+
+class ExpiredSweepReport(NamedTuple):
+    pending_registrations: int
+    user_codes: int
+    refresh_tokens: int
+    token_revocations: int
+    outbox_emails: int
+
+
+def _sweep_in_batches(model, id_column, condition, batch_size: int, values=None) -> int:
+    """
+    Удаляет (или обнуляет values) строки по условию пачками по id, каждая
+    пачка - в своей короткой транзакции. Условие повторяется в UPDATE/DELETE:
+    строку, которую обработчик успел обновить (новый код), проход не тронет.
+    """
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [row[0] for row in db.query(id_column).filter(condition).limit(batch_size).all()]
+            if not ids:
+                break
+            query = db.query(model).filter(id_column.in_(ids), condition)
+            if values is None:
+                total += query.delete(synchronize_session=False)
+            else:
+                total += query.update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+def sweep_expired_state(batch_size: int = 500) -> ExpiredSweepReport:
+    """
+    Убирает то, что обработчики и так отвергли бы как истекшее: незавершенные
+    регистрации, коды подтверждения, смены почты и сброса пароля, refresh-токены
+    и записи отзыва access-токенов. Заодно удаляет старые отправленные письма
+    с кодами из очереди.
+    """
+    now = datetime.utcnow()
+
+    pending_registrations = _sweep_in_batches(
+        PendingRegistration, PendingRegistration.id, PendingRegistration.expires_at < now, batch_size
+    )
+
+    user_codes = 0
+    for expires_column, columns in USER_CODE_COLUMNS:
+        user_codes += _sweep_in_batches(
+            User, User.id, expires_column < now, batch_size, {column: None for column in columns}
+        )
+
+    # Использованные и отозванные токены остаются до истечения: по ним ловится повторное предъявление
+    refresh_tokens = _sweep_in_batches(RefreshToken, RefreshToken.id, RefreshToken.expires_at < now, batch_size)
+
+    # Старше самого долгого access-токена запись отзыва ничего не отзывает
+    token_revocations = _sweep_in_batches(
+        TokenRevocation,
+        TokenRevocation.user_id,
+        TokenRevocation.revoked_before <= now - timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+        batch_size,
+    )
+
+    outbox_emails = _sweep_in_batches(
+        EmailOutbox,
+        EmailOutbox.id,
+        EmailOutbox.status.in_(("sent", "failed"))
+        & (EmailOutbox.created_at < now - timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)),
+        batch_size,
+    )
+
+    return ExpiredSweepReport(
+        pending_registrations=pending_registrations,
+        user_codes=user_codes,
+        refresh_tokens=refresh_tokens,
+        token_revocations=token_revocations,
+        outbox_emails=outbox_emails,
+    )
+
+
+def run_expired_sweep():
+    # Аренда на два интервала: пока держатель жив, он продлевает ее каждый проход
+    if not acquire_job_lease(EXPIRED_SWEEP_JOB_NAME, settings.EXPIRED_SWEEP_INTERVAL_MINUTES * 60 * 2):
+        return
+    report = sweep_expired_state(settings.EXPIRED_SWEEP_BATCH_SIZE)
+    if any(report):
+        print(
+            f"[Expired sweep] Deleted {report.pending_registrations} pending registration(s), "
+            f"{report.refresh_tokens} refresh token(s), {report.token_revocations} token revocation(s), "
+            f"{report.outbox_emails} outbox email(s); cleared {report.user_codes} user code(s)"
+        )
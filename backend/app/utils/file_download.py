@@ -0,0 +1,263 @@
+import mimetypes
+import os
+import re
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, status
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Receive, Scope, Send
+
+from ..config import settings
+from .compression import COMPRESSION_SUFFIXES, accepts_encoding, get_file_encoding, iter_decompressed_file
+from .file_upload import BLOBS_DIR_NAME, resolve_upload_path, to_abs_path
+from .storage import get_storage, get_storage_key, is_local_storage
+
+# Файл записи может быть заменен: браузер хранит копию, но каждый раз сверяет ETag
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+# Блоб адресуется хешем содержимого и по этому пути никогда не меняется
+BLOB_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_CONTENT_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _file_not_found_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Файл не найден на сервере"
+    )
+
+
+def build_content_disposition(file_name: str) -> str:
+    return f"attachment; filename*=utf-8''{quote(file_name)}"
+
+
+def build_etag(content_hash: Optional[str]) -> Optional[str]:
+    """Сильный ETag из sha256 содержимого"""
+    return f'"{content_hash}"' if content_hash else None
+
+
+def _etag_matches(scope: Scope, etag: Optional[str]) -> bool:
+    if_none_match = Headers(scope=scope).get("if-none-match")
+    if not etag or not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+class _ConditionalResponseMixin:
+    """Отвечает 304 без тела, если If-None-Match совпал с ETag ответа"""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if _etag_matches(scope, self.headers.get("etag")):
+            await NotModifiedResponse(self.headers)(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class ConditionalFileResponse(_ConditionalResponseMixin, FileResponse):
+    """
+    FileResponse с ETag из хеша содержимого.
+    Range/206 обрабатывает FileResponse, If-Range сверяется и с нашим ETag.
+    """
+
+    def _should_use_range(self, http_if_range: str, stat_result: os.stat_result) -> bool:
+        if http_if_range == self.headers.get("etag"):
+            return True
+        return super()._should_use_range(http_if_range, stat_result)
+
+
+class _ConditionalOffloadResponse(_ConditionalResponseMixin, Response):
+    pass
+
+
+class _ConditionalStreamingResponse(_ConditionalResponseMixin, StreamingResponse):
+    pass
+
+
+class CompressedFileResponse(Response):
+    """
+    Отдача файла, сжатого при хранении. Если клиент принимает алгоритм
+    (Accept-Encoding), сжатые байты уходят как есть с Content-Encoding,
+    иначе файл распаковывается потоково.
+    ETag у вариантов разный: сжатый получает суффикс алгоритма.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        encoding: str,
+        media_type: str,
+        file_name: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        headers: Optional[dict] = None,
+    ):
+        super().__init__(media_type=media_type, headers={**(headers or {}), "Vary": "Accept-Encoding"})
+        self.path = path
+        self.encoding = encoding
+        self.file_name = file_name
+        self.content_hash = content_hash
+
+    def _variant_headers(self, etag: Optional[str]) -> dict:
+        headers = {
+            key: value
+            for key, value in self.headers.items()
+            if key not in ("content-type", "content-length", "etag")
+        }
+        if etag:
+            headers["ETag"] = etag
+        return headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if accepts_encoding(accept_encoding, self.encoding):
+            etag = build_etag(f"{self.content_hash}-{self.encoding}" if self.content_hash else None)
+            headers = self._variant_headers(etag)
+            headers["Content-Encoding"] = self.encoding
+            response = ConditionalFileResponse(
+                self.path,
+                media_type=self.media_type,
+                filename=self.file_name,
+                headers=headers,
+                stat_result=os.stat(self.path),
+            )
+        else:
+            headers = self._variant_headers(build_etag(self.content_hash))
+            if self.file_name:
+                headers["Content-Disposition"] = build_content_disposition(self.file_name)
+            response = _ConditionalStreamingResponse(
+                iter_decompressed_file(self.path, self.encoding),
+                media_type=self.media_type,
+                headers=headers,
+            )
+        await response(scope, receive, send)
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    Раздача UPLOAD_DIR по /uploads (используется просмотрщиком проверки).
+    Блобам выдается сильный ETag из имени и долгий приватный кэш.
+    """
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = {"Cache-Control": DOWNLOAD_CACHE_CONTROL}
+        content_hash = os.path.basename(full_path).split(".")[0]
+        parts = os.path.normpath(os.path.relpath(full_path, self.directory)).split(os.sep)
+        is_blob = parts[0] == BLOBS_DIR_NAME and _CONTENT_HASH_RE.match(content_hash)
+        if is_blob:
+            headers["Cache-Control"] = BLOB_CACHE_CONTROL
+
+        encoding = get_file_encoding(full_path)
+        if encoding is not None:
+            original_name = os.path.basename(full_path).removesuffix(COMPRESSION_SUFFIXES[encoding])
+            return CompressedFileResponse(
+                full_path,
+                encoding,
+                media_type=mimetypes.guess_type(original_name)[0] or "application/octet-stream",
+                content_hash=content_hash if is_blob else None,
+                headers=headers,
+            )
+
+        if is_blob:
+            headers["ETag"] = build_etag(content_hash)
+
+        response = ConditionalFileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            headers=headers,
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _build_offload_response(abs_file_path: str, file_name: str, media_type: str, headers: dict) -> Response:
+    """
+    Пустой ответ с заголовком внутреннего редиректа: байты отдает reverse proxy через sendfile.
+    Content-Type и Content-Disposition proxy берет из этого ответа.
+    """
+    headers = {**headers, "Content-Disposition": build_content_disposition(file_name)}
+    if settings.DOWNLOAD_OFFLOAD == "x-sendfile":
+        headers["X-Sendfile"] = os.path.normpath(abs_file_path)
+    elif settings.DOWNLOAD_OFFLOAD != "x-accel-redirect":
+        raise RuntimeError(f"Неизвестный DOWNLOAD_OFFLOAD: {settings.DOWNLOAD_OFFLOAD}")
+    else:
+        relative_path = os.path.relpath(abs_file_path, to_abs_path(settings.UPLOAD_DIR))
+        prefix = settings.DOWNLOAD_OFFLOAD_PREFIX.rstrip("/")
+        headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative_path.replace(os.sep, '/'))}"
+    return _ConditionalOffloadResponse(media_type=media_type, headers=headers)
+
+
+def build_file_response(
+    file_path: str,
+    file_name: str,
+    media_type: str = "application/octet-stream",
+    content_hash: Optional[str] = None,
+) -> Response:
+    """
+    Ответ со скачиваемым файлом. Локальный файл отдается через FileResponse
+    (путь из БД разрешается через resolve_upload_path) или, если включен
+    DOWNLOAD_OFFLOAD, через reverse proxy. Для удаленного хранилища клиент
+    перенаправляется на временную ссылку.
+
+    Локальная отдача поддерживает If-None-Match (304) и Range (206);
+    ETag строится из content_hash, для старых записей без хеша - из mtime и размера.
+    Файлы, сжатые при хранении, отдаются через CompressedFileResponse (без offload).
+    """
+    if not is_local_storage():
+        storage = get_storage()
+        key = get_storage_key(file_path)
+        if storage.stat(key) is None:
+            raise _file_not_found_error()
+
+        presigned_url = storage.presign(key, file_name, settings.S3_PRESIGN_EXPIRES_SECONDS)
+        if presigned_url:
+            return RedirectResponse(presigned_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+        return StreamingResponse(
+            storage.open_range(key),
+            media_type=media_type,
+            headers={"Content-Disposition": build_content_disposition(file_name)},
+        )
+
+    abs_file_path = resolve_upload_path(file_path)
+    if abs_file_path is None:
+        raise _file_not_found_error()
+
+    headers = {"Cache-Control": DOWNLOAD_CACHE_CONTROL}
+    encoding = get_file_encoding(abs_file_path)
+    if encoding is not None:
+        return CompressedFileResponse(
+            abs_file_path,
+            encoding,
+            media_type=media_type,
+            file_name=file_name,
+            content_hash=content_hash,
+            headers=headers,
+        )
+
+    etag = build_etag(content_hash)
+    if etag:
+        headers["ETag"] = etag
+
+    if settings.DOWNLOAD_OFFLOAD:
+        return _build_offload_response(abs_file_path, file_name, media_type, headers)
+
+    return ConditionalFileResponse(
+        path=abs_file_path,
+        media_type=media_type,
+        filename=file_name,
+        headers=headers,
+        stat_result=os.stat(abs_file_path),
+    )
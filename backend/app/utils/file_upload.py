@@ -1,16 +1,116 @@
+import asyncio
+import hashlib
 import os
-import shutil
 import re
-from datetime import datetime
+import uuid
 from pathlib import Path
+from typing import NamedTuple, Optional
+
+import aiofiles
 from fastapi import UploadFile, HTTPException
+from sqlalchemy.orm import Session
 from ..config import settings
+from ..models.assignment import AssignmentFile
+from ..models.submission import SubmissionFile, SubmissionFeedbackFile, SubmissionReviewAsset
+from .compression import (
+    COMPRESSION_SUFFIXES,
+    STORED_SUFFIX_PREFIX,
+    compress_file,
+    get_compression_encoding,
+    get_file_encoding,
+    iter_decompressed_file,
+    should_compress,
+)
+from .storage import get_storage, get_storage_key, is_local_storage
+from .storage_quota import storage_quota_exceeded_error
+
+# Размер блока при потоковой записи загрузок
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Контентно-адресуемое хранилище: UPLOAD_DIR/blobs/ab/cd/<sha256><ext>
+BLOBS_DIR_NAME = "blobs"
+# Файлы старой плоской раскладки после миграции: UPLOAD_DIR/legacy/ab/cd/<имя>
+LEGACY_DIR_NAME = "legacy"
+STAGING_DIR_NAME = ".staging"
+# Файлы без ссылок ждут здесь UPLOAD_GC_GRACE_HOURS перед удалением
+QUARANTINE_DIR_NAME = ".quarantine"
+
+# (модель, колонка пути) - все места, где хранятся ссылки на файлы
+UPLOAD_PATH_COLUMNS = [
+    (AssignmentFile, AssignmentFile.file_path),
+    (SubmissionFile, SubmissionFile.file_path),
+    (SubmissionFeedbackFile, SubmissionFeedbackFile.file_path),
+    (SubmissionReviewAsset, SubmissionReviewAsset.review_file_path),
+]
+
+
+class SavedUpload(NamedTuple):
+    file_path: str
+    file_name: str
+    file_size: int
+    content_hash: str  # sha256 в hex
+
+
+def get_max_upload_size() -> int:
+    return settings.MAX_FILE_SIZE_MB * 1024 * 1024  # Конвертируем MB в байты
+
+
+def _file_too_large_error() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"Файл слишком большой. Максимальный размер {settings.MAX_FILE_SIZE_MB} МБ"
+    )
 
 
 def ensure_upload_dir():
     Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
 
+def get_staging_dir() -> str:
+    # Staging лежит внутри UPLOAD_DIR, чтобы перенос в хранилище был простым rename без копирования
+    staging_dir = os.path.join(settings.UPLOAD_DIR, STAGING_DIR_NAME)
+    Path(staging_dir).mkdir(parents=True, exist_ok=True)
+    return staging_dir
+
+
+def get_quarantine_dir() -> str:
+    return os.path.join(settings.UPLOAD_DIR, QUARANTINE_DIR_NAME)
+
+
+def get_quarantine_path(file_path: str) -> str:
+    """Место файла в карантине: тот же путь относительно UPLOAD_DIR"""
+    return os.path.join(get_quarantine_dir(), *get_storage_key(file_path).split("/"))
+
+
+def quarantine_file(file_path: str):
+    """Переносит файл в карантин; срок карантина отсчитывается от момента переноса"""
+    quarantine_path = get_quarantine_path(file_path)
+    Path(quarantine_path).parent.mkdir(parents=True, exist_ok=True)
+    os.replace(file_path, quarantine_path)
+    os.utime(quarantine_path)
+
+
+def restore_quarantined_file(file_path: str) -> Optional[str]:
+    """
+    Возвращает файл из карантина на место. Нужен, когда на блоб снова сослались
+    раньше, чем сборщик мусора заметил ссылку: повторная загрузка того же
+    содержимого или удаление последней ссылки одновременно с новой загрузкой.
+    """
+    if get_storage_key(file_path).startswith(".."):
+        return None
+    quarantine_path = get_quarantine_path(file_path)
+    if not os.path.isfile(quarantine_path):
+        return None
+    abs_path = to_abs_path(file_path)
+    Path(abs_path).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(quarantine_path, abs_path)
+    except FileNotFoundError:
+        # Другой запрос вернул файл раньше
+        pass
+    return abs_path if os.path.isfile(abs_path) else None
+
+
 def sanitize_filename(filename: str) -> str:
     """
     Санитизирует имя файла для безопасного сохранения.
@@ -53,73 +153,264 @@ def sanitize_filename(filename: str) -> str:
     return filename
 
 
-def save_upload_file(upload_file: UploadFile) -> tuple[str, str]:
+def to_abs_path(file_path: str) -> str:
+    return file_path if os.path.isabs(file_path) else os.path.join(os.getcwd(), file_path)
+
+
+def is_flat_upload_path(file_path: str) -> bool:
+    """Файл лежит прямо в UPLOAD_DIR (старая плоская раскладка)"""
+    return os.path.dirname(os.path.normpath(file_path)) == os.path.normpath(settings.UPLOAD_DIR)
+
+
+def get_sharded_legacy_path(file_path: str) -> str:
     """
-    Сохраняет загруженный файл и возвращает (file_path, file_name)
+    Место файла старой плоской раскладки после миграции.
+    Шард вычисляется из имени файла, поэтому путь можно найти без обращения к БД.
     """
-    ensure_upload_dir()
+    file_name = os.path.basename(file_path)
+    shard = hashlib.md5(file_name.encode("utf-8")).hexdigest()
+    return os.path.join(settings.UPLOAD_DIR, LEGACY_DIR_NAME, shard[:2], shard[2:4], file_name)
 
-    # Проверка размера файла
-    max_file_size = settings.MAX_FILE_SIZE_MB * 1024 * 1024  # Конвертируем MB в байты
-    upload_file.file.seek(0, 2)
-    file_size = upload_file.file.tell()
-    upload_file.file.seek(0)
 
-    if file_size > max_file_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Файл слишком большой. Максимальный размер {settings.MAX_FILE_SIZE_MB} МБ"
-        )
+def resolve_upload_path(file_path: str) -> Optional[str]:
+    """
+    Возвращает абсолютный путь к файлу по значению file_path из БД или None.
+    Единая точка для старых и новых путей: файл из плоской раскладки, уже
+    перенесенный миграцией, находится даже если запись в БД ещё не обновлена.
+    Имеет смысл только для локального хранилища.
+    """
+    if not is_local_storage():
+        return None
 
-    # Санитизация оригинального имени файла
-    safe_original_name = sanitize_filename(upload_file.filename)
+    abs_path = to_abs_path(file_path)
+    if os.path.isfile(abs_path):
+        return abs_path
 
-    # Генерация уникального имени файла с timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")  # Добавляем микросекунды для уникальности
-    unique_filename = f"{timestamp}_{safe_original_name}"
+    if is_flat_upload_path(file_path):
+        sharded_path = to_abs_path(get_sharded_legacy_path(file_path))
+        if os.path.isfile(sharded_path):
+            return sharded_path
+        return restore_quarantined_file(file_path) or restore_quarantined_file(sharded_path)
 
-    # Санитизация финального имени (на всякий случай)
-    unique_filename = sanitize_filename(unique_filename)
+    # Запись есть в БД, а файл в карантине: последнюю старую ссылку удалили,
+    # пока новая (на тот же блоб) ещё не была закоммичена
+    return restore_quarantined_file(file_path)
 
-    # Используем os.path.join для безопасного объединения путей
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
 
-    # Дополнительная проверка: убеждаемся что путь находится внутри UPLOAD_DIR
-    real_upload_dir = os.path.realpath(settings.UPLOAD_DIR)
-    real_file_path = os.path.realpath(file_path)
+def upload_exists(file_path: str) -> bool:
+    if is_local_storage():
+        return resolve_upload_path(file_path) is not None
+    return get_storage().stat(get_storage_key(file_path)) is not None
 
-    if not real_file_path.startswith(real_upload_dir):
-        raise HTTPException(
-            status_code=400,
-            detail="Недопустимое имя файла"
-        )
 
-    # Сохранение файла
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
+def get_local_copy(file_path: str, dest_dir: str) -> Optional[str]:
+    """
+    Локальный путь к файлу для обработки (например, конвертации).
+    Для удаленного хранилища файл скачивается в dest_dir.
+    """
+    if is_local_storage():
+        resolved_path = resolve_upload_path(file_path)
+        encoding = get_file_encoding(file_path)
+        if resolved_path is None or encoding is None:
+            return resolved_path
 
-    return file_path, safe_original_name
+        # Сжатый при хранении файл распаковываем под исходным именем
+        local_path = os.path.join(dest_dir, os.path.basename(file_path).removesuffix(COMPRESSION_SUFFIXES[encoding]))
+        with open(local_path, "wb") as dest:
+            for chunk in iter_decompressed_file(resolved_path, encoding):
+                dest.write(chunk)
+        return local_path
 
+    storage = get_storage()
+    key = get_storage_key(file_path)
+    if storage.stat(key) is None:
+        return None
+    local_path = os.path.join(dest_dir, os.path.basename(file_path))
+    storage.download_to_path(key, local_path)
+    return local_path
 
-def delete_file(file_path: str):
+
+def get_blob_path(content_hash: str, file_name: str, encoding: Optional[str] = None) -> str:
+    """
+    Путь блоба в хранилище. Расширение сохраняется, чтобы по файлу можно было
+    определить тип (LibreOffice, mime при скачивании); у сжатых при хранении
+    блобов добавляется суффикс алгоритма (.stored-gz, .stored-zst).
+    """
+    extension = Path(sanitize_filename(file_name)).suffix.lower()
+    if extension.startswith(STORED_SUFFIX_PREFIX):
+        # Суффиксы сжатия зарезервированы: файл пользователя не должен выглядеть сжатым сервером
+        extension = ""
+    if encoding:
+        extension += COMPRESSION_SUFFIXES[encoding]
+    return os.path.join(
+        settings.UPLOAD_DIR,
+        BLOBS_DIR_NAME,
+        content_hash[:2],
+        content_hash[2:4],
+        f"{content_hash}{extension}",
+    )
+
+
+def hash_file(file_path: str) -> str:
+    """Считает sha256 файла, читая его блоками"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as source:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_storage_encoding(source_path: str, file_name: str) -> Optional[str]:
+    """Сжимать ли файл при хранении (только для локального хранилища)"""
+    encoding = get_compression_encoding()
+    if encoding is None or not is_local_storage():
+        return None
+    if not should_compress(file_name, os.path.getsize(source_path)):
+        return None
+    return encoding
+
+
+def store_blob(source_path: str, content_hash: str, file_name: str) -> str:
+    """
+    Переносит файл source_path в хранилище и возвращает путь блоба.
+    Если блоб с таким содержимым уже есть, source_path просто удаляется.
+    """
+    storage = get_storage()
+    blob_path = get_blob_path(content_hash, file_name)
+    encoding = _get_storage_encoding(source_path, file_name)
+    if is_local_storage():
+        # Блоб мог только что уйти в карантин вместе с последней старой ссылкой
+        for candidate_path in (blob_path, get_blob_path(content_hash, file_name, get_compression_encoding())):
+            restore_quarantined_file(candidate_path)
+    if encoding is None:
+        storage.put_file(source_path, get_storage_key(blob_path))
+        return blob_path
+
+    # Блоб уже есть (сжатый или несжатый) - повторно не сжимаем
+    compressed_blob_path = get_blob_path(content_hash, file_name, encoding)
+    for existing_path in (compressed_blob_path, blob_path):
+        if storage.stat(get_storage_key(existing_path)) is not None:
+            storage.put_file(source_path, get_storage_key(existing_path))
+            return existing_path
+
+    compressed_path = source_path + COMPRESSION_SUFFIXES[encoding]
+    try:
+        compress_file(source_path, compressed_path, encoding)
+        if os.path.getsize(compressed_path) >= os.path.getsize(source_path):
+            # Сжатие не помогло - храним как есть
+            os.remove(compressed_path)
+            storage.put_file(source_path, get_storage_key(blob_path))
+            return blob_path
+        storage.put_file(compressed_path, get_storage_key(compressed_blob_path))
+        os.remove(source_path)
+    except BaseException:
+        if os.path.exists(compressed_path):
+            os.remove(compressed_path)
+        raise
+    return compressed_blob_path
+
+
+def store_file(source_path: str, file_name: str) -> SavedUpload:
+    """Кладет готовый файл (например, результат конвертации) в хранилище"""
+    safe_name = sanitize_filename(file_name)
+    file_size = os.path.getsize(source_path)
+    content_hash = hash_file(source_path)
+    blob_path = store_blob(source_path, content_hash, safe_name)
+    return SavedUpload(
+        file_path=blob_path,
+        file_name=safe_name,
+        file_size=file_size,
+        content_hash=content_hash,
+    )
+
+
+async def save_upload_file(upload_file: UploadFile, max_bytes: Optional[int] = None) -> SavedUpload:
+    """
+    Потоково сохраняет загруженный файл блоками по UPLOAD_CHUNK_SIZE.
+    Размер проверяется по мере записи, sha256 считается на лету,
+    одинаковые файлы хранятся в одном экземпляре.
+    max_bytes - остаток квоты хранилища (None - без ограничений).
+    """
+    max_file_size = get_max_upload_size()
+    safe_original_name = sanitize_filename(upload_file.filename)
+
+    # Пишем во временный файл и переносим в хранилище после успешной записи
+    partial_path = os.path.join(get_staging_dir(), f"upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    file_size = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as buffer:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > max_file_size:
+                    raise _file_too_large_error()
+                if max_bytes is not None and file_size > max_bytes:
+                    raise storage_quota_exceeded_error()
+                digest.update(chunk)
+                await buffer.write(chunk)
+        content_hash = digest.hexdigest()
+        # Для удаленного хранилища это сетевая загрузка - не блокируем event loop
+        file_path = await asyncio.to_thread(store_blob, partial_path, content_hash, safe_original_name)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return SavedUpload(
+        file_path=file_path,
+        file_name=safe_original_name,
+        file_size=file_size,
+        content_hash=content_hash,
+    )
+
+
+def count_file_references(db: Session, file_path: str) -> int:
+    """Сколько записей в БД ссылаются на файл (счетчик ссылок блоба)"""
+    return sum(
+        db.query(model).filter(column == file_path).count()
+        for model, column in UPLOAD_PATH_COLUMNS
+    )
+
+
+def delete_file(file_path: str, db: Session):
     """
-    Удаляет файл из файловой системы.
+    Удаляет файл, если на него больше не ссылается ни одна запись.
+    Вызывать после удаления (или перепривязки) ссылающейся записи в БД.
+    В локальном хранилище файл не удаляется сразу, а уходит в карантин
+    (окончательно его удалит сборщик мусора): одновременная загрузка того же
+    содержимого могла уже переиспользовать блоб, но ещё не закоммитить запись.
     Защита от удаления файлов вне UPLOAD_DIR.
     """
     try:
-        if not os.path.exists(file_path):
+        if not is_local_storage():
+            if count_file_references(db, file_path) == 0:
+                get_storage().delete(get_storage_key(file_path))
+            return
+
+        resolved_path = resolve_upload_path(file_path)
+        if resolved_path is None:
             return
 
         # Проверяем что файл находится внутри UPLOAD_DIR (защита от path traversal)
         real_upload_dir = os.path.realpath(settings.UPLOAD_DIR)
-        real_file_path = os.path.realpath(file_path)
+        real_file_path = os.path.realpath(resolved_path)
 
         if not real_file_path.startswith(real_upload_dir):
             # Попытка удалить файл вне разрешенной директории - игнорируем
             print(f"Security: Attempt to delete file outside UPLOAD_DIR: {file_path}")
             return
 
-        os.remove(file_path)
+        # Одинаковые файлы хранятся один раз: удаляем только последнюю ссылку
+        if count_file_references(db, file_path) > 0:
+            return
+
+        quarantine_file(resolved_path)
     except Exception as e:
         # Логируем ошибку, но не падаем
         print(f"Error deleting file {file_path}: {e}")
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from ..config import settings
+
+# Не ждем блокировку дольше: при занятой базе слово просто проверяется заново
+CACHE_BUSY_TIMEOUT_SECONDS = 0.2
+
+
+class CachedVerdict(NamedTuple):
+    lemma: str
+    filter_version: str
+    is_bad: bool
+
+
+class SharedFilterCache:
+    """
+    Общий для всех воркеров кэш лемм и вердиктов фильтра в файле SQLite (WAL).
+    Лемма от версии списка слов не зависит и переиспользуется, вердикт
+    действителен только для той версии фильтра, с которой был записан.
+    Ошибки SQLite не прерывают отправку сообщения: слово проверяется без кэша.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._counters_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS filter_words ("
+                "word TEXT PRIMARY KEY, lemma TEXT NOT NULL, "
+                "filter_version TEXT NOT NULL, is_bad INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на поток и на процесс: после fork соединение родителя не используем
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=CACHE_BUSY_TIMEOUT_SECONDS)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _count(self, name: str):
+        with self._counters_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, word: str) -> Optional[CachedVerdict]:
+        try:
+            row = self._connect().execute(
+                "SELECT lemma, filter_version, is_bad FROM filter_words WHERE word = ?",
+                (word,),
+            ).fetchone()
+        except sqlite3.Error as exc:
+            self._count("errors")
+            print(f"[Filter cache] Read failed: {exc}")
+            return None
+        self._count("hits" if row else "misses")
+        return CachedVerdict(row[0], row[1], bool(row[2])) if row else None
+
+    def put_many(self, items: Iterable[Tuple[str, CachedVerdict]]):
+        rows = [(word, item.lemma, item.filter_version, int(item.is_bad)) for word, item in items]
+        if not rows:
+            return
+        try:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO filter_words (word, lemma, filter_version, is_bad) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as exc:
+            self._count("errors")
+            print(f"[Filter cache] Write failed: {exc}")
+
+    def put(self, word: str, item: CachedVerdict):
+        self.put_many([(word, item)])
+
+    def count_entries(self) -> int:
+        try:
+            return self._connect().execute("SELECT COUNT(*) FROM filter_words").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+@lru_cache(maxsize=1)
+def get_filter_cache() -> Optional[SharedFilterCache]:
+    """Общий кэш фильтра или None, если MESSAGE_FILTER_CACHE_PATH не задан"""
+    if not settings.MESSAGE_FILTER_CACHE_PATH:
+        return None
+    return SharedFilterCache(settings.MESSAGE_FILTER_CACHE_PATH)
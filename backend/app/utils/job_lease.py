@@ -0,0 +1,44 @@
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from ..database import SessionLocal
+from ..models.job_lease import JobLease
+
+
+def _holder() -> str:
+    # pid берется при каждом вызове: после fork у воркеров он свой
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_job_lease(name: str, ttl_seconds: float) -> bool:
+    """
+    Берет или продлевает аренду задачи на ttl_seconds. Пока держатель жив и
+    продлевает аренду, остальные воркеры (в том числе на других машинах с той же
+    БД) получают False; после его остановки задачу подхватит другой воркер.
+    """
+    holder = _holder()
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    db = SessionLocal()
+    try:
+        updated = db.query(JobLease).filter(
+            JobLease.name == name,
+            or_(JobLease.holder == holder, JobLease.expires_at < now)
+        ).update({JobLease.holder: holder, JobLease.expires_at: expires_at}, synchronize_session=False)
+        if not updated:
+            if db.query(JobLease.name).filter(JobLease.name == name).first():
+                db.rollback()
+                return False
+            db.add(JobLease(name=name, holder=holder, expires_at=expires_at))
+        db.commit()
+        return True
+    except IntegrityError:
+        # Другой воркер создал запись одновременно с нами
+        db.rollback()
+        return False
+    finally:
+        db.close()
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models.course import CourseMember
+from ..models.user import User
+from .token_revocation import revocation_list, store_revocation
+
+# Сколько пар (пользователь, версия членства) помнить в процессе
+MEMBERSHIP_CACHE_MAX_SIZE = 10000
+
+# Курсы, членство в которых уже подтверждено БД, по (user_id, mv из access-токена).
+# Хранятся только положительные ответы: вступление в курс видно сразу, а при
+# выходе из курса версия растет и старые токены отзываются (см. события ниже).
+_member_courses: "OrderedDict[Tuple[int, int], Set[int]]" = OrderedDict()
+_member_courses_lock = threading.Lock()
+
+
+def is_course_member(db: Session, user: User, course_id: int) -> bool:
+    """
+    Является ли пользователь участником курса. Если access-токен несет версию
+    членства (claim mv), повторные проверки того же курса обходятся без запроса.
+    """
+    version = getattr(user, "token_membership_version", None)
+    key = (user.id, version)
+    if version is not None:
+        with _member_courses_lock:
+            if course_id in _member_courses.get(key, ()):
+                _member_courses.move_to_end(key)
+                return True
+
+    is_member = db.query(CourseMember.id).filter(
+        CourseMember.course_id == course_id,
+        CourseMember.user_id == user.id
+    ).first() is not None
+
+    if is_member and version is not None:
+        with _member_courses_lock:
+            _member_courses.setdefault(key, set()).add(course_id)
+            _member_courses.move_to_end(key)
+            while len(_member_courses) > MEMBERSHIP_CACHE_MAX_SIZE:
+                _member_courses.popitem(last=False)
+    return is_member
+
+
+def _bump_membership_version(connection, user_id: int):
+    users = User.__table__
+    connection.execute(
+        users.update().where(users.c.id == user_id).values(membership_version=users.c.membership_version + 1)
+    )
+
+
+@event.listens_for(CourseMember, "after_insert")
+def _on_member_added(mapper, connection, target):
+    _bump_membership_version(connection, target.user_id)
+
+
+@event.listens_for(CourseMember, "after_delete")
+def _on_member_removed(mapper, connection, target):
+    """
+    Выход, исключение или удаление курса: в старых токенах устаревший mv, по
+    которому кэш ещё считает пользователя участником, поэтому они отзываются.
+    Срабатывает и при каскадном удалении курса или пользователя через ORM.
+    """
+    _bump_membership_version(connection, target.user_id)
+
+    now = datetime.utcnow()
+    # Одновременное исключение из двух курсов не падает на вставке одной записи
+    store_revocation(connection, target.user_id, now)
+    revocation_list.add(target.user_id, now)
@@ -1,13 +1,17 @@
+import gc
+import hashlib
 import re
+import threading
 from functools import lru_cache
+from typing import Iterable, List, Optional
 
 from pymorphy3 import MorphAnalyzer
 
+from .filter_cache import CachedVerdict, get_filter_cache
+
 WORD_PATTERN = re.compile(r"[A-Za-zА-Яа-яЁё]+")
 RUSSIAN_LETTER_PATTERN = re.compile(r"[А-Яа-яЁё]")
-RU_HUI_PATTERN = re.compile(r"^ху[йеяию].*")
-
-MORPH = MorphAnalyzer()
+RU_HUI_PREFIXES: tuple[str, ...] = tuple(f"ху{letter}" for letter in "йеяию")
 
 # Нормальные формы (леммы), проверяются через pymorphy3.
 BAD_RU_LEMMAS: set[str] = {
@@ -62,42 +66,212 @@ BAD_EN_STEMS: tuple[str, ...] = (
 )
 
 
+# Версия списков слов: меняется при любой их правке. Хранится у каждого сообщения,
+# чтобы перепроверять историю чата только после изменения фильтра.
+FILTER_VERSION = hashlib.sha256(
+    repr((sorted(BAD_RU_LEMMAS), BAD_RU_PREFIXES, BAD_EN_STEMS, RU_HUI_PREFIXES)).encode()
+).hexdigest()[:16]
+
+# Метки в узлах префиксного дерева (не буквы, поэтому не пересекаются с переходами)
+_PREFIX_END = "$"  # Пройден запрещенный префикс: слово плохое при любом продолжении
+_WORD_END = "="  # Слово целиком совпало с запрещенной леммой
+_NEEDS_LEMMA = "?"  # Слово похоже на форму запрещенной леммы: решает pymorphy3
+
+# Сколько последних букв леммы может отличаться у словоформ (сука - суки, ебать - ебу)
+LEMMA_ENDING_LENGTH = 3
+
+
+def _build_trie(prefixes: Iterable[str], lemmas: Iterable[str] = ()) -> dict:
+    """
+    Префиксное дерево по нормализованным правилам: одно прохождение по буквам
+    слова заменяет перебор startswith по всем префиксам и основам.
+    """
+    root: dict = {}
+    for prefix in prefixes:
+        node = root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_PREFIX_END] = True
+
+    for lemma in lemmas:
+        node = root
+        stem_length = max(len(lemma) - LEMMA_ENDING_LENGTH, 2)
+        for depth, char in enumerate(lemma, start=1):
+            node = node.setdefault(char, {})
+            if depth == stem_length:
+                node[_NEEDS_LEMMA] = True
+        node[_WORD_END] = True
+    return root
+
+
+RU_TRIE = _build_trie(BAD_RU_PREFIXES + RU_HUI_PREFIXES, BAD_RU_LEMMAS)
+EN_TRIE = _build_trie(BAD_EN_STEMS)
+
+# Словари pymorphy3 занимают десятки МБ: анализатор создается при первом русском слове,
+# а при запуске нескольких воркеров - заранее в мастер-процессе (preload_morph_analyzer)
+_morph: Optional[MorphAnalyzer] = None
+_morph_lock = threading.Lock()
+
+
+def get_morph() -> MorphAnalyzer:
+    global _morph
+    if _morph is None:
+        with _morph_lock:
+            if _morph is None:
+                _morph = MorphAnalyzer()
+    return _morph
+
+
+def preload_morph_analyzer():
+    """
+    Загружает словари до fork воркеров, чтобы их страницы были общими (copy-on-write).
+    gc.freeze убирает уже созданные объекты из сборки мусора: иначе обход GC
+    в воркерах пишет в их заголовки и копирует страницы.
+    """
+    get_morph()
+    gc.freeze()
+
+
 def _normalize_word(word: str) -> str:
     return word.lower().replace("ё", "е")
 
 
-@lru_cache(maxsize=20000)
 def _to_lemma(word: str) -> str:
-    parsed = MORPH.parse(word)
+    parsed = get_morph().parse(word)
     if not parsed:
         return word
     return _normalize_word(parsed[0].normal_form)
 
 
+def _match_trie(trie: dict, word: str) -> Optional[bool]:
+    """
+    True - слово запрещено, False - точно нет, None - не решить без леммы
+    (слово начинается с основы запрещенной леммы, но само с ней не совпало).
+    """
+    node = trie
+    needs_lemma = False
+    for char in word:
+        node = node.get(char)
+        if node is None:
+            break
+        if _PREFIX_END in node:
+            return True
+        needs_lemma = needs_lemma or _NEEDS_LEMMA in node
+    else:
+        if _WORD_END in node:
+            return True
+    return None if needs_lemma else False
+
+
+@lru_cache(maxsize=20000)
+def _resolve_by_lemma(word: str) -> bool:
+    """
+    Вердикт для слова, которое не решило дерево. Сначала кэш процесса (lru_cache),
+    затем общий кэш воркеров (если включен), и только потом pymorphy3.
+    """
+    cache = get_filter_cache()
+    cached = cache.get(word) if cache else None
+    if cached and cached.filter_version == FILTER_VERSION:
+        return cached.is_bad
+
+    # Лемма из кэша годится и после смены списка слов - пересчитываем только вердикт
+    lemma = cached.lemma if cached else _to_lemma(word)
+    is_bad = _match_trie(RU_TRIE, lemma) is True
+    if cache:
+        cache.put(word, CachedVerdict(lemma, FILTER_VERSION, is_bad))
+    return is_bad
+
+
 def _is_bad_word(word: str) -> bool:
     normalized = _normalize_word(word)
     if not normalized:
         return False
 
     if RUSSIAN_LETTER_PATTERN.search(normalized):
-        lemma = _to_lemma(normalized)
-        for candidate in (normalized, lemma):
-            if candidate in BAD_RU_LEMMAS:
-                return True
-            if candidate.startswith(BAD_RU_PREFIXES):
-                return True
-            if RU_HUI_PATTERN.match(candidate):
-                return True
-        return False
+        verdict = _match_trie(RU_TRIE, normalized)
+        if verdict is None:
+            # Лемма нужна только для слов, которые дерево не решило
+            verdict = _resolve_by_lemma(normalized)
+        return verdict
 
-    return any(normalized == stem or normalized.startswith(stem) for stem in BAD_EN_STEMS)
+    return _match_trie(EN_TRIE, normalized) is True
 
 
-def sanitize_message(text: str) -> str:
+def _sanitize(text: str, verdicts: dict) -> str:
     def replace_token(match: re.Match[str]) -> str:
         token = match.group(0)
-        if _is_bad_word(token):
-            return "*" * len(token)
-        return token
+        is_bad = verdicts.get(token)
+        if is_bad is None:
+            is_bad = verdicts[token] = _is_bad_word(token)
+        return "*" * len(token) if is_bad else token
 
     return WORD_PATTERN.sub(replace_token, text)
+
+
+def sanitize_message(text: str) -> str:
+    return _sanitize(text, {})
+
+
+def sanitize_many(texts: Iterable[str]) -> List[str]:
+    """Фильтрует пачку сообщений: каждое уникальное слово проверяется один раз на всю пачку"""
+    verdicts: dict = {}
+    return [_sanitize(text, verdicts) for text in texts]
+
+
+def clear_memory_cache():
+    _resolve_by_lemma.cache_clear()
+
+
+def warm_shared_cache(words: Iterable[str], batch_size: int = 1000) -> int:
+    """
+    Заполняет общий кэш леммами и вердиктами для слов (например, из частотного
+    списка) до запуска воркеров. Возвращает число добавленных или обновленных слов.
+    """
+    cache = get_filter_cache()
+    if cache is None:
+        raise RuntimeError("Общий кэш фильтра выключен: задайте MESSAGE_FILTER_CACHE_PATH")
+
+    added = 0
+    batch = []
+    seen = set()
+    for word in words:
+        normalized = _normalize_word(word)
+        if normalized in seen or not RUSSIAN_LETTER_PATTERN.search(normalized):
+            continue
+        seen.add(normalized)
+        if _match_trie(RU_TRIE, normalized) is not None:
+            continue
+        cached = cache.get(normalized)
+        if cached and cached.filter_version == FILTER_VERSION:
+            continue
+        lemma = cached.lemma if cached else _to_lemma(normalized)
+        batch.append((normalized, CachedVerdict(lemma, FILTER_VERSION, _match_trie(RU_TRIE, lemma) is True)))
+        if len(batch) >= batch_size:
+            cache.put_many(batch)
+            added += len(batch)
+            batch = []
+    cache.put_many(batch)
+    return added + len(batch)
+
+
+def get_filter_cache_stats() -> dict:
+    """Счетчики попаданий в кэши фильтра текущего процесса"""
+    memory = _resolve_by_lemma.cache_info()
+    stats = {
+        "memory_hits": memory.hits,
+        "memory_misses": memory.misses,
+        "memory_size": memory.currsize,
+        "shared_enabled": False,
+    }
+    cache = get_filter_cache()
+    if cache is not None:
+        lookups = cache.hits + cache.misses
+        stats.update({
+            "shared_enabled": True,
+            "shared_hits": cache.hits,
+            "shared_misses": cache.misses,
+            "shared_errors": cache.errors,
+            "shared_hit_rate": round(cache.hits / lookups, 4) if lookups else None,
+            "shared_entries": cache.count_entries(),
+        })
+    return stats
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+from ..config import settings
+
+T = TypeVar("T")
+
+
+class PasswordHashPool:
+    """
+    Отдельный ограниченный пул для bcrypt. bcrypt отпускает GIL, поэтому хеши
+    считаются параллельно на PASSWORD_HASH_WORKERS ядрах. Синхронные
+    обработчики ставят задачу через anyio.from_thread.run (см. utils/auth.py). Если в работе и в очереди уже workers + queue_limit задач,
+    новая сразу отклоняется с 503, а не ждет.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Потоки не переживают fork: в воркере gunicorn пул создается заново
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            print(f"[Password pool] Queue is full ({self.workers} + {self.queue_limit}), rejecting")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, попробуйте через несколько секунд",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Слот освобождается по завершении хеша, а не ожидания: если клиент
+        # отключился и await отменен, поток все равно досчитывает хеш
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+
+password_pool = PasswordHashPool(
+    settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
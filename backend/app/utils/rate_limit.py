@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from ..config import settings
+
+# Не ждем блокировку общего файла дольше: при занятой базе запрос пропускается
+RATE_LIMIT_BUSY_TIMEOUT_SECONDS = 0.2
+# Сколько ведер держать в памяти процесса; сверх этого выбрасываются давно не трогавшиеся
+MEMORY_BUCKETS_MAX_SIZE = 100_000
+# Как часто процесс удаляет из общего файла восполнившиеся ведра
+RATE_LIMIT_PRUNE_INTERVAL_SECONDS = 60
+
+
+class RateLimitRule(NamedTuple):
+    capacity: float  # Сколько запросов подряд
+    refill_per_second: float  # Скорость восстановления
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimitRule":
+        """Формат "N/S": N запросов подряд, ведро полностью восполняется за S секунд"""
+        capacity, seconds = value.split("/")
+        return cls(float(capacity), float(capacity) / float(seconds))
+
+
+def _refill(tokens: float, updated_at: float, now: float, rule: RateLimitRule) -> float:
+    return min(rule.capacity, tokens + (now - updated_at) * rule.refill_per_second)
+
+
+def _retry_after(tokens: float, rule: RateLimitRule) -> float:
+    return (1 - tokens) / rule.refill_per_second
+
+
+def _full_at(tokens: float, now: float, rule: RateLimitRule) -> float:
+    # С этого момента ведро полное и ничем не отличается от отсутствующего
+    return now + (rule.capacity - tokens) / rule.refill_per_second
+
+
+class MemoryRateLimitBackend:
+    """
+    Ведра в памяти процесса: у каждого воркера свои. Порядок словаря - от давно
+    не трогавшихся к недавним, у каждого ведра - момент, когда оно восполнится
+    по своему правилу.
+    """
+
+    def __init__(self, max_size: int = MEMORY_BUCKETS_MAX_SIZE):
+        self.max_size = max_size
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rule: RateLimitRule) -> float:
+        """0, если запрос разрешен, иначе через сколько секунд повторить"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = _refill(bucket[0], bucket[1], now, rule) if bucket else rule.capacity
+            retry_after = _retry_after(tokens, rule) if tokens < 1 else 0
+            if not retry_after:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, _full_at(tokens, now, rule))
+            self._buckets.move_to_end(key)
+            self._evict(now)
+            return retry_after
+
+    def _evict(self, now: float):
+        """
+        Снимает ведра с начала очереди, пока они уже восполнились или их больше
+        max_size. Каждое ведро снимается не больше раза на вставку, без обхода словаря.
+        """
+        while self._buckets:
+            _, _, full_at = next(iter(self._buckets.values()))
+            if full_at > now and len(self._buckets) <= self.max_size:
+                break
+            self._buckets.popitem(last=False)
+
+
+class SQLiteRateLimitBackend:
+    """
+    Общие для воркеров ведра в файле SQLite (WAL), по аналогии с кэшем фильтра
+    чата. Ошибки SQLite не блокируют вход: запрос пропускается без лимита.
+    Восполнившиеся ведра (full_at в прошлом) каждый процесс удаляет раз в
+    RATE_LIMIT_PRUNE_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._pruned_at = 0.0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        with connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, "
+                "full_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(rate_limit_buckets)")}
+            if "full_at" not in columns:
+                # Файл прежней версии: старые ведра удалятся при первой очистке
+                connection.execute("ALTER TABLE rate_limit_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at ON rate_limit_buckets (full_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на поток и на процесс: после fork соединение родителя не используем
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=RATE_LIMIT_BUSY_TIMEOUT_SECONDS, isolation_level=None
+            )
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def consume(self, key: str, rule: RateLimitRule) -> float:
+        now = time.time()
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = _refill(row[0], row[1], now, rule) if row else rule.capacity
+                retry_after = _retry_after(tokens, rule) if tokens < 1 else 0
+                if not retry_after:
+                    tokens -= 1
+                connection.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, _full_at(tokens, now, rule)),
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as exc:
+            print(f"[Rate limit] Shared bucket unavailable: {exc}")
+            return 0
+        if now - self._pruned_at >= RATE_LIMIT_PRUNE_INTERVAL_SECONDS:
+            self._pruned_at = now
+            try:
+                self.prune(now)
+            except sqlite3.Error as exc:
+                print(f"[Rate limit] Failed to prune buckets: {exc}")
+        return retry_after
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удаляет восполнившиеся ведра; возвращает, сколько удалено"""
+        cursor = self._connect().execute(
+            "DELETE FROM rate_limit_buckets WHERE full_at <= ?", (time.time() if now is None else now,)
+        )
+        return cursor.rowcount
+
+
+_backend = None
+
+
+@lru_cache(maxsize=1)
+def _default_backend():
+    if settings.RATE_LIMIT_SHARED_PATH:
+        return SQLiteRateLimitBackend(settings.RATE_LIMIT_SHARED_PATH)
+    return MemoryRateLimitBackend()
+
+
+def set_rate_limit_backend(backend):
+    """
+    Подменяет хранилище ведер (например, на Redis). Нужен объект с методом
+    consume(key, rule) -> float: 0 или через сколько секунд повторить.
+    """
+    global _backend
+    _backend = backend
+
+
+def get_rate_limit_backend():
+    return _backend or _default_backend()
+
+
+# Правила по сценариям: (на IP, на email)
+RATE_LIMIT_SCOPES = {
+    "login": ("RATE_LIMIT_LOGIN_PER_IP", "RATE_LIMIT_LOGIN_PER_EMAIL"),
+    "send_code": ("RATE_LIMIT_SEND_CODE_PER_IP", "RATE_LIMIT_SEND_CODE_PER_EMAIL"),
+    "confirm_code": ("RATE_LIMIT_CONFIRM_CODE_PER_IP", "RATE_LIMIT_CONFIRM_CODE_PER_EMAIL"),
+}
+
+
+def get_client_ip(request: Request) -> str:
+    # За nginx адрес клиента приходит в X-Real-IP (см. nginx/nginx.conf)
+    if settings.RATE_LIMIT_TRUST_PROXY:
+        real_ip = request.headers.get("x-real-ip")
+        if real_ip:
+            return real_ip.strip()
+    return request.client.host if request.client else "unknown"
+
+
+def enforce_rate_limit(request: Request, scope: str, email: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    Token bucket по IP и по учетной записи: email из тела запроса или user_id
+    (sub access-токена, см. rate_limit_by_token). Вызывается до запросов к БД
+    и bcrypt; при исчерпании ведра - 429 с Retry-After.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    ip_setting, account_setting = RATE_LIMIT_SCOPES[scope]
+    account_rule = RateLimitRule.parse(getattr(settings, account_setting))
+    keys = [(f"{scope}:ip:{get_client_ip(request)}", RateLimitRule.parse(getattr(settings, ip_setting)))]
+    if email:
+        keys.append((f"{scope}:email:{email.strip().lower()}", account_rule))
+    if user_id:
+        keys.append((f"{scope}:user:{user_id}", account_rule))
+
+    backend = get_rate_limit_backend()
+    for key, rule in keys:
+        retry_after = backend.consume(key, rule)
+        if retry_after:
+            seconds = max(int(retry_after + 0.999), 1)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Слишком много попыток. Повторите через {seconds} сек.",
+                headers={"Retry-After": str(seconds)},
+            )
@@ -0,0 +1,106 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.auth_token import RefreshToken
+from ..models.user import User
+from ..schemas.user import Token, UserResponse
+from .auth import create_user_access_token
+
+
+def _hash_token(raw_token: str) -> str:
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Сессия истекла, войдите заново",
+    )
+
+
+def create_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """Новый refresh-токен (в транзакции вызывающего кода); в БД попадает только его хеш"""
+    raw_token = secrets.token_urlsafe(48)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(raw_token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return raw_token
+
+
+def issue_tokens(db: Session, user: User, family_id: Optional[str] = None) -> Token:
+    """Пара access + refresh для входа, регистрации или обновления; делает commit"""
+    refresh_token = create_refresh_token(db, user.id, family_id)
+    db.commit()
+    return Token(
+        access_token=create_user_access_token(user),
+        refresh_token=refresh_token,
+        token_type="bearer",
+        user=UserResponse.model_validate(user),
+    )
+
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Token:
+    """
+    Меняет refresh-токен на новую пару. Повторное предъявление уже обмененного
+    токена означает утечку: отзывается вся цепочка этого входа. Исключение -
+    первые REFRESH_TOKEN_REUSE_GRACE_SECONDS после обмена, когда две вкладки
+    обновляют токен одновременно.
+    """
+    now = datetime.utcnow()
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw_token)).first()
+    if not token or token.revoked_at is not None or token.expires_at < now:
+        raise _invalid_refresh_token()
+
+    if token.used_at is not None:
+        if token.used_at < now - timedelta(seconds=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+            print(f"[Auth] Refresh token reuse for user {token.user_id}, revoking the session")
+            revoke_refresh_family(db, token.family_id)
+            db.commit()
+        raise _invalid_refresh_token()
+
+    # Условный UPDATE: из двух параллельных обменов одного токена проходит один
+    claimed = db.query(RefreshToken).filter(
+        RefreshToken.id == token.id,
+        RefreshToken.used_at.is_(None)
+    ).update({RefreshToken.used_at: now}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        raise _invalid_refresh_token()
+
+    # Claims нового access-токена берутся из БД, а не из кэша пользователей
+    user = db.query(User).filter(User.id == token.user_id).first()
+    if not user:
+        db.rollback()
+        raise _invalid_refresh_token()
+    return issue_tokens(db, user, token.family_id)
+
+
+def revoke_refresh_family(db: Session, family_id: str):
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def revoke_refresh_token(db: Session, raw_token: str):
+    """Выход: отзывает цепочку, к которой относится токен"""
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw_token)).first()
+    if token:
+        revoke_refresh_family(db, token.family_id)
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int):
+    """Выход на всех устройствах (смена или сброс пароля)"""
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import aiofiles
+from fastapi import HTTPException, Request, status
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.upload_session import UploadSession
+from ..schemas.upload import UploadSessionResponse
+from .file_upload import (
+    SavedUpload,
+    get_max_upload_size,
+    get_staging_dir,
+    hash_file,
+    sanitize_filename,
+    store_blob,
+)
+
+# Аренда сессии на запись части: продлевается, пока тело запроса читается,
+# и истекает сама, если воркер упал посреди записи
+UPLOAD_WRITER_LEASE_SECONDS = 120
+
+
+def get_staging_path(session_id: str) -> str:
+    return os.path.join(get_staging_dir(), f"{session_id}.part")
+
+
+def get_received_bytes(upload_session: UploadSession) -> int:
+    """Фактический размер staging-файла: источник истины для смещения"""
+    staging_path = get_staging_path(upload_session.id)
+    if not os.path.exists(staging_path):
+        return 0
+    return os.path.getsize(staging_path)
+
+
+def build_session_response(upload_session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=upload_session.id,
+        target_type=upload_session.target_type,
+        target_id=upload_session.target_id,
+        file_name=upload_session.file_name,
+        file_size=upload_session.file_size,
+        offset=upload_session.received_bytes,
+        created_at=upload_session.created_at,
+        updated_at=upload_session.updated_at,
+    )
+
+
+def create_upload_session(
+    db: Session,
+    user_id: int,
+    target_type: str,
+    target_id: int,
+    file_name: str,
+    file_size: int,
+) -> UploadSession:
+    if file_size > get_max_upload_size():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Файл слишком большой. Максимальный размер {settings.MAX_FILE_SIZE_MB} МБ"
+        )
+
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        target_type=target_type,
+        target_id=target_id,
+        file_name=sanitize_filename(file_name),
+        file_size=file_size,
+        received_bytes=0,
+    )
+    db.add(upload_session)
+    db.commit()
+    db.refresh(upload_session)
+
+    # Создаем пустой staging-файл, дальше части дописываются в него
+    open(get_staging_path(upload_session.id), "wb").close()
+    return upload_session
+
+
+def get_user_upload_session(db: Session, session_id: str, user_id: int) -> UploadSession:
+    upload_session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not upload_session or upload_session.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Сессия загрузки не найдена"
+        )
+    return upload_session
+
+
+def sync_received_bytes(db: Session, upload_session: UploadSession) -> UploadSession:
+    received_bytes = get_received_bytes(upload_session)
+    if received_bytes != upload_session.received_bytes:
+        upload_session.received_bytes = received_bytes
+        upload_session.updated_at = datetime.utcnow()
+        db.commit()
+        db.refresh(upload_session)
+    return upload_session
+
+
+def _claim_writer(db: Session, upload_session: UploadSession) -> bool:
+    """
+    Занимает сессию условным UPDATE: из параллельных запросов (повтор части,
+    пока первый еще читается) писать будет только один, в том числе на разных воркерах
+    """
+    now = datetime.utcnow()
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == upload_session.id,
+        or_(UploadSession.writer_expires_at.is_(None), UploadSession.writer_expires_at < now),
+    ).update(
+        {UploadSession.writer_expires_at: now + timedelta(seconds=UPLOAD_WRITER_LEASE_SECONDS)},
+        synchronize_session=False,
+    )
+    db.commit()
+    return bool(claimed)
+
+
+def _set_writer_expires_at(db: Session, upload_session: UploadSession, expires_at):
+    db.query(UploadSession).filter(UploadSession.id == upload_session.id).update(
+        {UploadSession.writer_expires_at: expires_at}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _raise_writer_busy(upload_session: UploadSession):
+    received_bytes = get_received_bytes(upload_session)
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"Часть файла уже загружается другим запросом. Получено {received_bytes} байт",
+        headers={"Upload-Offset": str(received_bytes)},
+    )
+
+
+async def append_chunk(db: Session, upload_session: UploadSession, offset: int, request: Request) -> UploadSession:
+    """
+    Дописывает тело запроса в staging-файл начиная с offset.
+    Принимается только offset, равный уже полученному объему; при обрыве
+    соединения записанная часть сохраняется и клиент продолжает с нового смещения.
+    Смещение проверяется и часть пишется под арендой сессии, поэтому два запроса
+    с одним offset не допишут файл дважды: второй получит 409.
+    """
+    if not _claim_writer(db, upload_session):
+        _raise_writer_busy(upload_session)
+
+    try:
+        received_bytes = get_received_bytes(upload_session)
+        if offset != received_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Неверное смещение. Ожидается {received_bytes}",
+                headers={"Upload-Offset": str(received_bytes)},
+            )
+
+        staging_path = get_staging_path(upload_session.id)
+        written = 0
+        renewed_at = time.monotonic()
+        async with aiofiles.open(staging_path, "ab") as staging_file:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if received_bytes + written + len(chunk) > upload_session.file_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Объем данных превышает заявленный размер файла"
+                    )
+                await staging_file.write(chunk)
+                written += len(chunk)
+                if time.monotonic() - renewed_at > UPLOAD_WRITER_LEASE_SECONDS / 2:
+                    renewed_at = time.monotonic()
+                    _set_writer_expires_at(
+                        db, upload_session, datetime.utcnow() + timedelta(seconds=UPLOAD_WRITER_LEASE_SECONDS)
+                    )
+    finally:
+        _set_writer_expires_at(db, upload_session, None)
+        sync_received_bytes(db, upload_session)
+
+    return upload_session
+
+
+async def finalize_upload_session(db: Session, upload_session: UploadSession) -> SavedUpload:
+    """
+    Переносит собранный staging-файл в хранилище без повторного копирования
+    и удаляет сессию. Пока часть еще пишется, завершить загрузку нельзя.
+    """
+    if not _claim_writer(db, upload_session):
+        _raise_writer_busy(upload_session)
+
+    try:
+        received_bytes = get_received_bytes(upload_session)
+        if received_bytes != upload_session.file_size:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Файл загружен не полностью: {received_bytes} из {upload_session.file_size} байт",
+                headers={"Upload-Offset": str(received_bytes)},
+            )
+
+        staging_path = get_staging_path(upload_session.id)
+        content_hash = await asyncio.to_thread(hash_file, staging_path)
+        file_name = upload_session.file_name
+        file_path = await asyncio.to_thread(store_blob, staging_path, content_hash, file_name)
+    except BaseException:
+        _set_writer_expires_at(db, upload_session, None)
+        raise
+
+    db.delete(upload_session)
+    db.commit()
+
+    return SavedUpload(
+        file_path=file_path,
+        file_name=file_name,
+        file_size=received_bytes,
+        content_hash=content_hash,
+    )
+
+
+def discard_upload_session(db: Session, upload_session: UploadSession):
+    staging_path = get_staging_path(upload_session.id)
+    db.delete(upload_session)
+    db.commit()
+    if os.path.exists(staging_path):
+        os.remove(staging_path)
+
+
+def cleanup_stale_upload_sessions(db: Session) -> int:
+    """
+    Удаляет сессии без активности дольше UPLOAD_SESSION_TTL_HOURS
+    и staging-файлы, для которых сессии уже нет.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    stale_sessions = db.query(UploadSession).filter(UploadSession.updated_at < cutoff).all()
+
+    removed = 0
+    for upload_session in stale_sessions:
+        discard_upload_session(db, upload_session)
+        removed += 1
+
+    staging_dir = get_staging_dir()
+    active_ids = {session_id for (session_id,) in db.query(UploadSession.id).all()}
+    cutoff_timestamp = time.time() - settings.UPLOAD_SESSION_TTL_HOURS * 3600
+    for entry in os.scandir(staging_dir):
+        session_id = entry.name.removesuffix(".part")
+        if session_id in active_ids:
+            continue
+        if entry.stat().st_mtime < cutoff_timestamp:
+            # Каталоги - остатки прерванных конвертаций Word -> PDF
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+
+    return removed
+
+
+def run_upload_session_gc():
+    db = SessionLocal()
+    try:
+        removed = cleanup_stale_upload_sessions(db)
+        if removed:
+            print(f"[Uploads] Removed {removed} stale upload sessions")
+    finally:
+        db.close()
@@ -0,0 +1,185 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+from urllib.parse import quote
+
+from ..config import settings
+
+# Размер блока при чтении объектов из хранилища
+STORAGE_CHUNK_SIZE = 1024 * 1024
+
+
+class StoredObjectInfo(NamedTuple):
+    size: int
+
+
+def get_storage_key(file_path: str) -> str:
+    """
+    Ключ объекта в хранилище по значению file_path из БД.
+    В БД пути хранятся как раньше (UPLOAD_DIR/blobs/...), ключ - путь относительно UPLOAD_DIR.
+    """
+    relative_path = os.path.relpath(os.path.normpath(file_path), os.path.normpath(settings.UPLOAD_DIR))
+    return relative_path.replace(os.sep, "/")
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища загруженных файлов.
+    Ключи - пути относительно UPLOAD_DIR через "/".
+    """
+
+    @abstractmethod
+    def put_file(self, source_path: str, key: str):
+        """Кладет локальный файл в хранилище. source_path после вызова больше не существует."""
+
+    @abstractmethod
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Читает байты [start, end] (end включительно, None - до конца) блоками"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Удаляет объект; отсутствующий объект - не ошибка"""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[StoredObjectInfo]:
+        """Информация об объекте или None, если его нет"""
+
+    def presign(self, key: str, file_name: str, expires_seconds: int) -> Optional[str]:
+        """Временная прямая ссылка на скачивание или None, если хранилище их не выдает"""
+        return None
+
+    def download_to_path(self, key: str, dest_path: str):
+        with open(dest_path, "wb") as dest:
+            for chunk in self.open_range(key):
+                dest.write(chunk)
+
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: str):
+        self.root = root
+
+    def get_local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_file(self, source_path: str, key: str):
+        target_path = self.get_local_path(key)
+        if os.path.exists(target_path):
+            os.remove(source_path)
+            # Свежий mtime: сборщик мусора не трогает недавно использованные блобы
+            os.utime(target_path)
+            return
+        Path(target_path).parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source_path, target_path)
+
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self.get_local_path(key), "rb") as source:
+            source.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk_size = STORAGE_CHUNK_SIZE if remaining is None else min(STORAGE_CHUNK_SIZE, remaining)
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str):
+        local_path = self.get_local_path(key)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    def stat(self, key: str) -> Optional[StoredObjectInfo]:
+        local_path = self.get_local_path(key)
+        if not os.path.isfile(local_path):
+            return None
+        return StoredObjectInfo(size=os.path.getsize(local_path))
+
+    def download_to_path(self, key: str, dest_path: str):
+        shutil.copyfile(self.get_local_path(key), dest_path)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Хранилище по протоколу S3 (AWS, MinIO, локальные заглушки через S3_ENDPOINT_URL).
+    boto3 импортируется только при выборе этого бэкенда.
+    """
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.config import Config
+            from botocore.exceptions import ClientError
+        except ImportError as exc:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужно установить boto3") from exc
+
+        self._client_error = ClientError
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            config=Config(signature_version="s3v4"),
+        )
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put_file(self, source_path: str, key: str):
+        # Одинаковые блобы не перезаливаем
+        if self.stat(key) is None:
+            # upload_file сам переходит на multipart-загрузку для больших файлов
+            self.client.upload_file(source_path, self.bucket, self._object_key(key))
+        os.remove(source_path)
+
+    def open_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": self._object_key(key)}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)["Body"]
+        try:
+            yield from body.iter_chunks(STORAGE_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def stat(self, key: str) -> Optional[StoredObjectInfo]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredObjectInfo(size=head["ContentLength"])
+
+    def presign(self, key: str, file_name: str, expires_seconds: int) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+                "ResponseContentDisposition": f"attachment; filename*=utf-8''{quote(file_name)}",
+            },
+            ExpiresIn=expires_seconds,
+        )
+
+
+@lru_cache
+def get_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend()
+    if settings.STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Неизвестный STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return LocalStorageBackend(settings.UPLOAD_DIR)
+
+
+def is_local_storage() -> bool:
+    return isinstance(get_storage(), LocalStorageBackend)
@@ -0,0 +1,135 @@
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.assignment import Assignment, AssignmentFile
+from ..models.course import Course
+from ..models.submission import Submission, SubmissionFile, SubmissionFeedbackFile
+from ..models.user import User
+
+# Учитываются файлы, загруженные пользователями. PDF для проверки создает сервер,
+# и они в квоту не входят.
+
+
+def _quota_bytes(quota_mb: int) -> Optional[int]:
+    return quota_mb * 1024 * 1024 if quota_mb > 0 else None
+
+
+def storage_quota_exceeded_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="Превышена квота хранилища"
+    )
+
+
+def get_remaining_quota(db: Session, user_id: int, course_id: int) -> Optional[int]:
+    """Сколько байт ещё можно загрузить пользователю в курс; None - без ограничений"""
+    limits = []
+
+    user_quota = _quota_bytes(settings.USER_STORAGE_QUOTA_MB)
+    if user_quota is not None:
+        used = db.query(User.storage_used_bytes).filter(User.id == user_id).scalar() or 0
+        limits.append(user_quota - used)
+
+    course_quota = _quota_bytes(settings.COURSE_STORAGE_QUOTA_MB)
+    if course_quota is not None:
+        used = db.query(Course.storage_used_bytes).filter(Course.id == course_id).scalar() or 0
+        limits.append(course_quota - used)
+
+    return max(min(limits), 0) if limits else None
+
+
+def ensure_storage_quota(db: Session, user_id: int, course_id: int, file_size: int):
+    remaining = get_remaining_quota(db, user_id, course_id)
+    if remaining is not None and file_size > remaining:
+        raise storage_quota_exceeded_error()
+
+
+def add_storage_usage(db: Session, user_id: Optional[int], course_id: Optional[int], delta: Optional[int]):
+    """
+    Атомарно меняет счетчики пользователя и курса на delta байт.
+    Коммит - за вызывающим, вместе с записью о файле.
+    """
+    if not delta:
+        return
+    if user_id is not None:
+        db.query(User).filter(User.id == user_id).update(
+            {User.storage_used_bytes: User.storage_used_bytes + delta},
+            synchronize_session=False,
+        )
+    if course_id is not None:
+        db.query(Course).filter(Course.id == course_id).update(
+            {Course.storage_used_bytes: Course.storage_used_bytes + delta},
+            synchronize_session=False,
+        )
+
+
+def _sum_by(db: Session, key_column, size_column, *joins, keys: Optional[list] = None) -> dict:
+    """Сумма размеров по ключу; keys - только для этих ключей, чтобы не агрегировать всю таблицу"""
+    query = db.query(key_column, func.sum(func.coalesce(size_column, 0))).select_from(size_column.class_)
+    for target in joins:
+        query = query.join(target)
+    if keys is not None:
+        query = query.filter(key_column.in_(keys))
+    return {key: int(total or 0) for key, total in query.group_by(key_column).all()}
+
+
+def _merge_totals(*totals: dict) -> dict:
+    merged = {}
+    for part in totals:
+        for key, value in part.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def recalculate_storage_usage(
+    db: Session,
+    user_ids: Optional[Iterable[int]] = None,
+    course_ids: Optional[Iterable[int]] = None,
+):
+    """
+    Пересчитывает счетчики по записям о файлах в БД (диск не сканируется).
+    Без аргументов - для всех; иначе только для переданных пользователей и курсов.
+    Используется после каскадных удалений и для первичного заполнения.
+    """
+    recalculate_all = user_ids is None and course_ids is None
+    user_keys = None if recalculate_all else list(user_ids or [])
+    course_keys = None if recalculate_all else list(course_ids or [])
+
+    if user_keys is None or user_keys:
+        user_totals = _merge_totals(
+            _sum_by(db, Submission.student_id, SubmissionFile.file_size, SubmissionFile.submission, keys=user_keys),
+            _sum_by(db, SubmissionFeedbackFile.teacher_id, SubmissionFeedbackFile.file_size, keys=user_keys),
+            _sum_by(
+                db, Course.creator_id, AssignmentFile.file_size, AssignmentFile.assignment, Assignment.course,
+                keys=user_keys,
+            ),
+        )
+        users_query = db.query(User)
+        if user_keys is not None:
+            users_query = users_query.filter(User.id.in_(user_keys))
+        for user in users_query.all():
+            user.storage_used_bytes = user_totals.get(user.id, 0)
+
+    if course_keys is None or course_keys:
+        course_totals = _merge_totals(
+            _sum_by(
+                db, Assignment.course_id, SubmissionFile.file_size, SubmissionFile.submission, Submission.assignment,
+                keys=course_keys,
+            ),
+            _sum_by(
+                db, Assignment.course_id, SubmissionFeedbackFile.file_size, SubmissionFeedbackFile.submission,
+                Submission.assignment, keys=course_keys,
+            ),
+            _sum_by(db, Assignment.course_id, AssignmentFile.file_size, AssignmentFile.assignment, keys=course_keys),
+        )
+        courses_query = db.query(Course)
+        if course_keys is not None:
+            courses_query = courses_query.filter(Course.id.in_(course_keys))
+        for course in courses_query.all():
+            course.storage_used_bytes = course_totals.get(course.id, 0)
+
+    db.commit()
@@ -0,0 +1,103 @@
+import calendar
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import SessionLocal
+from ..models.auth_token import TokenRevocation
+
+
+def _timestamp(value: datetime) -> float:
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1_000_000
+
+
+def _revocation_window() -> timedelta:
+    # Дольше access-токен не живет, более старые записи ничего не отзывают
+    return timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+class RevocationList:
+    """
+    Копия таблицы token_revocations в памяти процесса. Перечитывается не чаще
+    раза в TOKEN_REVOCATION_REFRESH_SECONDS, поэтому отзыв из другого воркера
+    начинает действовать здесь с такой задержкой; отзыв в этом процессе - сразу.
+    """
+
+    def __init__(self):
+        self._revoked_before: Dict[int, float] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload_if_stale(self):
+        if time.monotonic() - self._loaded_at < settings.TOKEN_REVOCATION_REFRESH_SECONDS:
+            return
+        db = SessionLocal()
+        try:
+            rows = db.query(TokenRevocation.user_id, TokenRevocation.revoked_before).filter(
+                TokenRevocation.revoked_before > datetime.utcnow() - _revocation_window()
+            ).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._revoked_before = {user_id: _timestamp(revoked_before) for user_id, revoked_before in rows}
+            self._loaded_at = time.monotonic()
+
+    def add(self, user_id: int, revoked_before: datetime):
+        with self._lock:
+            self._revoked_before[user_id] = _timestamp(revoked_before)
+
+    def is_revoked(self, user_id: int, issued_at: float) -> bool:
+        self._reload_if_stale()
+        with self._lock:
+            revoked_before = self._revoked_before.get(user_id)
+        return revoked_before is not None and issued_at < revoked_before
+
+
+revocation_list = RevocationList()
+
+
+def store_revocation(connection, user_id: int, revoked_before: datetime):
+    """
+    Записывает время отзыва (в транзакции connection). Запись пользователя
+    одна: UPDATE, а если ее нет - INSERT в точке сохранения. Если ту же запись
+    одновременно вставил другой запрос, откатывается только INSERT и
+    повторяется UPDATE.
+    """
+    revocations = TokenRevocation.__table__
+    update = revocations.update().where(revocations.c.user_id == user_id).values(revoked_before=revoked_before)
+    if connection.execute(update).rowcount:
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(revocations.insert().values(user_id=user_id, revoked_before=revoked_before))
+    except IntegrityError:
+        connection.execute(update)
+
+
+def revoke_access_tokens(db: Session, user_id: int):
+    """
+    Отзывает все access-токены пользователя, выданные до этого момента
+    (в транзакции вызывающего кода). Клиент получит 401 и обновит токен через
+    refresh - уже с актуальными claims.
+    """
+    now = datetime.utcnow()
+    store_revocation(db.connection(), user_id, now)
+    # Истекшие записи больше не нужны
+    db.query(TokenRevocation).filter(
+        TokenRevocation.revoked_before <= now - _revocation_window()
+    ).delete(synchronize_session=False)
+    revocation_list.add(user_id, now)
+
+
+def is_token_revoked(payload: dict) -> bool:
+    """Токены без iat (выданные до появления отзыва) считаются выданными в момент 0"""
+    try:
+        user_id = int(payload.get("sub"))
+    except (TypeError, ValueError):
+        return False
+    return revocation_list.is_revoked(user_id, float(payload.get("iat") or 0))
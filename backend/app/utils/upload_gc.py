@@ -0,0 +1,183 @@
+import os
+import time
+from contextlib import suppress
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+from ..config import settings
+from ..database import SessionLocal
+from .file_upload import LEGACY_DIR_NAME, UPLOAD_PATH_COLUMNS, get_quarantine_dir, quarantine_file
+from .job_lease import acquire_job_lease
+from .storage import is_local_storage
+
+UPLOAD_GC_JOB_NAME = "upload-gc"
+
+
+class UploadGcReport(NamedTuple):
+    scanned: int
+    quarantined: int
+    restored: int
+    deleted: int
+    reclaimed_bytes: int
+
+
+def _iter_files(root: str, skip_hidden: bool) -> Iterator[Tuple[str, str]]:
+    """(ключ относительно root через "/", путь) для всех файлов под root"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if skip_hidden and dirpath == root:
+            # .staging и .quarantine обслуживаются отдельно
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for file_name in filenames:
+            path = os.path.join(dirpath, file_name)
+            yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _reference_candidates(key: str) -> List[str]:
+    """Варианты записи пути файла в БД"""
+    path = os.path.join(settings.UPLOAD_DIR, *key.split("/"))
+    normalized = os.path.normpath(path)
+    candidates = [path, normalized, f".{os.sep}{normalized}"]
+    parts = key.split("/")
+    if parts[0] == LEGACY_DIR_NAME:
+        # Файл перенесен migrate_upload_layout, а запись в БД ещё со старым плоским путем
+        candidates.append(os.path.join(settings.UPLOAD_DIR, parts[-1]))
+    return candidates
+
+
+def _find_referenced_keys(keys: List[str]) -> Set[str]:
+    """Какие из ключей упоминаются хотя бы в одной колонке пути. Короткая сессия на пачку."""
+    key_by_candidate = {
+        candidate: key
+        for key in keys
+        for candidate in _reference_candidates(key)
+    }
+    db = SessionLocal()
+    try:
+        referenced = set()
+        for _, column in UPLOAD_PATH_COLUMNS:
+            for (path,) in db.query(column).filter(column.in_(key_by_candidate.keys())).distinct():
+                referenced.add(key_by_candidate[path])
+        return referenced
+    finally:
+        db.close()
+
+
+def _file_mtime_and_size(path: str):
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat_result.st_mtime, stat_result.st_size
+
+
+def _sweep_quarantine(dry_run: bool) -> Tuple[int, int, int]:
+    """Возвращает файлы с появившимися ссылками на место, просроченные удаляет"""
+    restored = 0
+    deleted = 0
+    reclaimed_bytes = 0
+    quarantine_dir = get_quarantine_dir()
+    grace_cutoff = time.time() - settings.UPLOAD_GC_GRACE_HOURS * 3600
+
+    for batch in _batched(_iter_files(quarantine_dir, skip_hidden=False), settings.UPLOAD_GC_BATCH_SIZE):
+        referenced = _find_referenced_keys([key for key, _ in batch])
+        for key, path in batch:
+            file_info = _file_mtime_and_size(path)
+            if file_info is None:
+                continue
+            mtime, size = file_info
+
+            if key in referenced:
+                restored += 1
+                if dry_run:
+                    continue
+                original_path = os.path.join(settings.UPLOAD_DIR, *key.split("/"))
+                # Файл мог вернуть на место запрос, который на него сослался (restore_quarantined_file)
+                with suppress(FileNotFoundError):
+                    if os.path.exists(original_path):
+                        os.remove(path)
+                    else:
+                        Path(original_path).parent.mkdir(parents=True, exist_ok=True)
+                        os.replace(path, original_path)
+                continue
+
+            if mtime < grace_cutoff:
+                deleted += 1
+                reclaimed_bytes += size
+                if not dry_run:
+                    with suppress(FileNotFoundError):
+                        os.remove(path)
+
+    return restored, deleted, reclaimed_bytes
+
+
+def _quarantine_unreferenced(dry_run: bool) -> Tuple[int, int]:
+    scanned = 0
+    quarantined = 0
+    # Недавние файлы могут принадлежать загрузке, запись о которой ещё не закоммичена
+    min_age_cutoff = time.time() - settings.UPLOAD_GC_MIN_AGE_MINUTES * 60
+
+    for batch in _batched(_iter_files(settings.UPLOAD_DIR, skip_hidden=True), settings.UPLOAD_GC_BATCH_SIZE):
+        scanned += len(batch)
+        candidates = []
+        for key, path in batch:
+            file_info = _file_mtime_and_size(path)
+            if file_info is not None and file_info[0] < min_age_cutoff:
+                candidates.append((key, path))
+        if not candidates:
+            continue
+
+        referenced = _find_referenced_keys([key for key, _ in candidates])
+        for key, path in candidates:
+            if key in referenced:
+                continue
+            quarantined += 1
+            if dry_run:
+                continue
+            try:
+                quarantine_file(path)
+            except FileNotFoundError:
+                continue
+
+    return scanned, quarantined
+
+
+def collect_orphaned_uploads(dry_run: bool = False) -> UploadGcReport:
+    """
+    Инкрементальная сборка мусора в UPLOAD_DIR: файлы обходятся пачками
+    по UPLOAD_GC_BATCH_SIZE, для каждой пачки - короткие читающие запросы
+    по всем колонкам путей. Файлы без ссылок уходят в карантин, а удаляются
+    только если за время карантина ссылки так и не появились.
+    """
+    restored, deleted, reclaimed_bytes = _sweep_quarantine(dry_run)
+    scanned, quarantined = _quarantine_unreferenced(dry_run)
+    return UploadGcReport(
+        scanned=scanned,
+        quarantined=quarantined,
+        restored=restored,
+        deleted=deleted,
+        reclaimed_bytes=reclaimed_bytes,
+    )
+
+
+def run_upload_gc():
+    if not is_local_storage():
+        # Для удаленного хранилища используйте lifecycle-правила бакета
+        return
+    # Один проход на все воркеры: параллельные сборщики переносили бы одни и те же файлы.
+    # Аренда на два интервала: пока держатель жив, он продлевает ее каждый проход
+    if not acquire_job_lease(UPLOAD_GC_JOB_NAME, settings.UPLOAD_GC_INTERVAL_MINUTES * 60 * 2):
+        return
+    report = collect_orphaned_uploads()
+    if report.quarantined or report.restored or report.deleted:
+        print(
+            f"[Uploads GC] Scanned {report.scanned}, quarantined {report.quarantined}, "
+            f"restored {report.restored}, deleted {report.deleted}, "
+            f"reclaimed {report.reclaimed_bytes} bytes"
+        )
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from ..config import settings
+from ..models.user import User
+
+# Поля, которых хватает большинству запросов (то же, что отдает UserResponse).
+# Остальные колонки (пароль, коды, квота) подгружаются из БД при первом обращении.
+SNAPSHOT_FIELDS = ("id", "email", "username", "is_admin", "is_email_verified", "created_at")
+
+
+class UserSnapshotCache:
+    """
+    Ограниченный LRU-кэш снимков пользователей с TTL, общий для потоков процесса.
+    Между воркерами не разделяется: изменения из другого процесса или напрямую
+    в БД видны не позже чем через TTL.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._items: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Растет при каждой инвалидации: снимок, прочитанный до неё, не сохраняется
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[user_id]
+                self.misses += 1
+                return None
+            self._items.move_to_end(user_id)
+            self.hits += 1
+            return item[1]
+
+    def put(self, user_id: int, snapshot: dict, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._items[user_id] = (time.monotonic() + self.ttl_seconds, snapshot)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self.generation += 1
+            self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
+
+
+user_cache = UserSnapshotCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_SIZE)
+
+
+def _snapshot(user: User) -> dict:
+    return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+
+def _attach_snapshot(db: Session, snapshot: dict) -> User:
+    """
+    Пользователь из снимка без запроса к БД. Объект привязывается к сессии как
+    загруженный, поэтому изменения полей сохраняются обычным commit, а поля
+    вне снимка и связи загружаются при обращении.
+    """
+    user = User()
+    for field, value in snapshot.items():
+        setattr(user, field, value)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def get_user_cached(db: Session, user_id: int) -> Optional[User]:
+    if settings.USER_CACHE_TTL_SECONDS <= 0:
+        return db.query(User).filter(User.id == user_id).first()
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        return _attach_snapshot(db, snapshot)
+
+    generation = user_cache.generation
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is not None:
+        user_cache.put(user_id, _snapshot(user), generation)
+    return user
+
+
+def invalidate_cached_user(user_id: int):
+    """Вызывать после изменения полей снимка или удаления пользователя"""
+    user_cache.invalidate(user_id)
@@ -0,0 +1,16 @@
+# Запуск нескольких воркеров (нужен пакет gunicorn):
+#     gunicorn -c gunicorn.conf.py app.main:app
+# Приложение импортируется в мастер-процессе до fork, словари pymorphy3 загружаются там же,
+# и воркеры разделяют их страницы памяти вместо собственной копии в каждом.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def on_starting(server):
+    from app.utils.message_filter import preload_morph_analyzer
+
+    preload_morph_analyzer()
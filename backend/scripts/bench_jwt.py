@@ -0,0 +1,55 @@
+"""
+Бенчмарк проверки JWT на типичной нагрузке SPA: много запросов подряд
+с одним и тем же токеном.
+
+Сравниваются python-jose (прежняя библиотека, если установлена), PyJWT
+и decode_token приложения (PyJWT + кэш проверенных payload).
+
+Запуск из каталога backend:
+    python -m scripts.bench_jwt [--requests 20000] [--tokens 50]
+"""
+import argparse
+import time
+
+import jwt
+
+from app.config import settings
+from app.utils import auth
+from app.utils.auth import create_access_token, decode_token
+
+
+def _measure(name: str, tokens, requests: int, decode) -> float:
+    started = time.perf_counter()
+    for index in range(requests):
+        decode(tokens[index % len(tokens)])
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {elapsed * 1e6 / requests:8.1f} us/token")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки JWT")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=50, help="Сколько разных пользователей")
+    args = parser.parse_args()
+
+    tokens = [create_access_token({"sub": str(user_id)}) for user_id in range(1, args.tokens + 1)]
+    algorithms = [settings.ALGORITHM]
+
+    try:
+        from jose import jwt as jose_jwt
+    except ImportError:
+        print("python-jose не установлен, пропускаем")
+    else:
+        _measure("python-jose", tokens, args.requests,
+                 lambda token: jose_jwt.decode(token, settings.SECRET_KEY, algorithms=algorithms))
+
+    _measure("PyJWT", tokens, args.requests,
+             lambda token: jwt.decode(token, settings.SECRET_KEY, algorithms=algorithms))
+
+    auth._payload_cache.clear()
+    _measure("decode_token (кэш)", tokens, args.requests, decode_token)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Нагрузочный тест входа: волна одновременных логинов, как в начале занятия.
+Печатает число ответов по кодам (200, 401, 503) и задержки.
+
+Нужен запущенный сервер и существующий пользователь:
+    python -m scripts.bench_login --url http://localhost:8000 \\
+        --email student@example.com --password secret --concurrency 100 --requests 400
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+async def _worker(client: httpx.AsyncClient, args, queue: asyncio.Queue, latencies, codes: Counter):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/auth/login", json={"email": args.email, "password": args.password})
+            codes[response.status_code] += 1
+        except httpx.HTTPError as exc:
+            codes[type(exc).__name__] += 1
+        latencies.append(time.perf_counter() - started)
+
+
+def _percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+async def _run(args):
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+    latencies = []
+    codes: Counter = Counter()
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout, verify=False) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(client, args, queue, latencies, codes) for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} login(s), concurrency {args.concurrency}: {elapsed:.1f}s, {args.requests / elapsed:.1f} req/s")
+    print("Codes:", ", ".join(f"{code}: {count}" for code, count in sorted(codes.items(), key=str)))
+    if latencies:
+        print(
+            f"Latency: median {statistics.median(latencies) * 1000:.0f} ms, "
+            f"p95 {_percentile(latencies, 0.95) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест входа")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Бенчмарк фильтра сообщений чата: прежняя проверка (перебор startswith и
+pymorphy3 для каждого нового русского слова) против префиксного дерева
+и пакетного sanitize_many.
+
+Корпус генерируется детерминированно из типичных фраз чата задания
+с небольшой долей нецензурных слов в разных формах.
+
+Запуск из каталога backend:
+    python -m scripts.bench_message_filter [--messages 20000] [--seed 1]
+"""
+import argparse
+import random
+import re
+import time
+from functools import lru_cache
+
+from app.utils import message_filter
+from app.utils.message_filter import (
+    BAD_EN_STEMS,
+    BAD_RU_LEMMAS,
+    BAD_RU_PREFIXES,
+    RUSSIAN_LETTER_PATTERN,
+    WORD_PATTERN,
+    get_morph,
+    sanitize_many,
+    sanitize_message,
+)
+
+PHRASES = [
+    "Здравствуйте, а когда будет проверка второй лабораторной?",
+    "Я загрузил отчет, посмотрите пожалуйста",
+    "Не получается открыть файл с заданием",
+    "Можно сдать работу до пятницы?",
+    "В задаче 3 опечатка в условии, там должно быть n больше нуля",
+    "Спасибо, все понятно",
+    "А нужно ли оформлять титульный лист по ГОСТу?",
+    "Кто-нибудь понял, как решать последний пункт?",
+    "Преподаватель сказал, что дедлайн перенесли на понедельник",
+    "Скиньте, пожалуйста, ссылку на методичку",
+    "У меня ошибка segmentation fault при запуске тестов",
+    "Ок, переделаю и отправлю снова",
+    "Сколько баллов максимум за эту работу?",
+    "Сегодня консультация в 18:00 в аудитории 305",
+    "Проверьте, пожалуйста, мою сдачу, я исправил замечания",
+    "Почему у меня не засчитали вторую попытку?",
+    "Когда выложат оценки за контрольную?",
+    "Нужно использовать рекурсию или можно циклом?",
+    "the build fails on python 3.12, any ideas?",
+    "pushed the fix to my branch, please review",
+]
+
+RUDE_WORDS = [
+    "блять", "бля", "сука", "суки", "сучка", "хуйня", "хуево", "пиздец", "пизда",
+    "ебать", "ебу", "ебаный", "заебали", "наебали", "уебок", "мудак", "мудаки",
+    "долбоеб", "fuck", "fucking", "shit", "bitch",
+]
+
+
+def build_corpus(messages: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(messages):
+        words = rng.choice(PHRASES).split()
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(RUDE_WORDS))
+        corpus.append(" ".join(words))
+    return corpus
+
+
+RU_HUI_PATTERN = re.compile(r"^ху[йеяию].*")
+
+
+@lru_cache(maxsize=20000)
+def _legacy_to_lemma(word: str) -> str:
+    parsed = get_morph().parse(word)
+    if not parsed:
+        return word
+    return parsed[0].normal_form.lower().replace("ё", "е")
+
+
+def _legacy_is_bad_word(word: str) -> bool:
+    normalized = word.lower().replace("ё", "е")
+    if not normalized:
+        return False
+    if RUSSIAN_LETTER_PATTERN.search(normalized):
+        lemma = _legacy_to_lemma(normalized)
+        for candidate in (normalized, lemma):
+            if candidate in BAD_RU_LEMMAS:
+                return True
+            if candidate.startswith(BAD_RU_PREFIXES):
+                return True
+            if RU_HUI_PATTERN.match(candidate):
+                return True
+        return False
+    return any(normalized == stem or normalized.startswith(stem) for stem in BAD_EN_STEMS)
+
+
+def legacy_sanitize_message(text: str) -> str:
+    def replace_token(match: re.Match[str]) -> str:
+        token = match.group(0)
+        return "*" * len(token) if _legacy_is_bad_word(token) else token
+
+    return WORD_PATTERN.sub(replace_token, text)
+
+
+def _run(name: str, func, corpus: list[str], reset_cache) -> list[str]:
+    reset_cache()
+    parse_calls = 0
+    morph = get_morph()
+    original_parse = morph.parse
+
+    def counting_parse(word):
+        nonlocal parse_calls
+        parse_calls += 1
+        return original_parse(word)
+
+    morph.parse = counting_parse
+    try:
+        started = time.perf_counter()
+        result = func(corpus)
+        elapsed = time.perf_counter() - started
+    finally:
+        morph.parse = original_parse
+
+    per_message_us = elapsed / len(corpus) * 1_000_000
+    print(f"{name:<28} {elapsed * 1000:9.1f} ms  {per_message_us:7.1f} us/msg  pymorphy parse: {parse_calls}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк фильтра сообщений чата")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    print(f"Corpus: {len(corpus)} messages, {sum(len(WORD_PATTERN.findall(text)) for text in corpus)} words")
+
+    legacy = _run(
+        "legacy sanitize_message",
+        lambda texts: [legacy_sanitize_message(text) for text in texts],
+        corpus,
+        _legacy_to_lemma.cache_clear,
+    )
+    single = _run(
+        "trie sanitize_message",
+        lambda texts: [sanitize_message(text) for text in texts],
+        corpus,
+        message_filter.clear_memory_cache,
+    )
+    batch = _run("trie sanitize_many", sanitize_many, corpus, message_filter.clear_memory_cache)
+
+    mismatches = sum(1 for old, new in zip(legacy, single) if old != new)
+    mismatches += sum(1 for old, new in zip(legacy, batch) if old != new)
+    print(f"Mismatches with legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
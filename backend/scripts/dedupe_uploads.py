@@ -0,0 +1,108 @@
+"""
+Разовая миграция: убирает дубликаты среди уже загруженных файлов.
+
+Одинаковые по содержимому файлы из UPLOAD_DIR переносятся в хранилище блобов
+(UPLOAD_DIR/blobs/ab/cd/<sha256><ext>), все ссылки в БД перенаправляются на блоб,
+а лишние копии удаляются.
+
+Запуск из каталога backend:
+    python -m scripts.dedupe_uploads [--dry-run]
+"""
+import argparse
+import os
+import shutil
+from collections import defaultdict
+
+from app.database import SessionLocal
+from app.config import settings
+from app.utils.file_upload import BLOBS_DIR_NAME, UPLOAD_PATH_COLUMNS, get_blob_path, hash_file
+
+
+def _collect_referenced_paths(db) -> set[str]:
+    paths = set()
+    for _, column in UPLOAD_PATH_COLUMNS:
+        for (path,) in db.query(column).distinct():
+            paths.add(path)
+    return paths
+
+
+def _group_duplicates(paths: set[str]) -> dict[str, list[str]]:
+    """Группирует существующие файлы по пути будущего блоба"""
+    groups = defaultdict(list)
+    blobs_dir = os.path.normpath(os.path.join(settings.UPLOAD_DIR, BLOBS_DIR_NAME))
+    for path in sorted(paths):
+        # Блобы уже уникальны; у сжатых хеш в имени не совпадает с хешем байтов на диске
+        if os.path.normpath(path).startswith(blobs_dir + os.sep):
+            continue
+        if not os.path.isfile(path):
+            continue
+        blob_path = get_blob_path(hash_file(path), os.path.basename(path))
+        if path != blob_path:
+            groups[blob_path].append(path)
+    return groups
+
+
+def _repoint_references(db, old_paths: list[str], blob_path: str, content_hash: str, file_size: int):
+    for model, column in UPLOAD_PATH_COLUMNS:
+        values = {column.key: blob_path}
+        if hasattr(model, "content_hash"):
+            values["content_hash"] = content_hash
+            values["file_size"] = file_size
+        db.query(model).filter(column.in_(old_paths)).update(values, synchronize_session=False)
+
+
+def dedupe_uploads(dry_run: bool = False):
+    db = SessionLocal()
+    try:
+        groups = _group_duplicates(_collect_referenced_paths(db))
+
+        deduped_groups = 0
+        removed_files = 0
+        reclaimed_bytes = 0
+        for blob_path, old_paths in groups.items():
+            # Одиночный файл переносим только если такой блоб уже есть (загружен после перехода)
+            if len(old_paths) < 2 and not os.path.exists(blob_path):
+                continue
+
+            file_size = os.path.getsize(old_paths[0])
+            duplicates = old_paths if os.path.exists(blob_path) else old_paths[1:]
+            deduped_groups += 1
+            removed_files += len(duplicates)
+            reclaimed_bytes += file_size * len(duplicates)
+            print(f"[Dedupe] {len(old_paths)} file(s) -> {blob_path}")
+            if dry_run:
+                continue
+
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                # Жесткая ссылка: старый путь остается рабочим, пока ссылки в БД не обновлены
+                try:
+                    os.link(old_paths[0], blob_path)
+                except OSError:
+                    shutil.copy2(old_paths[0], blob_path)
+
+            content_hash = os.path.splitext(os.path.basename(blob_path))[0]
+            _repoint_references(db, old_paths, blob_path, content_hash, file_size)
+            db.commit()
+
+            for path in old_paths:
+                os.remove(path)
+
+        action = "would reclaim" if dry_run else "reclaimed"
+        print(
+            f"[Dedupe] Groups: {deduped_groups}, duplicate files: {removed_files}, "
+            f"{action} {reclaimed_bytes} bytes"
+        )
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дедупликация файлов в UPLOAD_DIR")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+    args = parser.parse_args()
+    dedupe_uploads(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Ручной запуск сборщика осиротевших файлов (тот же, что периодически
+выполняет приложение).
+
+Запуск из каталога backend:
+    python -m scripts.gc_uploads [--dry-run]
+"""
+import argparse
+
+from app.utils.storage import is_local_storage
+from app.utils.upload_gc import collect_orphaned_uploads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка мусора в UPLOAD_DIR")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+    args = parser.parse_args()
+
+    if not is_local_storage():
+        print("[Uploads GC] Only the local storage backend is supported")
+        return
+
+    report = collect_orphaned_uploads(dry_run=args.dry_run)
+    action = "would reclaim" if args.dry_run else "reclaimed"
+    print(
+        f"[Uploads GC] Scanned {report.scanned}, quarantined {report.quarantined}, "
+        f"restored {report.restored}, deleted {report.deleted}, "
+        f"{action} {report.reclaimed_bytes} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Переименование блобов, сжатых при хранении до появления зарезервированных
+суффиксов: <sha256><расширение>.gz -> .stored-gz, .zst -> .stored-zst.
+
+Раньше сжатие определялось по суффиксу .gz/.zst, и собственные архивы
+пользователей (data.tar.gz) отдавались распакованными. Сжатый сервером блоб
+отличается тем, что sha256 в имени посчитан от исходного содержимого, а не от
+байтов на диске; блобы пользователей с .gz остаются как есть.
+
+Файл сначала переносится, затем в той же пачке переписываются колонки
+file_path, поэтому миграцию можно прерывать и запускать повторно. Между
+этими шагами скачивание файла не находит его - запускайте при остановленном
+приложении.
+
+Запуск из каталога backend:
+    python -m scripts.migrate_stored_encoding [--batch-size 500] [--dry-run]
+"""
+import argparse
+import os
+import re
+
+from app.database import SessionLocal
+from app.utils.compression import COMPRESSION_SUFFIXES
+from app.utils.file_upload import UPLOAD_PATH_COLUMNS, hash_file, resolve_upload_path, to_abs_path
+
+# Суффиксы до появления зарезервированных
+OLD_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+_OLD_BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[^.]+)?(\.gz|\.zst)$")
+
+# Проверенные пути блобов: file_path -> новый путь или None (файл пользователя)
+_checked = {}
+
+
+def _new_blob_path(path: str):
+    """Новый путь для блоба, сжатого сервером; None - переименовывать не нужно"""
+    if path in _checked:
+        return _checked[path]
+
+    new_path = None
+    match = _OLD_BLOB_NAME_RE.match(os.path.basename(path))
+    if match:
+        candidate = path.removesuffix(match.group(3)) + COMPRESSION_SUFFIXES[OLD_SUFFIXES[match.group(3)]]
+        if os.path.isfile(to_abs_path(candidate)):
+            # Уже перенесен: осталось переписать запись
+            new_path = candidate
+        else:
+            abs_path = resolve_upload_path(path)
+            if abs_path is not None and hash_file(abs_path) != match.group(1):
+                new_path = candidate
+    _checked[path] = new_path
+    return new_path
+
+
+def _migrate_column(db, model, column, batch_size: int, dry_run: bool) -> int:
+    renamed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(model.id, column)
+            .filter(model.id > last_id, column.like("%.gz") | column.like("%.zst"))
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updated = False
+        for row_id, path in rows:
+            new_path = _new_blob_path(path)
+            if new_path is None:
+                continue
+            renamed += 1
+            if dry_run:
+                continue
+            if os.path.isfile(to_abs_path(path)):
+                os.replace(to_abs_path(path), to_abs_path(new_path))
+            db.query(model).filter(model.id == row_id).update(
+                {column.key: new_path}, synchronize_session=False
+            )
+            updated = True
+
+        if updated:
+            db.commit()
+        print(f"[Stored encoding] {model.__tablename__}: processed up to id {last_id}")
+
+    return renamed
+
+
+def migrate_stored_encoding(batch_size: int = 500, dry_run: bool = False):
+    db = SessionLocal()
+    try:
+        total = sum(
+            _migrate_column(db, model, column, batch_size, dry_run)
+            for model, column in UPLOAD_PATH_COLUMNS
+        )
+        action = "would rename" if dry_run else "renamed"
+        print(f"[Stored encoding] Rows {action}: {total}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Переименование сжатых при хранении блобов в .stored-*")
+    parser.add_argument("--batch-size", type=int, default=500, help="Сколько записей обрабатывать за транзакцию")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+    args = parser.parse_args()
+    migrate_stored_encoding(batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
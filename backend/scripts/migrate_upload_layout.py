@@ -0,0 +1,102 @@
+"""
+Миграция старой плоской раскладки UPLOAD_DIR/<имя> в шардированную
+UPLOAD_DIR/legacy/ab/cd/<имя>, чтобы в одном каталоге не скапливались
+десятки тысяч файлов.
+
+Файлы переносятся пачками: сначала файл перемещается на новое место, затем
+в той же пачке переписываются колонки file_path. Между этими шагами файл
+продолжает находиться через resolve_upload_path, поэтому миграцию можно
+прерывать и запускать повторно.
+
+Запуск из каталога backend:
+    python -m scripts.migrate_upload_layout [--batch-size 500] [--dry-run]
+"""
+import argparse
+import os
+from pathlib import Path
+
+from app.database import SessionLocal
+from app.utils.file_upload import UPLOAD_PATH_COLUMNS, get_sharded_legacy_path, is_flat_upload_path
+
+
+def _move_to_sharded_path(old_path: str, new_path: str) -> bool:
+    """Переносит файл; False если файла нет ни на старом, ни на новом месте"""
+    if os.path.isfile(new_path):
+        # Уже перенесен (повторный запуск или общий файл нескольких записей)
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+        return True
+    if not os.path.isfile(old_path):
+        return False
+    Path(new_path).parent.mkdir(parents=True, exist_ok=True)
+    os.replace(old_path, new_path)
+    return True
+
+
+def _migrate_column(db, model, column, batch_size: int, dry_run: bool) -> tuple[int, int]:
+    moved = 0
+    missing = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(model.id, column)
+            .filter(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updated = False
+        for row_id, path in rows:
+            if not path or not is_flat_upload_path(path):
+                continue
+            new_path = get_sharded_legacy_path(path)
+            if dry_run:
+                moved += 1
+                continue
+            if not _move_to_sharded_path(path, new_path):
+                missing += 1
+                print(f"[Layout] Missing file for {model.__tablename__}#{row_id}: {path}")
+                continue
+            db.query(model).filter(model.id == row_id).update(
+                {column.key: new_path}, synchronize_session=False
+            )
+            moved += 1
+            updated = True
+
+        if updated:
+            db.commit()
+        print(f"[Layout] {model.__tablename__}: processed up to id {last_id}")
+
+    return moved, missing
+
+
+def migrate_upload_layout(batch_size: int = 500, dry_run: bool = False):
+    db = SessionLocal()
+    try:
+        total_moved = 0
+        total_missing = 0
+        for model, column in UPLOAD_PATH_COLUMNS:
+            moved, missing = _migrate_column(db, model, column, batch_size, dry_run)
+            total_moved += moved
+            total_missing += missing
+
+        action = "would move" if dry_run else "moved"
+        print(f"[Layout] Rows {action}: {total_moved}, missing files: {total_missing}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос файлов UPLOAD_DIR в шардированную раскладку")
+    parser.add_argument("--batch-size", type=int, default=500, help="Сколько записей обрабатывать за транзакцию")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет сделано")
+    args = parser.parse_args()
+    migrate_upload_layout(batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Прогрев общего кэша фильтра чата (MESSAGE_FILTER_CACHE_PATH) перед запуском
+воркеров, чтобы после деплоя первые сообщения не ждали pymorphy3.
+
+Источники слов: частотный список (по слову в строке, допускается "слово частота")
+и/или история чата из БД.
+
+Запуск из каталога backend:
+    python -m scripts.warm_filter_cache --words freq_ru.txt
+    python -m scripts.warm_filter_cache --from-chat
+"""
+import argparse
+import time
+from typing import Iterator
+
+from app.database import SessionLocal
+from app.models.message import ChatMessage
+from app.utils.message_filter import WORD_PATTERN, get_filter_cache_stats, warm_shared_cache
+
+
+def _iter_file_words(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as source:
+        for line in source:
+            parts = line.split()
+            if parts:
+                yield parts[0]
+
+
+def _iter_chat_words(batch_size: int = 1000) -> Iterator[str]:
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.query(ChatMessage.id, ChatMessage.message).filter(
+                ChatMessage.id > last_id,
+                ChatMessage.is_deleted == False
+            ).order_by(ChatMessage.id).limit(batch_size).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        for _, message in rows:
+            yield from WORD_PATTERN.findall(message)
+        last_id = rows[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев общего кэша фильтра чата")
+    parser.add_argument("--words", help="Частотный список слов")
+    parser.add_argument("--from-chat", action="store_true", help="Взять слова из истории чата")
+    args = parser.parse_args()
+    if not args.words and not args.from_chat:
+        parser.error("нужен --words и/или --from-chat")
+
+    started = time.perf_counter()
+    added = 0
+    if args.words:
+        added += warm_shared_cache(_iter_file_words(args.words))
+    if args.from_chat:
+        added += warm_shared_cache(_iter_chat_words())
+
+    stats = get_filter_cache_stats()
+    print(
+        f"[Filter cache] Warmed {added} word(s) in {time.perf_counter() - started:.1f}s, "
+        f"{stats['shared_entries']} entries in cache"
+    )
+
+
+if __name__ == "__main__":
+    main()
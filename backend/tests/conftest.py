@@ -0,0 +1,153 @@
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Тесты работают с отдельной БД и каталогом загрузок: переменные окружения
+# выставляются до импорта приложения, поэтому .env и реальная БД не затрагиваются
+_work_dir = tempfile.mkdtemp(prefix="classroom-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work_dir, 'classroom.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_work_dir, "uploads")
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["DOWNLOAD_OFFLOAD"] = ""
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["SMTP_HOST"] = ""
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app.main  # noqa: E402,F401  создает таблицы и регистрирует обработчики событий моделей
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.utils.storage import get_storage  # noqa: E402
+
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Пустой UPLOAD_DIR на каждый тест"""
+    path = tmp_path / "uploads"
+    path.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(path))
+    get_storage.cache_clear()
+    yield path
+    get_storage.cache_clear()
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    # Без with: фоновые задачи lifespan в тестах не запускаются
+    return TestClient(app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def postgres_engine(tmp_path):
+    """
+    Движок на временном PostgreSQL (пакет pgserver) со схемой приложения;
+    без pgserver тест пропускается
+    """
+    pgserver = pytest.importorskip("pgserver")
+    from sqlalchemy import create_engine
+
+    from app.database import Base
+
+    server = pgserver.get_server(tmp_path / "pg")
+    pg_engine = create_engine(server.get_uri())
+    try:
+        Base.metadata.create_all(pg_engine)
+        yield pg_engine
+    finally:
+        pg_engine.dispose()
+        server.cleanup()
+
+
+@pytest.fixture
+def make_user(db):
+    """Создает пользователя и возвращает (user, заголовки с access-токеном)"""
+    from app.models import User
+    from app.utils.auth import create_user_access_token
+
+    def factory(is_admin: bool = False):
+        number = next(_user_numbers)
+        user = User(
+            email=f"user{number}@example.com",
+            username=f"user{number}",
+            hashed_password="-",
+            is_admin=is_admin,
+            is_email_verified=True,
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user, {"Authorization": f"Bearer {create_user_access_token(user)}"}
+
+    return factory
+
+
+@pytest.fixture
+def make_assignment(db, make_user):
+    """
+    Создает курс преподавателя с одним заданием.
+    Возвращает (задание, заголовки преподавателя - участника курса).
+    """
+    from app.models import Assignment, Course, CourseMember
+    from app.utils.auth import create_user_access_token
+
+    def factory():
+        teacher, _ = make_user()
+        course = Course(title="Курс", code=f"C{teacher.id:08d}", creator_id=teacher.id)
+        db.add(course)
+        db.commit()
+        db.add(CourseMember(course_id=course.id, user_id=teacher.id))
+        assignment = Assignment(course_id=course.id, title="Задание", created_by=teacher.id)
+        db.add(assignment)
+        db.commit()
+        # Токен выпускается после вступления в курс: в нем актуальная версия членства
+        db.refresh(teacher)
+        return assignment, {"Authorization": f"Bearer {create_user_access_token(teacher)}"}
+
+    return factory
+
+
+@pytest.fixture
+def make_assignment_file(db, upload_dir, make_assignment):
+    """
+    Создает курс с заданием и файлом задания из content под именем file_name.
+    Возвращает (запись AssignmentFile, заголовки участника курса).
+    """
+    from app.models import AssignmentFile
+    from app.utils.file_upload import store_file
+
+    def factory(file_name: str, content: bytes):
+        assignment, headers = make_assignment()
+
+        source = upload_dir / ".staging" / "source"
+        source.parent.mkdir(exist_ok=True)
+        source.write_bytes(content)
+        saved = store_file(str(source), file_name)
+        record = AssignmentFile(
+            assignment_id=assignment.id,
+            file_path=saved.file_path,
+            file_name=saved.file_name,
+            file_size=saved.file_size,
+            content_hash=saved.content_hash,
+        )
+        db.add(record)
+        db.commit()
+        return record, headers
+
+    return factory
@@ -0,0 +1,92 @@
+import pytest
+
+from app.models import Assignment, ChatMessage, Course, User
+from app.utils import chat_search
+
+
+def _post(client, assignment_id, headers, text):
+    response = client.post(f"/api/chat/assignments/{assignment_id}/messages", json={"message": text}, headers=headers)
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _search(client, assignment_id, headers, query):
+    response = client.get(
+        f"/api/chat/assignments/{assignment_id}/messages/search", params={"q": query}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sqlite_index_uses_lemmas():
+    assert chat_search.build_search_lemmas("Где книги?") == "где книги книга"
+
+
+def test_search_finds_other_word_forms(client, make_assignment):
+    assignment, headers = make_assignment()
+    books_id = _post(client, assignment.id, headers, "Принесите книги к семинару")
+    _post(client, assignment.id, headers, "Дедлайн перенесли на пятницу")
+
+    results = _search(client, assignment.id, headers, "книга")
+    assert [result["id"] for result in results] == [books_id]
+    assert "<mark>книги</mark>" in results[0]["snippet"]
+
+    # Обратное направление: в запросе другая форма, в сообщении - лемма
+    lemma_id = _post(client, assignment.id, headers, "Одна книга на двоих")
+    assert {result["id"] for result in _search(client, assignment.id, headers, "книгами")} == {books_id, lemma_id}
+
+
+def test_search_keeps_prefix_match_and_yo(client, make_assignment):
+    assignment, headers = make_assignment()
+    message_id = _post(client, assignment.id, headers, "Ещё раз про программирование")
+
+    assert [result["id"] for result in _search(client, assignment.id, headers, "прогр")] == [message_id]
+    assert [result["id"] for result in _search(client, assignment.id, headers, "еще")] == [message_id]
+    assert _search(client, assignment.id, headers, "программирование семинар") == []
+
+
+def test_deleted_message_leaves_index(client, make_assignment):
+    assignment, headers = make_assignment()
+    message_id = _post(client, assignment.id, headers, "Ссылки на лекции")
+    assert _search(client, assignment.id, headers, "лекция")
+
+    assert client.delete(f"/api/chat/messages/{message_id}", headers=headers).status_code == 204
+    assert _search(client, assignment.id, headers, "лекция") == []
+
+
+@pytest.fixture
+def postgres_session(postgres_engine):
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    with postgres_engine.begin() as connection:
+        for statement in chat_search.POSTGRES_FTS_STATEMENTS:
+            connection.execute(text(statement))
+    with Session(postgres_engine) as session:
+        yield session
+
+
+def test_postgres_tsvector_search(postgres_session, monkeypatch):
+    monkeypatch.setattr(chat_search, "_search_mode", None)
+    db = postgres_session
+
+    user = User(email="pg@example.com", username="pg", hashed_password="-")
+    db.add(user)
+    db.flush()
+    course = Course(title="Курс", code="PGCOURSE", creator_id=user.id)
+    db.add(course)
+    db.flush()
+    assignment = Assignment(course_id=course.id, title="Задание", created_by=user.id)
+    db.add(assignment)
+    db.flush()
+    books = ChatMessage(assignment_id=assignment.id, user_id=user.id, message="Принесите книги к семинару")
+    deleted = ChatMessage(assignment_id=assignment.id, user_id=user.id, message="Книги уже у меня", is_deleted=True)
+    db.add_all([books, deleted, ChatMessage(assignment_id=assignment.id, user_id=user.id, message="Дедлайн")])
+    db.commit()
+
+    assert chat_search.search_chat_messages(db, assignment.id, "книга", 0, 20) == [books.id]
+    assert chat_search._search_mode == "tsvector"
+    assert chat_search.search_chat_messages(db, assignment.id, "семин книг", 0, 20) == [books.id]
+    assert chat_search.search_chat_messages(db, assignment.id, "пятница", 0, 20) == []
+    # Лемматизация в Python для PostgreSQL не выполняется
+    assert books.search_lemmas is None
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from pydantic import ValidationError
+
+from app.config import Settings, settings
+
+CONTENT = b"%PDF-1.4 test" * 100
+OFFLOAD_HEADERS = ("x-accel-redirect", "x-sendfile")
+
+
+@pytest.fixture
+def assignment_file(make_assignment_file):
+    return make_assignment_file("Отчет.pdf", CONTENT)
+
+
+def _url(record):
+    return f"/api/assignments/{record.assignment_id}/files/{record.id}/download"
+
+
+def test_x_accel_redirect(client, assignment_file, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_OFFLOAD", "x-accel-redirect")
+    record, headers = assignment_file
+
+    response = client.get(_url(record), headers=headers)
+
+    assert response.status_code == 200
+    assert response.content == b""
+    blob_key = os.path.relpath(record.file_path, settings.UPLOAD_DIR).replace(os.sep, "/")
+    assert response.headers["x-accel-redirect"] == f"/protected-uploads/{blob_key}"
+    assert response.headers["content-disposition"] == "attachment; filename*=utf-8''%D0%9E%D1%82%D1%87%D0%B5%D1%82.pdf"
+    assert response.headers["etag"] == f'"{record.content_hash}"'
+    assert "x-sendfile" not in response.headers
+
+
+def test_x_sendfile(client, assignment_file, monkeypatch):
+    monkeypatch.setattr(settings, "DOWNLOAD_OFFLOAD", "x-sendfile")
+    record, headers = assignment_file
+
+    response = client.get(_url(record), headers=headers)
+
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-sendfile"] == os.path.normpath(os.path.abspath(record.file_path))
+    assert "x-accel-redirect" not in response.headers
+
+
+def test_offload_disabled_streams_file(client, assignment_file):
+    record, headers = assignment_file
+
+    response = client.get(_url(record), headers=headers)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert not any(header in response.headers for header in OFFLOAD_HEADERS)
+
+
+@pytest.mark.parametrize("mode", ["x-accel-redirect", "x-sendfile"])
+def test_forbidden_and_missing_never_offload(client, assignment_file, make_user, monkeypatch, mode):
+    monkeypatch.setattr(settings, "DOWNLOAD_OFFLOAD", mode)
+    record, headers = assignment_file
+    outsider, outsider_headers = make_user()
+
+    responses = [
+        # Не участник курса
+        (403, client.get(_url(record), headers=outsider_headers)),
+        # Нет такого файла у задания
+        (404, client.get(f"/api/assignments/{record.assignment_id}/files/999999/download", headers=headers)),
+        # Без токена (HTTPBearer отвечает 403)
+        (403, client.get(_url(record))),
+    ]
+    # Запись есть, а файла на диске нет
+    os.remove(record.file_path)
+    responses.append((404, client.get(_url(record), headers=headers)))
+
+    for expected_status, response in responses:
+        assert response.status_code == expected_status
+        assert not any(header in response.headers for header in OFFLOAD_HEADERS)
+
+
+def test_unknown_offload_mode_is_rejected():
+    with pytest.raises(ValidationError):
+        Settings(DOWNLOAD_OFFLOAD="nginx")
+    assert Settings(DOWNLOAD_OFFLOAD=" X-Sendfile ").DOWNLOAD_OFFLOAD == "x-sendfile"
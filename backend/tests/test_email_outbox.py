@@ -0,0 +1,162 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models import EmailOutbox
+from app.utils.email_outbox import _retry_delay, enqueue_email, send_outbox_batch, smtp_connection
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class Handler:
+    """
+    SMTP-сервер для тестов: запоминает доставленные письма с адресом клиента
+    (по нему видно, одно ли было соединение) и отвечает заданными кодами
+    """
+
+    def __init__(self):
+        self.delivered = []
+        self.rcpt_replies = {}
+        self.data_replies = {}
+        self.disconnect_after = None
+        self.controller = None
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rcpt_replies:
+            return self.rcpt_replies[address]
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        address = envelope.rcpt_tos[0]
+        if address in self.data_replies:
+            return self.data_replies[address]
+        self.delivered.append((address, session.peer))
+        if address == self.disconnect_after:
+            # Сервер пропадает: новые подключения не принимаются, текущее рвется после ответа
+            self.controller.server.close()
+            asyncio.get_running_loop().call_soon(server.transport.close)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(db, monkeypatch):
+    handler = Handler()
+    port = _free_port()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    handler.controller = controller
+    controller.start()
+
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", port)
+    monkeypatch.setattr(settings, "SMTP_USE_TLS", False)
+    monkeypatch.setattr(settings, "SMTP_USE_SSL", False)
+    monkeypatch.setattr(settings, "SMTP_USERNAME", "")
+    # Письма, оставшиеся от других тестов, в пачку не попадают
+    db.query(EmailOutbox).delete()
+    db.commit()
+    try:
+        yield handler
+    finally:
+        smtp_connection.close()
+        controller.stop()
+
+
+def _enqueue(db, *addresses):
+    emails = [enqueue_email(db, address, "Код", "Ваш код: 123456") for address in addresses]
+    db.commit()
+    return [email.id for email in emails]
+
+
+def _reload(db, ids):
+    db.expire_all()
+    return [db.get(EmailOutbox, email_id) for email_id in ids]
+
+
+def test_batch_reuses_one_connection(db, smtp_server):
+    ids = _enqueue(db, "a@example.com", "b@example.com", "c@example.com")
+
+    report = send_outbox_batch(10)
+
+    assert report == (3, 0, 0)
+    assert [address for address, _ in smtp_server.delivered] == ["a@example.com", "b@example.com", "c@example.com"]
+    assert len({peer for _, peer in smtp_server.delivered}) == 1
+    for email in _reload(db, ids):
+        assert email.status == "sent" and email.sent_at is not None and email.claimed_by is None
+
+
+def test_temporary_error_is_retried_with_backoff(db, smtp_server):
+    smtp_server.data_replies["busy@example.com"] = "451 Try again later"
+    ids = _enqueue(db, "busy@example.com", "ok@example.com")
+
+    started = datetime.utcnow()
+    report = send_outbox_batch(10)
+
+    assert report == (1, 1, 0)
+    busy, ok = _reload(db, ids)
+    assert busy.status == "pending" and busy.attempts == 1
+    assert "451" in busy.last_error
+    expected = started + _retry_delay(1)
+    assert expected - timedelta(seconds=5) <= busy.next_attempt_at <= expected + timedelta(seconds=5)
+    # Отказ по одному письму не мешает остальным в той же пачке
+    assert ok.status == "sent"
+
+    # Следующая попытка - с удвоенной задержкой
+    db.query(EmailOutbox).filter(EmailOutbox.id == busy.id).update({EmailOutbox.next_attempt_at: datetime.utcnow()})
+    db.commit()
+    started = datetime.utcnow()
+    assert send_outbox_batch(10) == (0, 1, 0)
+    (busy,) = _reload(db, [busy.id])
+    assert busy.attempts == 2
+    assert busy.next_attempt_at >= started + _retry_delay(2) - timedelta(seconds=5)
+    assert _retry_delay(2) == 2 * _retry_delay(1)
+
+
+def test_permanent_errors_fail_without_retry(db, smtp_server):
+    smtp_server.data_replies["spam@example.com"] = "554 Message rejected"
+    smtp_server.rcpt_replies["nobody@example.com"] = "550 No such user"
+    ids = _enqueue(db, "spam@example.com", "nobody@example.com", "ok@example.com")
+
+    report = send_outbox_batch(10)
+
+    assert report == (1, 0, 2)
+    spam, nobody, ok = _reload(db, ids)
+    assert spam.status == "failed" and "554" in spam.last_error
+    assert nobody.status == "failed" and "550" in nobody.last_error
+    assert ok.status == "sent"
+
+
+def test_recipient_refused_temporarily_keeps_rest_of_batch(db, smtp_server):
+    smtp_server.rcpt_replies["full@example.com"] = "452 Mailbox full"
+    ids = _enqueue(db, "full@example.com", "ok@example.com")
+
+    assert send_outbox_batch(10) == (1, 1, 0)
+    full, ok = _reload(db, ids)
+    assert full.status == "pending" and full.attempts == 1 and "452" in full.last_error
+    assert ok.status == "sent"
+
+
+def test_disconnect_returns_rest_of_batch_without_attempt(db, smtp_server):
+    smtp_server.disconnect_after = "first@example.com"
+    ids = _enqueue(db, "first@example.com", "second@example.com", "third@example.com")
+
+    report = send_outbox_batch(10)
+
+    assert report == (1, 2, 0)
+    first, second, third = _reload(db, ids)
+    assert first.status == "sent"
+    # На втором письме сервер пропал: попытка засчитана, третье вернулось в очередь без траты попытки
+    assert second.status == "pending" and second.attempts == 1
+    assert second.last_error.startswith("ConnectionRefusedError")
+    assert third.status == "pending" and third.attempts == 0 and third.last_error is None
+    for email in (second, third):
+        assert email.claimed_by is None and email.next_attempt_at > datetime.utcnow()
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.password_pool import PasswordHashPool
+
+
+def _blocking_task(started: threading.Event, release: threading.Event):
+    def task():
+        started.set()
+        assert release.wait(5)
+        return "hash"
+
+    return task
+
+
+def test_full_queue_is_rejected_with_503():
+    async def scenario():
+        pool = PasswordHashPool(workers=1, queue_limit=0)
+        started, release = threading.Event(), threading.Event()
+        running = asyncio.create_task(pool.run(_blocking_task(started, release)))
+        await asyncio.to_thread(started.wait, 5)
+
+        with pytest.raises(HTTPException) as error:
+            await pool.run(lambda: "second")
+        assert error.value.status_code == 503
+        assert error.value.headers == {"Retry-After": "1"}
+        assert pool.rejected == 1
+
+        release.set()
+        assert await running == "hash"
+        assert await pool.run(lambda: "after") == "after"
+
+    asyncio.run(scenario())
+
+
+def test_event_loop_is_not_blocked_while_hashing():
+    async def scenario():
+        pool = PasswordHashPool(workers=1, queue_limit=1)
+        started, release = threading.Event(), threading.Event()
+        running = asyncio.create_task(pool.run(_blocking_task(started, release)))
+        await asyncio.to_thread(started.wait, 5)
+
+        # Хеш еще считается, а цикл событий продолжает обслуживать другие задачи
+        ticks = 0
+        for _ in range(3):
+            await asyncio.sleep(0)
+            ticks += 1
+        assert ticks == 3 and not running.done()
+
+        release.set()
+        assert await running == "hash"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_wait_keeps_slot_until_hash_finishes():
+    async def scenario():
+        pool = PasswordHashPool(workers=1, queue_limit=0)
+        started, release = threading.Event(), threading.Event()
+        running = asyncio.create_task(pool.run(_blocking_task(started, release)))
+        await asyncio.to_thread(started.wait, 5)
+
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        # Поток еще занят: новая задача не должна встать поверх лимита
+        with pytest.raises(HTTPException):
+            await pool.run(lambda: "second")
+
+        release.set()
+        for _ in range(100):
+            try:
+                return await pool.run(lambda: "after")
+            except HTTPException:
+                await asyncio.sleep(0.01)
+        pytest.fail("слот не освободился после завершения хеша")
+
+    assert asyncio.run(scenario()) == "after"
+
+
+def test_login_and_password_change(client, db, make_user):
+    from app.utils.auth import pwd_context
+
+    user, headers = make_user()
+    user.hashed_password = pwd_context.hash("old-secret")
+    db.commit()
+
+    response = client.post("/api/auth/login", json={"email": user.email, "password": "wrong"})
+    assert response.status_code == 401
+    response = client.post("/api/auth/login", json={"email": user.email, "password": "old-secret"})
+    assert response.status_code == 200
+
+    response = client.put(
+        "/api/auth/password",
+        json={"old_password": "old-secret", "new_password": "new-secret"},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    response = client.post("/api/auth/login", json={"email": user.email, "password": "new-secret"})
+    assert response.status_code == 200
+
+
+def test_sync_helpers_use_pool_from_worker_thread(monkeypatch):
+    import anyio
+
+    from app.routers import auth as auth_router
+    from app.utils import auth
+
+    # Обработчики с запросами к БД не должны выполняться в цикле событий
+    for handler in (
+        auth_router.request_register_code,
+        auth_router.login,
+        auth_router.update_password,
+        auth_router.confirm_password_reset,
+    ):
+        assert not asyncio.iscoroutinefunction(handler)
+
+    pool = PasswordHashPool(workers=1, queue_limit=0)
+    monkeypatch.setattr(auth, "password_pool", pool)
+    started, release = threading.Event(), threading.Event()
+
+    async def scenario():
+        async with anyio.create_task_group() as group:
+            group.start_soon(pool.run, _blocking_task(started, release))
+            await anyio.to_thread.run_sync(started.wait, 5)
+            # Переполненный пул отвечает 503 и из потока обработчика
+            with pytest.raises(HTTPException) as error:
+                await anyio.to_thread.run_sync(auth.get_password_hash, "secret")
+            assert error.value.status_code == 503
+            release.set()
+
+        hashed = await anyio.to_thread.run_sync(auth.get_password_hash, "secret")
+        assert await anyio.to_thread.run_sync(auth.verify_password, "secret", hashed)
+
+    anyio.run(scenario)
@@ -0,0 +1,119 @@
+import sqlite3
+
+import pytest
+
+from app.utils import rate_limit
+from app.utils.rate_limit import MemoryRateLimitBackend, RateLimitRule, SQLiteRateLimitBackend
+
+SLOW = RateLimitRule.parse("1/1000")
+FAST = RateLimitRule.parse("10/10")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    return clock
+
+
+def test_memory_eviction_uses_each_bucket_rule(clock):
+    backend = MemoryRateLimitBackend()
+    assert backend.consume("fast", FAST) == 0
+    assert backend.consume("slow", SLOW) == 0
+    assert backend.consume("slow", SLOW) > 0
+
+    # Быстрое ведро восполнилось, медленное - нет, хотя запрос идет по быстрому правилу
+    clock.now += 20
+    assert backend.consume("other", FAST) == 0
+    assert "fast" not in backend._buckets
+    assert backend.consume("slow", SLOW) > 0
+
+
+def test_memory_size_bound_drops_least_recently_used(clock):
+    backend = MemoryRateLimitBackend(max_size=2)
+    for key in ("a", "b"):
+        assert backend.consume(key, SLOW) == 0
+    assert backend.consume("a", SLOW) > 0  # "a" становится самым свежим
+
+    assert backend.consume("c", SLOW) == 0
+    assert list(backend._buckets) == ["a", "c"]
+    assert backend.consume("a", SLOW) > 0
+
+
+def test_sqlite_prunes_refilled_buckets(tmp_path, clock):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "rate_limit.db"))
+    assert backend.consume("fast", FAST) == 0
+    assert backend.consume("slow", SLOW) == 0
+
+    clock.now += 20
+    assert backend.prune() == 1
+    assert backend.consume("slow", SLOW) > 0
+
+
+def test_sqlite_prunes_on_consume_after_interval(tmp_path, clock):
+    path = tmp_path / "rate_limit.db"
+    backend = SQLiteRateLimitBackend(str(path))
+    assert backend.consume("fast", FAST) == 0
+
+    clock.now += rate_limit.RATE_LIMIT_PRUNE_INTERVAL_SECONDS
+    assert backend.consume("slow", SLOW) == 0
+    keys = [row[0] for row in sqlite3.connect(path).execute("SELECT key FROM rate_limit_buckets")]
+    assert keys == ["slow"]
+
+
+def test_sqlite_upgrades_file_without_full_at(tmp_path, clock):
+    path = tmp_path / "rate_limit.db"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    connection.execute("INSERT INTO rate_limit_buckets VALUES ('old', 5, 0)")
+    connection.commit()
+    connection.close()
+
+    backend = SQLiteRateLimitBackend(str(path))
+    # Первый запрос процесса сразу чистит файл: у старых ведер full_at = 0
+    assert backend.consume("new", SLOW) == 0
+    keys = [row[0] for row in sqlite3.connect(path).execute("SELECT key FROM rate_limit_buckets")]
+    assert keys == ["new"]
+    assert backend.consume("new", SLOW) > 0
+
+
+def test_authenticated_endpoint_limited_before_user_lookup(client, make_user, monkeypatch):
+    from app.config import settings
+    from app.utils import auth
+
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_SEND_CODE_PER_IP", "100/600")
+    monkeypatch.setattr(settings, "RATE_LIMIT_SEND_CODE_PER_EMAIL", "1/600")
+    monkeypatch.setattr(rate_limit, "_backend", MemoryRateLimitBackend())
+
+    lookups = []
+    get_user_cached = auth.get_user_cached
+    monkeypatch.setattr(auth, "get_user_cached", lambda db, user_id: lookups.append(user_id) or get_user_cached(db, user_id))
+
+    user, headers = make_user()
+    other, other_headers = make_user()
+    assert client.post("/api/auth/resend-verification", headers=headers).status_code == 200
+    assert lookups == [user.id]
+
+    # Ведро учетной записи пусто: 429 до get_current_user и обращения к БД
+    response = client.post("/api/auth/resend-verification", headers=headers)
+    assert response.status_code == 429 and "Retry-After" in response.headers
+    assert lookups == [user.id]
+
+    # Ведро по sub токена, а не по IP: другой пользователь с того же адреса проходит
+    assert client.post("/api/auth/resend-verification", headers=other_headers).status_code == 200
+
+    # С неверным токеном считается только IP, ответ - 401 от get_current_user
+    response = client.post("/api/auth/resend-verification", headers={"Authorization": "Bearer broken"})
+    assert response.status_code == 401
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.models import AssignmentFile, CourseMember, Submission, SubmissionFile, UploadSession
+from app.utils.auth import create_user_access_token
+from app.utils.file_upload import resolve_upload_path
+from app.utils.resumable_upload import cleanup_stale_upload_sessions, get_staging_path
+
+CONTENT = b"0123456789" * 100
+
+
+def _start(client, url, headers, size=len(CONTENT), name="report.bin"):
+    response = client.post(url, json={"file_name": name, "file_size": size}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _put(client, session_id, offset, body, headers):
+    return client.put(f"/api/uploads/{session_id}", params={"offset": offset}, content=body, headers=headers)
+
+
+def _read_stored(file_path: str) -> bytes:
+    with open(resolve_upload_path(file_path), "rb") as stored:
+        return stored.read()
+
+
+def test_chunks_resume_and_finalize_assignment_file(client, db, upload_dir, make_assignment):
+    assignment, headers = make_assignment()
+    session_id = _start(client, f"/api/assignments/{assignment.id}/uploads", headers)
+
+    assert _put(client, session_id, 0, CONTENT[:300], headers).json()["offset"] == 300
+    assert client.get(f"/api/uploads/{session_id}", headers=headers).json()["offset"] == 300
+
+    # Повтор уже принятой части и пропуск вперед отклоняются с текущим смещением
+    for offset in (0, 500):
+        response = _put(client, session_id, offset, CONTENT[offset:offset + 100], headers)
+        assert response.status_code == 409
+        assert response.headers["Upload-Offset"] == "300"
+
+    # Финализация до конца загрузки
+    response = client.post(f"/api/assignments/{assignment.id}/uploads/{session_id}/finalize", headers=headers)
+    assert response.status_code == 409 and response.headers["Upload-Offset"] == "300"
+
+    assert _put(client, session_id, 300, CONTENT[300:], headers).json()["offset"] == len(CONTENT)
+    response = client.post(f"/api/assignments/{assignment.id}/uploads/{session_id}/finalize", headers=headers)
+    assert response.status_code == 201, response.text
+
+    record = db.get(AssignmentFile, response.json()["id"])
+    assert record.file_name == "report.bin" and record.file_size == len(CONTENT)
+    assert record.content_hash == hashlib.sha256(CONTENT).hexdigest()
+    assert _read_stored(record.file_path) == CONTENT
+    assert db.get(UploadSession, session_id) is None
+    assert not os.path.exists(get_staging_path(session_id))
+
+
+def test_finalize_submission_file(client, db, upload_dir, make_user, make_assignment):
+    assignment, _ = make_assignment()
+    student, _ = make_user()
+    db.add(CourseMember(course_id=assignment.course_id, user_id=student.id))
+    submission = Submission(assignment_id=assignment.id, student_id=student.id, content="")
+    db.add(submission)
+    db.commit()
+    db.refresh(student)
+    headers = {"Authorization": f"Bearer {create_user_access_token(student)}"}
+
+    session_id = _start(client, f"/api/submissions/{submission.id}/uploads", headers, name="work.txt")
+    assert _put(client, session_id, 0, CONTENT, headers).status_code == 200
+    response = client.post(f"/api/submissions/{submission.id}/uploads/{session_id}/finalize", headers=headers)
+    assert response.status_code == 201, response.text
+
+    record = db.get(SubmissionFile, response.json()["id"])
+    assert record.submission_id == submission.id and record.file_name == "work.txt"
+    assert _read_stored(record.file_path) == CONTENT
+
+
+def test_body_larger_than_declared_size_is_rejected(client, upload_dir, make_assignment):
+    assignment, headers = make_assignment()
+    session_id = _start(client, f"/api/assignments/{assignment.id}/uploads", headers, size=100)
+
+    response = _put(client, session_id, 0, CONTENT[:150], headers)
+    assert response.status_code == 400
+    offset = client.get(f"/api/uploads/{session_id}", headers=headers).json()["offset"]
+    assert offset <= 100
+    # Следующая часть принимается с фактического смещения
+    assert _put(client, session_id, offset, CONTENT[offset:100], headers).json()["offset"] == 100
+
+
+def test_busy_session_rejects_second_writer(client, db, upload_dir, make_assignment):
+    assignment, headers = make_assignment()
+    session_id = _start(client, f"/api/assignments/{assignment.id}/uploads", headers)
+    db.query(UploadSession).filter(UploadSession.id == session_id).update(
+        {UploadSession.writer_expires_at: datetime.utcnow() + timedelta(minutes=1)}
+    )
+    db.commit()
+
+    response = _put(client, session_id, 0, CONTENT, headers)
+    assert response.status_code == 409 and response.headers["Upload-Offset"] == "0"
+
+    # Аренда упавшего воркера истекает сама
+    db.query(UploadSession).filter(UploadSession.id == session_id).update(
+        {UploadSession.writer_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    assert _put(client, session_id, 0, CONTENT, headers).json()["offset"] == len(CONTENT)
+
+
+def test_concurrent_puts_with_same_offset_write_once(db, upload_dir, make_assignment):
+    from app.main import app
+
+    assignment, headers = make_assignment()
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_body():
+            yield CONTENT[:500]
+            await gate.wait()
+            yield CONTENT[500:]
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as api:
+            response = await api.post(
+                f"/api/assignments/{assignment.id}/uploads",
+                json={"file_name": "race.bin", "file_size": len(CONTENT)},
+            )
+            session_id = response.json()["id"]
+            url = f"/api/uploads/{session_id}"
+
+            first = asyncio.create_task(api.put(url, params={"offset": 0}, content=slow_body()))
+            deadline = time.monotonic() + 5
+            while db.query(UploadSession.writer_expires_at).filter(UploadSession.id == session_id).scalar() is None:
+                assert time.monotonic() < deadline
+                db.rollback()
+                await asyncio.sleep(0.01)
+
+            # Клиент повторил часть, пока первый запрос еще читается
+            retry = await api.put(url, params={"offset": 0}, content=CONTENT)
+            assert retry.status_code == 409
+            assert "Upload-Offset" in retry.headers
+
+            gate.set()
+            response = await first
+            assert response.status_code == 200 and response.json()["offset"] == len(CONTENT)
+            return session_id
+
+    session_id = asyncio.run(scenario())
+    with open(get_staging_path(session_id), "rb") as staging_file:
+        assert staging_file.read() == CONTENT
+
+
+def test_cleanup_stale_upload_sessions(client, db, upload_dir, make_assignment):
+    assignment, headers = make_assignment()
+    stale_id = _start(client, f"/api/assignments/{assignment.id}/uploads", headers)
+    fresh_id = _start(client, f"/api/assignments/{assignment.id}/uploads", headers)
+    db.query(UploadSession).filter(UploadSession.id == stale_id).update(
+        {UploadSession.updated_at: datetime.utcnow() - timedelta(days=2)}
+    )
+    db.commit()
+
+    # staging-файлы без сессии: старый удаляется, свежий (сессия создается прямо сейчас) остается
+    old_orphan = get_staging_path("0" * 32)
+    new_orphan = get_staging_path("1" * 32)
+    for path in (old_orphan, new_orphan):
+        open(path, "wb").close()
+    old_time = time.time() - 3 * 24 * 3600
+    os.utime(old_orphan, (old_time, old_time))
+
+    assert cleanup_stale_upload_sessions(db) == 2
+    db.expire_all()
+    assert db.get(UploadSession, stale_id) is None
+    assert not os.path.exists(get_staging_path(stale_id))
+    assert db.get(UploadSession, fresh_id) is not None
+    assert os.path.exists(get_staging_path(fresh_id))
+    assert not os.path.exists(old_orphan) and os.path.exists(new_orphan)
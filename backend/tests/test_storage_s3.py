@@ -0,0 +1,103 @@
+import boto3
+import pytest
+import requests
+from moto import mock_aws
+
+from app.config import settings
+from app.utils.storage import S3StorageBackend, StorageBackend
+
+BUCKET = "classroom-test"
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    monkeypatch.setattr(settings, "S3_BUCKET", BUCKET)
+    monkeypatch.setattr(settings, "S3_PREFIX", "uploads")
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY_ID", "test")
+    monkeypatch.setattr(settings, "S3_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", "")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield S3StorageBackend()
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "source.bin"
+    path.write_bytes(CONTENT)
+    return path
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_put_and_stat(s3_storage, source_file):
+    key = "blobs/ab/cd/abcd.bin"
+    s3_storage.put_file(str(source_file), key)
+
+    assert not source_file.exists()
+    assert s3_storage.stat(key).size == len(CONTENT)
+    assert s3_storage.stat("blobs/missing.bin") is None
+    # Ключ хранится с префиксом S3_PREFIX
+    head = s3_storage.client.head_object(Bucket=BUCKET, Key=f"uploads/{key}")
+    assert head["ContentLength"] == len(CONTENT)
+
+
+def test_put_existing_blob_keeps_object(s3_storage, source_file, tmp_path):
+    key = "blobs/ab/cd/abcd.bin"
+    s3_storage.put_file(str(source_file), key)
+    duplicate = tmp_path / "duplicate.bin"
+    duplicate.write_bytes(CONTENT)
+
+    s3_storage.put_file(str(duplicate), key)
+
+    assert not duplicate.exists()
+    assert b"".join(s3_storage.open_range(key)) == CONTENT
+
+
+def test_open_range(s3_storage, source_file):
+    key = "blobs/range.bin"
+    s3_storage.put_file(str(source_file), key)
+
+    assert b"".join(s3_storage.open_range(key)) == CONTENT
+    assert b"".join(s3_storage.open_range(key, 10, 19)) == CONTENT[10:20]
+    assert b"".join(s3_storage.open_range(key, len(CONTENT) - 5)) == CONTENT[-5:]
+
+
+def test_download_to_path(s3_storage, source_file, tmp_path):
+    key = "blobs/download.bin"
+    s3_storage.put_file(str(source_file), key)
+    dest = tmp_path / "copy.bin"
+
+    s3_storage.download_to_path(key, str(dest))
+
+    assert dest.read_bytes() == CONTENT
+
+
+def test_delete(s3_storage, source_file):
+    key = "blobs/delete.bin"
+    s3_storage.put_file(str(source_file), key)
+
+    s3_storage.delete(key)
+
+    assert s3_storage.stat(key) is None
+    # Повторное удаление не ошибка
+    s3_storage.delete(key)
+
+
+def test_presign(s3_storage, source_file):
+    key = "blobs/presign.pdf"
+    s3_storage.put_file(str(source_file), key)
+
+    url = s3_storage.presign(key, "Отчет.pdf", expires_seconds=60)
+
+    assert "X-Amz-Expires=60" in url
+    assert f"uploads/{key}" in url
+    response = requests.get(url)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert "filename*=utf-8''%D0%9E%D1%82%D1%87%D0%B5%D1%82.pdf" in response.headers["content-disposition"]
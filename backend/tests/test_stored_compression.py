@@ -0,0 +1,87 @@
+import gzip
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.utils.compression import get_file_encoding
+from app.utils.file_upload import get_local_copy
+from app.utils.zip_stream import ZipEntry, stream_zip
+
+TEXT = b"print('hello')\n" * 200
+# Собственный архив пользователя: сервер не должен его распаковывать
+USER_GZIP = gzip.compress(b"x" * 1100, mtime=0)
+
+
+def _url(record):
+    return f"/api/assignments/{record.assignment_id}/files/{record.id}/download"
+
+
+@pytest.fixture(params=["", "gzip"], ids=["compression-off", "compression-gzip"])
+def compression(request, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_COMPRESSION", request.param)
+    monkeypatch.setattr(settings, "UPLOAD_COMPRESSION_MIN_BYTES", 0)
+    return request.param
+
+
+@pytest.mark.parametrize("file_name", ["data.tar.gz", "trace.zst", "evil.stored-gz"])
+def test_user_compressed_files_are_served_as_is(client, make_assignment_file, compression, file_name):
+    record, headers = make_assignment_file(file_name, USER_GZIP)
+
+    assert get_file_encoding(record.file_path) is None
+    for accept_encoding in ("gzip", "identity"):
+        response = client.get(_url(record), headers={**headers, "Accept-Encoding": accept_encoding})
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.content == USER_GZIP
+
+
+def test_user_gzip_in_archive_and_local_copy(make_assignment_file, compression, tmp_path):
+    record, _ = make_assignment_file("data.tar.gz", USER_GZIP)
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([ZipEntry("data.tar.gz", record.file_path)]))))
+    assert archive.read("data.tar.gz") == USER_GZIP
+
+    local_path = get_local_copy(record.file_path, str(tmp_path))
+    with open(local_path, "rb") as local_file:
+        assert local_file.read() == USER_GZIP
+
+
+def test_stored_compression_is_marked_and_decoded(client, make_assignment_file, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "UPLOAD_COMPRESSION", "gzip")
+    monkeypatch.setattr(settings, "UPLOAD_COMPRESSION_MIN_BYTES", 0)
+    record, headers = make_assignment_file("main.py", TEXT)
+
+    assert record.file_path.endswith(".py.stored-gz")
+    assert get_file_encoding(record.file_path) == "gzip"
+    assert os.path.getsize(record.file_path) < len(TEXT)
+
+    # Маркер, а не текущая настройка: после выключения сжатия файл по-прежнему распаковывается
+    monkeypatch.setattr(settings, "UPLOAD_COMPRESSION", "")
+
+    passthrough = client.get(_url(record), headers={**headers, "Accept-Encoding": "gzip"})
+    assert passthrough.headers["content-encoding"] == "gzip"
+    assert passthrough.content == TEXT  # httpx распаковывает сам
+
+    identity = client.get(_url(record), headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.content == TEXT
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_zip([ZipEntry("main.py", record.file_path)]))))
+    assert archive.read("main.py") == TEXT
+
+    local_path = get_local_copy(record.file_path, str(tmp_path))
+    assert local_path.endswith(".py")
+    with open(local_path, "rb") as local_file:
+        assert local_file.read() == TEXT
+
+
+def test_legacy_and_foreign_names_are_not_decoded():
+    digest = "a" * 64
+    assert get_file_encoding(f"uploads/blobs/aa/aa/{digest}.txt.stored-gz") == "gzip"
+    assert get_file_encoding(f"uploads/blobs/aa/aa/{digest}.txt.stored-zst") == "zstd"
+    assert get_file_encoding(f"uploads/blobs/aa/aa/{digest}.tar.gz") is None
+    assert get_file_encoding("uploads/3f2c_report.stored-gz") is None
+    assert get_file_encoding("uploads/legacy/ab/cd/old_upload.gz") is None
@@ -0,0 +1,96 @@
+import io
+import zipfile
+from datetime import datetime, timedelta
+
+from app.models import CourseMember, Submission, SubmissionFile, SubmissionReviewAsset
+from app.utils.file_upload import quarantine_file, store_file
+
+
+def _store(upload_dir, file_name: str, content: bytes) -> str:
+    source = upload_dir / ".staging" / "source"
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(content)
+    return store_file(str(source), file_name).file_path
+
+
+def _add_submission(db, assignment, student, submitted_at, files):
+    submission = Submission(assignment_id=assignment.id, student_id=student.id, content="", submitted_at=submitted_at)
+    db.add(submission)
+    db.commit()
+    records = []
+    for file_name, file_path in files:
+        record = SubmissionFile(submission_id=submission.id, file_path=file_path, file_name=file_name)
+        db.add(record)
+        records.append(record)
+    db.commit()
+    return records
+
+
+def _download(client, assignment, headers, **params):
+    response = client.get(f"/api/assignments/{assignment.id}/submissions/archive", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    return archive
+
+
+def test_submissions_archive(client, db, upload_dir, make_user, make_assignment):
+    assignment, headers = make_assignment()
+    first, _ = make_user()
+    second, _ = make_user()
+    for student in (first, second):
+        db.add(CourseMember(course_id=assignment.course_id, user_id=student.id))
+    db.commit()
+
+    now = datetime.utcnow()
+    # Первая попытка - файл старой плоской раскладки прямо в UPLOAD_DIR
+    legacy_path = upload_dir / "old_draft.txt"
+    legacy_path.write_bytes(b"draft")
+    _add_submission(db, assignment, first, now - timedelta(hours=1), [("draft.txt", str(legacy_path))])
+    (final_file,) = _add_submission(
+        db, assignment, first, now, [("final.docx", _store(upload_dir, "final.docx", b"final"))]
+    )
+    db.add(SubmissionReviewAsset(
+        submission_file_id=final_file.id,
+        review_file_path=_store(upload_dir, "final.pdf", b"%PDF review"),
+        review_file_name="final.pdf",
+        mime_type="application/pdf",
+    ))
+    # Блоб в карантине: на него снова ссылаются, файл должен вернуться
+    quarantined_path = _store(upload_dir, "work.txt", b"work")
+    quarantine_file(quarantined_path)
+    _add_submission(db, assignment, second, now, [("work.txt", quarantined_path)])
+    db.commit()
+
+    first_dir = f"{first.username}_{first.id}"
+    second_dir = f"{second.username}_{second.id}"
+
+    archive = _download(client, assignment, headers)
+    assert sorted(archive.namelist()) == sorted([
+        f"{first_dir}/attempt_1/draft.txt",
+        f"{first_dir}/attempt_2/final.docx",
+        f"{second_dir}/attempt_1/work.txt",
+    ])
+    assert archive.read(f"{first_dir}/attempt_1/draft.txt") == b"draft"
+    assert archive.read(f"{second_dir}/attempt_1/work.txt") == b"work"
+
+    archive = _download(client, assignment, headers, latest_only=True, include_review=True)
+    assert sorted(archive.namelist()) == sorted([
+        f"{first_dir}/final.docx",
+        f"{first_dir}/review/final.pdf",
+        f"{second_dir}/work.txt",
+    ])
+    assert archive.read(f"{first_dir}/final.docx") == b"final"
+    assert archive.read(f"{first_dir}/review/final.pdf") == b"%PDF review"
+
+
+def test_archive_skips_missing_files(client, db, upload_dir, make_user, make_assignment):
+    assignment, headers = make_assignment()
+    student, _ = make_user()
+    _add_submission(db, assignment, student, datetime.utcnow(), [
+        ("lost.txt", str(upload_dir / "blobs" / "ab" / "cd" / "lost.txt")),
+        ("kept.txt", _store(upload_dir, "kept.txt", b"kept")),
+    ])
+
+    archive = _download(client, assignment, headers, latest_only=True)
+    assert archive.namelist() == [f"{student.username}_{student.id}/kept.txt"]
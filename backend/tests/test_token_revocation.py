@@ -0,0 +1,73 @@
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.models import Course, CourseMember, TokenRevocation, User
+from app.utils.token_revocation import revoke_access_tokens
+
+
+def _user_with_courses(db, email: str, count: int):
+    user = User(email=email, username=email.split("@")[0], hashed_password="-")
+    db.add(user)
+    db.flush()
+    members = []
+    for index in range(count):
+        course = Course(title="Курс", code=f"R{user.id:04d}{index:03d}", creator_id=user.id)
+        db.add(course)
+        db.flush()
+        member = CourseMember(course_id=course.id, user_id=user.id)
+        db.add(member)
+        members.append(member)
+    db.commit()
+    return user, members
+
+
+def test_member_removal_creates_then_moves_revocation(db):
+    user, (first, second) = _user_with_courses(db, "revoked@example.com", 2)
+
+    db.delete(first)
+    db.commit()
+    revoked_before = db.query(TokenRevocation.revoked_before).filter(TokenRevocation.user_id == user.id).scalar()
+    assert revoked_before is not None
+
+    db.delete(second)
+    db.commit()
+    rows = db.query(TokenRevocation).filter(TokenRevocation.user_id == user.id).all()
+    assert len(rows) == 1 and rows[0].revoked_before >= revoked_before
+
+
+def test_concurrent_revocations_do_not_conflict(postgres_engine):
+    with Session(postgres_engine) as setup:
+        user, (member,) = _user_with_courses(setup, "race@example.com", 1)
+        user_id, member_id = user.id, member.id
+
+    password_change = Session(postgres_engine)
+    removal = Session(postgres_engine)
+    errors = []
+
+    def remove_member():
+        try:
+            removal.delete(removal.get(CourseMember, member_id))
+            removal.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    try:
+        # Первая транзакция вставила запись отзыва, но еще не зафиксирована:
+        # вторая не видит ее в UPDATE и ждет на INSERT того же user_id
+        revoke_access_tokens(password_change, user_id)
+        thread = threading.Thread(target=remove_member)
+        thread.start()
+        time.sleep(0.5)
+        assert thread.is_alive(), errors
+        password_change.commit()
+        thread.join(10)
+
+        assert errors == []
+        with Session(postgres_engine) as check:
+            assert check.query(TokenRevocation).filter(TokenRevocation.user_id == user_id).count() == 1
+            assert check.get(CourseMember, member_id) is None
+    finally:
+        password_change.close()
+        removal.close()
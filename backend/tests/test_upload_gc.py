@@ -0,0 +1,92 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.models.job_lease import JobLease
+from app.utils.file_upload import get_quarantine_path
+from app.utils.upload_gc import UPLOAD_GC_JOB_NAME, collect_orphaned_uploads, run_upload_gc
+
+
+@pytest.fixture
+def gc_settings(monkeypatch, db):
+    monkeypatch.setattr(settings, "UPLOAD_GC_MIN_AGE_MINUTES", 1)
+    monkeypatch.setattr(settings, "UPLOAD_GC_GRACE_HOURS", 1)
+    db.query(JobLease).filter(JobLease.name == UPLOAD_GC_JOB_NAME).delete()
+    db.commit()
+    yield
+    db.query(JobLease).filter(JobLease.name == UPLOAD_GC_JOB_NAME).delete()
+    db.commit()
+
+
+def _age(path, seconds: float):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def _orphan(upload_dir, name: str, age_seconds: float = 3600):
+    path = upload_dir / "blobs" / "aa" / "bb" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"orphan")
+    _age(path, age_seconds)
+    return path
+
+
+def test_quarantine_grace_and_delete(gc_settings, upload_dir, make_assignment_file):
+    record, _ = make_assignment_file("kept.txt", b"kept")
+    _age(record.file_path, 3600)
+    orphan = _orphan(upload_dir, "orphan.txt")
+    fresh = _orphan(upload_dir, "fresh.txt", age_seconds=0)
+
+    report = collect_orphaned_uploads()
+    assert report.quarantined == 1 and report.deleted == 0
+    quarantine_path = get_quarantine_path(str(orphan))
+    assert not orphan.exists() and os.path.isfile(quarantine_path)
+    # Файл со ссылкой и недавняя загрузка не трогаются
+    assert os.path.isfile(record.file_path) and fresh.exists()
+
+    # Срок карантина отсчитывается от переноса, а не от mtime файла
+    report = collect_orphaned_uploads()
+    assert report.deleted == 0 and os.path.isfile(quarantine_path)
+
+    _age(quarantine_path, 2 * 3600)
+    report = collect_orphaned_uploads()
+    assert report.deleted == 1 and report.reclaimed_bytes == len(b"orphan")
+    assert not os.path.exists(quarantine_path)
+
+
+def test_quarantined_file_restored_when_referenced(gc_settings, db, upload_dir, make_assignment_file):
+    record, _ = make_assignment_file("doc.txt", b"doc")
+    orphan = _orphan(upload_dir, "revived.txt")
+    collect_orphaned_uploads()
+    quarantine_path = get_quarantine_path(str(orphan))
+    assert os.path.isfile(quarantine_path)
+
+    # Ссылка появилась (повторная загрузка того же содержимого) до истечения карантина
+    record.file_path = str(orphan)
+    db.commit()
+    _age(quarantine_path, 2 * 3600)
+
+    report = collect_orphaned_uploads()
+    assert report.restored == 1 and report.deleted == 0
+    assert orphan.read_bytes() == b"orphan"
+    assert not os.path.exists(quarantine_path)
+
+
+def test_run_upload_gc_skips_when_lease_held(gc_settings, db, upload_dir):
+    orphan = _orphan(upload_dir, "orphan.txt")
+    db.add(JobLease(name=UPLOAD_GC_JOB_NAME, holder="other-host:1", expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.commit()
+
+    run_upload_gc()
+    assert orphan.exists()
+
+    # Аренда остановившегося воркера истекла - проход выполняет текущий
+    db.query(JobLease).filter(JobLease.name == UPLOAD_GC_JOB_NAME).update(
+        {JobLease.expires_at: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    run_upload_gc()
+    assert not orphan.exists() and os.path.isfile(get_quarantine_path(str(orphan)))
@@ -1,4 +1,4 @@
-import axios from './axios';
+import axios, { saveTokens } from './axios';
 import type {
   AuthResponse,
   LoginData,
@@ -12,6 +12,7 @@ import type {
   UpdateAssignmentData,
   Message,
   CreateMessageData,
+  ChatUnreadCount,
   CourseMember,
   User,
   Submission,
@@ -52,9 +53,17 @@ export const updateProfile = async (data: { email?: string; username?: string })
 
 export const updatePassword = async (data: { old_password: string; new_password: string }): Promise<{ message: string }> => {
   const response = await axios.put('/auth/password', data);
+  // Остальные сессии завершены, эта продолжает работу с новой парой токенов
+  if (response.data.access_token) {
+    saveTokens(response.data.access_token, response.data.refresh_token);
+  }
   return response.data;
 };
 
+export const logoutSession = async (refreshToken: string): Promise<void> => {
+  await axios.post('/auth/logout', { refresh_token: refreshToken });
+};
+
 export const requestPasswordResetCode = async (email: string): Promise<{ message: string }> => {
   const response = await axios.post('/auth/password-reset/request-code', { email });
   return response.data;
@@ -214,11 +223,11 @@ export const getAssignmentUngradedSubmissions = async (assignmentId: number): Pr
 // Chat
 export const getMessages = async (
   assignmentId: number,
-  offset: number = 0,
+  beforeId?: number,
   limit: number = 10
 ): Promise<Message[]> => {
   const response = await axios.get(`/chat/assignments/${assignmentId}/messages`, {
-    params: { offset, limit },
+    params: { before_id: beforeId, limit },
   });
   return response.data;
 };
@@ -235,6 +244,21 @@ export const deleteMessage = async (messageId: number): Promise<void> => {
   await axios.delete(`/chat/messages/${messageId}`);
 };
 
+export const getChatUnreadCounts = async (): Promise<ChatUnreadCount[]> => {
+  const response = await axios.get('/chat/unread');
+  return response.data;
+};
+
+export const markChatRead = async (
+  assignmentId: number,
+  lastMessageId?: number
+): Promise<ChatUnreadCount> => {
+  const response = await axios.post(`/chat/assignments/${assignmentId}/read`, {
+    last_message_id: lastMessageId,
+  });
+  return response.data;
+};
+
 // Submissions
 export const submitAssignment = async (
   assignmentId: number,
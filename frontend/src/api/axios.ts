@@ -24,6 +24,52 @@ const axiosInstance = axios.create({
   },
 });
 
+const REFRESH_TOKEN_KEY = 'refreshToken';
+
+export const saveTokens = (accessToken: string, refreshToken?: string | null) => {
+  localStorage.setItem('token', accessToken);
+  if (refreshToken) {
+    localStorage.setItem(REFRESH_TOKEN_KEY, refreshToken);
+  }
+};
+
+export const getRefreshToken = () => localStorage.getItem(REFRESH_TOKEN_KEY);
+
+export const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem(REFRESH_TOKEN_KEY);
+};
+
+// Один запрос обновления на все 401, пришедшие одновременно
+let refreshPromise: Promise<string | null> | null = null;
+
+export const refreshAccessToken = (): Promise<string | null> => {
+  if (!refreshPromise) {
+    const refreshToken = getRefreshToken();
+    const request = refreshToken
+      ? axios
+          .post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken })
+          .then((response) => {
+            saveTokens(response.data.access_token, response.data.refresh_token);
+            return response.data.access_token as string;
+          })
+          .catch(() => {
+            // Другая вкладка могла успеть обменять этот refresh-токен раньше
+            const currentRefreshToken = getRefreshToken();
+            return currentRefreshToken && currentRefreshToken !== refreshToken
+              ? localStorage.getItem('token')
+              : null;
+          })
+      : Promise.resolve(null);
+    refreshPromise = request.finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+};
+
+const AUTH_URLS_WITHOUT_REFRESH = ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'];
+
 // Request interceptor для добавления токена
 axiosInstance.interceptors.request.use(
   (config) => {
@@ -41,12 +87,25 @@ axiosInstance.interceptors.request.use(
 // Response interceptor для обработки ошибок
 axiosInstance.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const config = error.config;
     if (error.response?.status === 401) {
+      // Access-токен истек или отозван - обновляем и повторяем запрос один раз
+      const canRefresh = config && !config._retry
+        && !AUTH_URLS_WITHOUT_REFRESH.some((url) => config.url?.startsWith(url));
+      if (canRefresh) {
+        config._retry = true;
+        const token = await refreshAccessToken();
+        if (token) {
+          config.headers.Authorization = `Bearer ${token}`;
+          return axiosInstance(config);
+        }
+      }
+
       // Не редиректим если уже на login/register
       const currentPath = window.location.pathname;
       if (currentPath !== '/login' && currentPath !== '/register') {
-        localStorage.removeItem('token');
+        clearTokens();
         localStorage.removeItem('user');
         window.location.href = '/login';
       }
@@ -7,9 +7,10 @@ import { getTimeRemaining } from '../utils/deadline';
 interface AssignmentCardProps {
   assignment: Assignment;
   isTeacher: boolean;
+  unreadCount?: number;
 }
 
-export const AssignmentCard = ({ assignment, isTeacher }: AssignmentCardProps) => {
+export const AssignmentCard = ({ assignment, isTeacher, unreadCount = 0 }: AssignmentCardProps) => {
   const [submission, setSubmission] = useState<any>(null);
   const [loading, setLoading] = useState(false);
 
@@ -118,7 +119,17 @@ export const AssignmentCard = ({ assignment, isTeacher }: AssignmentCardProps) =
             );
           })()}
         </div>
-        {getBadge()}
+        <div className="flex flex-col items-end gap-2 flex-shrink-0">
+          {getBadge()}
+          {unreadCount > 0 && (
+            <span
+              className="bg-primary/20 text-primary text-xs px-3 py-1 rounded-full"
+              title="Непрочитанные сообщения в чате"
+            >
+              💬 {unreadCount > 99 ? '99+' : unreadCount}
+            </span>
+          )}
+        </div>
       </div>
     </Link>
   );
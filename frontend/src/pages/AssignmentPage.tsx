@@ -15,6 +15,7 @@ import {
   getMessages,
   sendMessage,
   deleteMessage,
+  markChatRead,
   uploadFile,
   deleteFile,
   submitAssignment,
@@ -46,6 +47,10 @@ import type {
   SubmissionFeedbackFile,
 } from '../types';
 
+// Отметка о прочтении уходит не на каждое сообщение: за это окно - один запрос
+// с последним id, и только пока вкладка на экране
+const CHAT_READ_DEBOUNCE_MS = 2000;
+
 export const AssignmentPage = () => {
   const { id } = useParams<{ id: string }>();
   const navigate = useNavigate();
@@ -99,6 +104,9 @@ export const AssignmentPage = () => {
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  // Отложенная отметка о прочтении; messageId undefined - весь чат
+  const pendingChatReadRef = useRef<{ assignmentId: number; messageId?: number } | null>(null);
+  const chatReadTimerRef = useRef<number | null>(null);
 
   const isTeacher = !!(course && user && course.creator_id === user.id);
   const isArchived = !!(course && course.is_archived === 1);
@@ -109,12 +117,64 @@ export const AssignmentPage = () => {
   // Подписываемся на обновления курса (для событий assignment_updated/deleted)
   useCourseSubscription(course?.id || null);
 
+  // Отправить накопленную отметку о прочтении (если вкладка видна)
+  const flushChatRead = useCallback(() => {
+    if (chatReadTimerRef.current !== null) {
+      clearTimeout(chatReadTimerRef.current);
+      chatReadTimerRef.current = null;
+    }
+    const pending = pendingChatReadRef.current;
+    if (!pending || document.visibilityState !== 'visible') return;
+    pendingChatReadRef.current = null;
+    markChatRead(pending.assignmentId, pending.messageId).catch(() => {});
+  }, []);
+
+  // Запомнить, докуда прочитан чат, и отправить одним запросом через CHAT_READ_DEBOUNCE_MS
+  const scheduleChatRead = useCallback((assignmentId: number, messageId?: number) => {
+    const pending = pendingChatReadRef.current;
+    if (pending && pending.assignmentId !== assignmentId) {
+      // Перешли в другое задание: старое отмечается сразу или не отмечается вовсе
+      flushChatRead();
+      pendingChatReadRef.current = null;
+    }
+    const current = pendingChatReadRef.current;
+    if (current === null) {
+      pendingChatReadRef.current = { assignmentId, messageId };
+    } else if (current.messageId !== undefined) {
+      pendingChatReadRef.current = {
+        assignmentId,
+        messageId: messageId === undefined ? undefined : Math.max(current.messageId, messageId),
+      };
+    }
+    if (chatReadTimerRef.current === null && document.visibilityState === 'visible') {
+      chatReadTimerRef.current = window.setTimeout(flushChatRead, CHAT_READ_DEBOUNCE_MS);
+    }
+  }, [flushChatRead]);
+
+  // Скрытая вкладка ничего не отмечает: накопленное уходит, когда ее снова открыли
+  useEffect(() => {
+    const handleVisibilityChange = () => {
+      if (document.visibilityState === 'visible') {
+        flushChatRead();
+      }
+    };
+    document.addEventListener('visibilitychange', handleVisibilityChange);
+    return () => {
+      document.removeEventListener('visibilitychange', handleVisibilityChange);
+      flushChatRead();
+    };
+  }, [flushChatRead]);
+
   // Обработчик новых сообщений в чате
   const handleNewChatMessage = useCallback((data: Message) => {
     console.log('New chat message received:', data);
     setMessages((prev) => [...prev, data]);
     setTimeout(() => scrollToBottom(), 100);
-  }, []);
+    // Свои сообщения сервер в непрочитанные не записывает
+    if (data.user_id !== user?.id) {
+      scheduleChatRead(data.assignment_id, data.id);
+    }
+  }, [user?.id, scheduleChatRead]);
 
   // Обработчик удаления сообщения
   const handleChatMessageDeleted = useCallback((data: { message_id: number }) => {
@@ -223,7 +283,7 @@ export const AssignmentPage = () => {
   }, [id, course, navigate, addAlert]);
 
   // Подписываемся на WebSocket события
-  useWebSocket('chat_message', handleNewChatMessage, []);
+  useWebSocket('chat_message', handleNewChatMessage, [handleNewChatMessage]);
   useWebSocket('chat_message_deleted', handleChatMessageDeleted, []);
   useWebSocket('submission_created', handleSubmissionCreated, [isTeacher, user]);
   useWebSocket('submission_updated', handleSubmissionUpdated, [isTeacher, user]);
@@ -313,15 +373,16 @@ export const AssignmentPage = () => {
     }
   };
 
-  const loadMessages = async (offset = 0) => {
+  const loadMessages = async (beforeId?: number) => {
     try {
-      const data = await getMessages(Number(id), offset, 10);
+      const data = await getMessages(Number(id), beforeId, 10);
       if (data.length < 10) {
         setHasMore(false);
       }
-      if (offset === 0) {
+      if (beforeId === undefined) {
         setMessages(data.reverse());
         setTimeout(() => scrollToBottom(), 100);
+        scheduleChatRead(Number(id));
       } else {
         setMessages([...data.reverse(), ...messages]);
       }
@@ -367,7 +428,7 @@ export const AssignmentPage = () => {
 
   const handleLoadMore = async () => {
     setLoadingMore(true);
-    await loadMessages(messages.length);
+    await loadMessages(messages[0]?.id);
     setLoadingMore(false);
   };
 
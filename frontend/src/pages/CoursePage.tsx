@@ -3,11 +3,11 @@ import { useParams, useNavigate, Link } from 'react-router-dom';
 import { Navbar } from '../components/Navbar';
 import { AccessDenied } from '../components/AccessDenied';
 import { AssignmentCard } from '../components/AssignmentCard';
-import { getCourse, getAssignments, createAssignment, getCourseMembers, removeMember, updateCourse, getCourseGradebook, getCourseUngradedSubmissions, uploadFile, leaveCourse, archiveCourse } from '../api/api';
+import { getCourse, getAssignments, createAssignment, getCourseMembers, removeMember, updateCourse, getCourseGradebook, getCourseUngradedSubmissions, uploadFile, leaveCourse, archiveCourse, getChatUnreadCounts } from '../api/api';
 import { useAuthStore } from '../store/authStore';
 import { useAlertStore } from '../store/alertStore';
 import { useConfirmStore } from '../store/confirmStore';
-import type { Course, Assignment, CourseMember } from '../types';
+import type { Course, Assignment, CourseMember, ChatUnreadCount } from '../types';
 import { Modal } from '../components/Modal';
 import { FileUploadZone } from '../components/FileUploadZone';
 import { useWebSocket, useCourseSubscription } from '../hooks/useWebSocket';
@@ -21,6 +21,7 @@ export const CoursePage = () => {
 
   const [course, setCourse] = useState<Course | null>(null);
   const [assignments, setAssignments] = useState<Assignment[]>([]);
+  const [unreadCounts, setUnreadCounts] = useState<Record<number, number>>({});
   const [members, setMembers] = useState<CourseMember[]>([]);
   const [loading, setLoading] = useState(true);
   const [accessDenied, setAccessDenied] = useState(false);
@@ -54,6 +55,7 @@ export const CoursePage = () => {
     if (id) {
       loadCourse();
       loadAssignments();
+      loadUnreadCounts();
     }
   }, [id]);
 
@@ -78,6 +80,15 @@ export const CoursePage = () => {
     }
   };
 
+  const loadUnreadCounts = async () => {
+    try {
+      const data = await getChatUnreadCounts();
+      setUnreadCounts(Object.fromEntries(data.map((count) => [count.assignment_id, count.unread_count])));
+    } catch (err) {
+      console.error('Failed to load unread chat counts');
+    }
+  };
+
   const loadMembers = async () => {
     if (!course?.is_creator) return;
     try {
@@ -158,7 +169,13 @@ export const CoursePage = () => {
     addAlert('Задание удалено', 'info');
   }, [addAlert, course?.is_creator, gradebookData]);
 
+  // Обработчик изменения счетчика непрочитанных сообщений чата
+  const handleChatUnread = useCallback((data: ChatUnreadCount) => {
+    setUnreadCounts((prev) => ({ ...prev, [data.assignment_id]: data.unread_count }));
+  }, []);
+
   // Подписываемся на WebSocket события
+  useWebSocket('chat_unread', handleChatUnread, [handleChatUnread]);
   useWebSocket('assignment_created', handleAssignmentCreated, [handleAssignmentCreated]);
   useWebSocket('assignment_updated', handleAssignmentUpdated, [handleAssignmentUpdated]);
   useWebSocket('assignment_deleted', handleAssignmentDeleted, [handleAssignmentDeleted]);
@@ -169,6 +186,7 @@ export const CoursePage = () => {
       const customEvent = event as CustomEvent;
       if (customEvent.detail.courseId === Number(id)) {
         loadAssignments();
+        loadUnreadCounts();
       }
     };
 
@@ -460,6 +478,7 @@ export const CoursePage = () => {
                   key={assignment.id}
                   assignment={assignment}
                   isTeacher={course?.is_creator || false}
+                  unreadCount={unreadCounts[assignment.id] || 0}
                 />
               ))
             )}
@@ -38,7 +38,7 @@ export const Login = () => {
 
     try {
       const response = await login({ email, password });
-      setAuth(response.access_token, response.user);
+      setAuth(response.access_token, response.user, response.refresh_token);
 
       // Даём время на сохранение в localStorage
       await new Promise(resolve => setTimeout(resolve, 100));
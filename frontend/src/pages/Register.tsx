@@ -62,7 +62,7 @@ export const Register = () => {
     setLoading(true);
     try {
       const response = await confirmRegistration(email, trimmed);
-      setAuth(response.access_token, response.user);
+      setAuth(response.access_token, response.user, response.refresh_token);
 
       await new Promise(resolve => setTimeout(resolve, 100));
       navigate('/');
@@ -1,7 +1,21 @@
 // WebSocket Service для real-time обновлений
 
+import { refreshAccessToken } from '../api/axios';
+
 type MessageHandler = (message: any) => void;
 
+// Access-токен, который истечет раньше чем через это время, обновляется до переподключения
+const TOKEN_EXPIRY_MARGIN_MS = 30000;
+
+const isTokenExpired = (token: string): boolean => {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return typeof payload.exp === 'number' && payload.exp * 1000 - TOKEN_EXPIRY_MARGIN_MS <= Date.now();
+  } catch {
+    return false;
+  }
+};
+
 class WebSocketService {
   private ws: WebSocket | null = null;
   private handlers: Map<string, Set<MessageHandler>> = new Map();
@@ -11,6 +25,8 @@ class WebSocketService {
   private token: string | null = null;
   private isConnecting = false;
   private pingInterval: number | null = null;
+  // Сервер отклонил токен: перед следующим подключением его нужно обновить
+  private authRejected = false;
 
   // Подключиться к WebSocket серверу
   connect(token: string) {
@@ -38,8 +54,10 @@ class WebSocketService {
 
     try {
       this.ws = new WebSocket(url);
+      let opened = false;
 
       this.ws.onopen = () => {
+        opened = true;
         console.log('WebSocket connected');
         this.isConnecting = false;
         this.reconnectAttempts = 0;
@@ -62,8 +80,13 @@ class WebSocketService {
         this.isConnecting = false;
       };
 
-      this.ws.onclose = () => {
+      this.ws.onclose = (event) => {
         console.log('WebSocket disconnected');
+        // Без действительного токена сервер закрывает соединение до accept:
+        // браузер сообщает 1008 или обрыв рукопожатия (1006)
+        if (event.code === 1008 || !opened) {
+          this.authRejected = true;
+        }
         this.isConnecting = false;
         this.stopPing();
         this.attemptReconnect();
@@ -77,6 +100,7 @@ class WebSocketService {
   // Отключиться от WebSocket сервера
   disconnect() {
     this.reconnectAttempts = this.maxReconnectAttempts;
+    this.token = null;
     this.stopPing();
 
     if (this.ws) {
@@ -95,9 +119,23 @@ class WebSocketService {
     this.reconnectAttempts++;
     console.log(`Attempting to reconnect (${this.reconnectAttempts}/${this.maxReconnectAttempts})...`);
 
-    setTimeout(() => {
-      if (this.token) {
-        this.connect(this.token);
+    const attempt = this.reconnectAttempts;
+    setTimeout(async () => {
+      // Access-токен короткоживущий: берем последний обновленный, а не тот, с которым подключались
+      let token = localStorage.getItem('token') || this.token;
+      if (token && (this.authRejected || isTokenExpired(token))) {
+        // Тот же единый запрос обновления, что и у HTTP-запросов с 401
+        token = await refreshAccessToken();
+      }
+      // За время обновления могли вызвать disconnect или connect
+      if (this.reconnectAttempts !== attempt || !this.token) {
+        return;
+      }
+      this.authRejected = false;
+      if (token) {
+        this.connect(token);
+      } else {
+        console.log('Failed to refresh token for WebSocket reconnect');
       }
     }, this.reconnectDelay * this.reconnectAttempts);
   }
@@ -1,13 +1,14 @@
 import { create } from 'zustand';
 import type { User } from '../types';
-import { getCurrentUser } from '../api/api';
+import { getCurrentUser, logoutSession } from '../api/api';
+import { clearTokens, getRefreshToken, saveTokens } from '../api/axios';
 
 interface AuthStore {
   user: User | null;
   token: string | null;
   isAuthenticated: boolean;
   isLoading: boolean;
-  setAuth: (token: string, user: User) => void;
+  setAuth: (token: string, user: User, refreshToken?: string | null) => void;
   logout: () => void;
   initAuth: () => Promise<void>;
   loadUser: () => Promise<void>;
@@ -20,15 +21,19 @@ export const useAuthStore = create<AuthStore>((set, get) => ({
   isAuthenticated: false,
   isLoading: true,
 
-  setAuth: (token, user) => {
-    // Сохраняем только токен в localStorage
-    localStorage.setItem('token', token);
+  setAuth: (token, user, refreshToken) => {
+    // Сохраняем только токены в localStorage
+    saveTokens(token, refreshToken);
     set({ token, user, isAuthenticated: true, isLoading: false });
   },
 
   logout: () => {
-    // Удаляем только токен
-    localStorage.removeItem('token');
+    // Отзываем refresh-токен на сервере и удаляем токены
+    const refreshToken = getRefreshToken();
+    if (refreshToken) {
+      logoutSession(refreshToken).catch(() => {});
+    }
+    clearTokens();
     set({ token: null, user: null, isAuthenticated: false, isLoading: false });
   },
 
@@ -43,7 +48,7 @@ export const useAuthStore = create<AuthStore>((set, get) => ({
       } catch (error) {
         console.error('Failed to load user:', error);
         // Токен невалиден, удаляем его
-        localStorage.removeItem('token');
+        clearTokens();
         set({ token: null, user: null, isAuthenticated: false, isLoading: false });
       }
     } else {
@@ -11,6 +11,7 @@ export interface AuthResponse {
   access_token: string;
   token_type: string;
   user: User;
+  refresh_token?: string | null;
 }
 
 export interface Course {
@@ -67,6 +68,12 @@ export interface Message {
   is_deleted: boolean;
 }
 
+export interface ChatUnreadCount {
+  assignment_id: number;
+  unread_count: number;
+  last_read_message_id: number;
+}
+
 export interface Submission {
   id: number;
   assignment_id: number;